@@ -3,17 +3,23 @@ import asyncio
 import os
 from datetime import datetime
 import logging
+from logging.handlers import RotatingFileHandler
 
 from . import config
-from .utils.cleanup import cleanup_old_reports  # 🔁 Import cleanup utility
 
 def create_app():
     app = Quart(__name__, template_folder="templates")
     app.config.setdefault("PROVIDE_AUTOMATIC_OPTIONS", True)
     app.BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     app.log_path = os.path.join(app.BASE_DIR, "quart_app.log")
+    # Size-based rotation keeps the log bounded; /logs reads the current file only
+    log_handler = RotatingFileHandler(
+        app.log_path,
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT
+    )
     logging.basicConfig(
-        filename=app.log_path,       # ← Your log file
+        handlers=[log_handler],
         level=logging.INFO,             # ← Adjust level as needed
         format='%(asctime)s %(levelname)s %(message)s'
     )
@@ -22,22 +28,83 @@ def create_app():
     # Initialize the database service
     from .services.database_service import DataBaseService
     from .utils.aws import get_boto3_client
-    s3_client = get_boto3_client("s3")
+    s3_client = get_boto3_client("s3", max_pool_connections=config.S3_MAX_POOL_CONNECTIONS)
     s3_bucket = config.AWS_BUCKET_NAME
     s3_prefix = config.S3_PREFIX
     mongo_uri = config.MONGO_URI
 
+    from .services.embedding_store import EmbeddingStore
+    app.embedding_store = EmbeddingStore(
+        store_dir=os.path.join(app.BASE_DIR, config.EMBEDDING_STORE_DIR),
+        model_name=config.EMBEDDING_MODEL_NAME
+    )
+
     app.db_service = DataBaseService(s3=s3_client, s3_bucket=s3_bucket, s3_prefix=s3_prefix,
-                                        mongo_uri=mongo_uri, db_name="biorxiv")
+                                        mongo_uri=mongo_uri, db_name="biorxiv",
+                                        embedding_store=app.embedding_store)
+
+    from .services.embedding_service import EmbeddingService
+    app.embedding_service = EmbeddingService(
+        app.embedding_store,
+        max_batch_size=config.EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms=config.EMBEDDING_BATCH_WAIT_MS,
+        cache_size=config.EMBEDDING_CACHE_SIZE
+    )
+
+    from .services.query_engine import QueryEngine
+    app.query_engine = QueryEngine(
+        embedding_store=app.embedding_store,
+        mongo_uri=mongo_uri,
+        db_name="biorxiv",
+        model_name=config.LLM_MODEL_NAME,
+        max_seq_length=config.LLM_MAX_SEQ_LENGTH,
+        load_in_4bit=config.LLM_LOAD_IN_4BIT,
+        index_type=config.RETRIEVAL_INDEX_TYPE,
+        start_date=config.ABSTRACT_QUERY_START_DATE,
+        max_new_tokens=config.LLM_MAX_NEW_TOKENS,
+        temperature=config.LLM_TEMPERATURE,
+        summary_mode=config.SUMMARY_MODE,
+        summary_batch_size=config.SUMMARY_BATCH_SIZE,
+        use_prefix_cache=config.LLM_PREFIX_CACHE,
+        summary_trim_policy=config.SUMMARY_TRIM_POLICY,
+        embedding_service=app.embedding_service
+    )
+
+    from .services.corpus_analytics import CorpusAnalytics
+    app.corpus_analytics = CorpusAnalytics(
+        embedding_store=app.embedding_store,
+        mongo_uri=mongo_uri,
+        state_dir=os.path.join(app.BASE_DIR, config.ANALYTICS_DIR),
+        db_name="biorxiv",
+        n_clusters=config.ANALYTICS_N_CLUSTERS,
+        top_keywords=config.ANALYTICS_TOP_KEYWORDS,
+        plot_sample=config.ANALYTICS_PLOT_SAMPLE
+    )
+
+    from .utils.report_cache import ReportCache
+    app.report_cache = ReportCache(
+        cache_dir=os.path.join(app.BASE_DIR, config.REPORT_CACHE_DIR),
+        max_bytes=config.REPORT_CACHE_MAX_BYTES
+    )
+
+    from .services.job_queue import ReportJobQueue
+    from .routes.abstract_query import make_report_runner, make_report_retriever
+    app.report_jobs = ReportJobQueue(
+        runner=make_report_runner(app),
+        prepare=make_report_retriever(app),
+        max_concurrent=config.REPORT_MAX_CONCURRENT_JOBS,
+        job_ttl=config.REPORT_JOB_TTL_SECONDS
+    )
+
+    @app.before_serving
+    async def load_query_engine():
+        # Every worker serves /abstract-query, so each one loads the models once in the background.
+        if config.LOAD_QUERY_ENGINE_ON_STARTUP:
+            logger.info("Loading query engine models in the background.")
+            app.query_engine_task = asyncio.create_task(asyncio.to_thread(app.query_engine.load))
 
     @app.before_serving
     async def start_background_tasks():
-        async def periodic_cleanup():
-            while True:
-                logger.info("Running periodic cleanup of old reports.")
-                await cleanup_old_reports(app.BASE_DIR)
-                await asyncio.sleep(86400) # Sleep for 24 hours
-        
         async def nuke_db_if_chosen():
             """
             Wipes the database abstracts collection if the configuration flag is set.
@@ -63,18 +130,37 @@ def create_app():
             
             await app.db_service.setup()
 
+        async def refresh_analytics():
+            from .routes.literature_summary import refresh_literature_summary
+            try:
+                await refresh_literature_summary(app)
+            except Exception:
+                logger.exception("Failed to refresh the literature summary analytics.")
+
         async def periodic_ingest():
             # Periodically ingest data into the database daily
             while True:
                 today = datetime.utcnow().date()
                 latest_date = await app.db_service.get_latest_date_in_db()
                 await app.db_service.ingest(start_date=latest_date, end_date=today)
+                # Encodes abstracts whose embedding failed during ingest; a no-op when the store is in sync
+                await app.db_service.backfill_embedding_store()
+                # Trains the new retrieval index off the request path; queries use the old one until it is swapped in
+                try:
+                    await asyncio.to_thread(app.query_engine.refresh_index)
+                except Exception:
+                    logger.exception("Failed to rebuild the retrieval index; still serving the previous one.")
+                if config.S3_COMPACTION_ENABLED:
+                    try:
+                        await app.db_service.compact_s3_backup(delete_sources=config.S3_COMPACTION_DELETE_SOURCES)
+                    except Exception:
+                        logger.exception("S3 backup compaction failed; page files remain the backup.")
+                await refresh_analytics()
                 await asyncio.sleep(86400)  # Sleep for 24 hours
         async def startup_sequence():
             # config option for nuking may be set to False, but playing it safe
             # await nuke_db_if_chosen()
             await initialize_db()
-            asyncio.create_task(periodic_cleanup())
             asyncio.create_task(periodic_ingest())
 
         # Start background tasks if enabled
@@ -82,8 +168,14 @@ def create_app():
             logger.info("Starting background tasks. Assuming this is the lead worker.")
             asyncio.create_task(startup_sequence())
 
+    @app.after_serving
+    async def close_connections():
+        await app.db_service.close()
+        app.embedding_service.close()
+
     # Register routes
-    from .routes import abstract_query, literature_summary, index, logs
+    from .routes import abstract_query, literature_summary, index, logs, metrics
+    app.register_blueprint(metrics.bp)
     app.register_blueprint(logs.bp)
     app.register_blueprint(abstract_query.bp)
     app.register_blueprint(literature_summary.bp)
@@ -1,4 +1,85 @@
 AWS_BUCKET_NAME="watspeed-data-gr-project"
 S3_PREFIX="abstracts"
 MONGO_URI="mongodb://localhost:27017"
-NUKE_DB_ON_STARTUP=False
\ No newline at end of file
+NUKE_DB_ON_STARTUP=False
+
+# Persistent abstract embedding store (path is relative to the app directory)
+EMBEDDING_STORE_DIR="data/embeddings"
+EMBEDDING_MODEL_NAME="sentence-transformers/all-MiniLM-L6-v2"
+
+# Query embedding service: concurrent queries are encoded together after waiting up to
+# EMBEDDING_BATCH_WAIT_MS for a batch of EMBEDDING_BATCH_MAX_SIZE; recent embeddings are kept in an LRU cache
+EMBEDDING_BATCH_MAX_SIZE=32
+EMBEDDING_BATCH_WAIT_MS=5
+EMBEDDING_CACHE_SIZE=1024
+
+# In-process abstract query engine
+LLM_MODEL_NAME="unsloth/Meta-Llama-3.1-8B-Instruct" # or a local LoRA adapter directory
+LLM_MAX_SEQ_LENGTH=4096
+LLM_LOAD_IN_4BIT=True
+LLM_MAX_NEW_TOKENS=1024
+LLM_TEMPERATURE=0.7
+# "sequential" folds abstracts into the summary one by one; "tree" summarizes them in batches and merges pairwise
+SUMMARY_MODE="sequential"
+SUMMARY_BATCH_SIZE=8
+# Reuse the key/value cache of the static instructions/examples prompt prefix across generate calls
+LLM_PREFIX_CACHE=True
+# How the running summary is shortened to fit the context: "middle" (keep intro and conclusion), "end" or "start"
+SUMMARY_TRIM_POLICY="middle"
+RETRIEVAL_INDEX_TYPE="exact" # "exact" or "ivf"
+ABSTRACT_QUERY_START_DATE="2025-07-01" # earliest abstract date searched; None for the whole corpus
+LOAD_QUERY_ENGINE_ON_STARTUP=True
+# Debug mode: run the papermill/nbconvert notebook pipeline instead of the in-process engine
+ABSTRACT_QUERY_USE_NOTEBOOK=False
+
+# Precomputed corpus analytics for /literature-summary (path is relative to the app directory),
+# updated incrementally after each ingest
+ANALYTICS_DIR="data/analytics"
+ANALYTICS_N_CLUSTERS=5
+ANALYTICS_TOP_KEYWORDS=10
+ANALYTICS_PLOT_SAMPLE=2000
+
+# Connection pools for the async data layer
+MONGO_MAX_POOL_SIZE=50
+MONGO_MIN_POOL_SIZE=0
+S3_MAX_POOL_CONNECTIONS=16
+HTTP_MAX_CONNECTIONS=10
+HTTP_TIMEOUT_SECONDS=30
+
+# S3 warm start: concurrent object downloads and documents per MongoDB insert batch
+S3_WARM_START_CONCURRENCY=16
+MONGO_INSERT_BATCH_SIZE=1000
+
+# Fields kept when loading documents from S3 into MongoDB; None keeps every field
+S3_WARM_START_FIELDS=None
+
+# S3 backup compaction: after each daily ingest, page files of completed months are rolled into
+# monthly zstd-compressed JSON lines shards (with their embeddings) that the warm start reads instead
+S3_COMPACTION_ENABLED=True
+S3_COMPACTION_ZSTD_LEVEL=10
+S3_COMPACTION_DELETE_SOURCES=False # delete page files once they are in a shard
+
+# biorxiv ingest: days processed concurrently and HTTP requests in flight
+BIORXIV_API_URL="https://api.biorxiv.org/details/biorxiv"
+INGEST_CONCURRENT_DAYS=4
+INGEST_CONCURRENT_PAGES=8
+HTTP_RETRIES=3
+
+# Background report jobs: reports generated at once (others queue) and how long results are kept
+REPORT_MAX_CONCURRENT_JOBS=1
+REPORT_JOB_TTL_SECONDS=3600
+
+# Streamed reports: a keep-alive comment is sent after this many seconds without an event, so
+# proxies (nginx's proxy_read_timeout) do not close a stream that is queued or loading models
+REPORT_STREAM_KEEPALIVE_SECONDS=15
+
+# Rendered report cache: reports are evicted least recently used first once the directory exceeds the budget
+REPORT_CACHE_DIR="reports"
+REPORT_CACHE_MAX_BYTES=500 * 1024 * 1024
+
+# Application log: size-based rotation and limits for the /logs endpoint
+LOG_MAX_BYTES=10 * 1024 * 1024
+LOG_BACKUP_COUNT=5
+LOG_TAIL_LINES=500
+LOG_MAX_RESPONSE_BYTES=1024 * 1024
+LOG_FOLLOW_POLL_SECONDS=1.0
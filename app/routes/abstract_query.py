@@ -1,14 +1,24 @@
-from quart import Blueprint, request, send_file, render_template
+from quart import Blueprint, request, send_file, render_template, url_for, Response
 import asyncio
 import subprocess
 import tempfile
-from datetime import datetime
 from quart import current_app
 import os
 import uuid
+import time
+import logging
+
+from .. import config
+from ..utils.sse import format_sse, KEEPALIVE
+from ..utils.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint("abstract_query", __name__)
 
+# Streamed reports keep generating after a client disconnects; hold references to their tasks
+_stream_tasks = set()
+
 @bp.route("/abstract-query-frontend-form", methods=["GET"])
 async def abstract_query_frontend_form():
     # Serve the HTML form for the abstract query
@@ -16,49 +26,226 @@ async def abstract_query_frontend_form():
 
 @bp.route("/abstract-query", methods=["POST"])
 async def abstract_query():
-    data = await request.get_json()
+    query_text, top_n, error = parse_query_request(await request.get_json())
+    if error:
+        return {"error": error}, 400
+    # Server-side debug switch only: the notebook path bypasses the report job queue
+    if config.ABSTRACT_QUERY_USE_NOTEBOOK:
+        return await run_notebook_report(query_text, top_n)
+    # Repeat queries against the same model and corpus snapshot are served from the cache
+    with stage_timer("cache_lookup"):
+        report_key = await report_cache_key(current_app, query_text, top_n)
+        cached = current_app.report_cache.get(report_key)
+    if cached:
+        return {"status": "done", "report_url": url_for("abstract_query.cached_report", report_key=report_key)}
+    # Reports are generated in the background; the client polls the job for its status.
+    job, _ = current_app.report_jobs.submit(query_text, top_n)
+    return job_status_response(job), 202
+
+def parse_query_request(data):
+    """
+    Validates the JSON body of an abstract query.
+    Returns:
+        tuple: (query_text, top_n, error) where error is a message for a 400 response, or None.
+    """
+    data = data or {}
     query_text = data.get("query", "")
+    if not query_text or not isinstance(query_text, str):
+        return None, None, "Query text is required"
     top_n = data.get("top_n", 5)  # Default to 5 if not provided
-    if not query_text:
-        return {"error": "Query text is required"}, 400
-    # add a unique identifier to the report
-    report_id = str(uuid.uuid4())
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_dir = os.path.join(current_app.BASE_DIR, "reports")
-    report_prefix = f"abstract_query_report_{report_id}_{timestamp}"
-    temp_ipynb = os.path.join(report_dir, f"{report_prefix}.ipynb")
-    output_html = os.path.join(report_dir, f"{report_prefix}.html")
-    # Run Papermill and nbconvert synchronously (wrapped in thread executor)
-    # NOTE: change "../notebooks/template_query.ipynb" to your actual notebook path
-    # Ensure that the notebook is in the correct path relative to this script
-    ipynb_template_path = os.path.join(current_app.BASE_DIR, "notebooks", "template2.ipynb")
-    try:
-        result = await asyncio.to_thread(subprocess.run, [
-            "papermill", ipynb_template_path, temp_ipynb,
-            "-p", "query", query_text,
-            "-p", "top_n", str(top_n)
-        ], capture_output=True, text=True, check=True)
-        del result
-    except subprocess.CalledProcessError as e:
-        print("Papermill call failed:")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        return {"error": "Papermill execution failed", "details": e.stderr}, 500
+    # Numeric strings such as "5" are accepted; booleans and fractional numbers are not
     try:
-        result = await asyncio.to_thread(subprocess.run, [
-            "jupyter", "nbconvert", "--to", "html", temp_ipynb,
-            "--output", report_prefix
-        ])
-        del result
-    except subprocess.CalledProcessError as e:
-        print("Nbconvert call failed:")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        return {"error": "Nbconvert execution failed", "details": e.stderr}, 500
-    # Ensure the output HTML file exists
-    if not os.path.exists(output_html):
-        return {"error": "Output HTML file not found"}, 500
-    # Clean up the temporary notebook file
-    os.remove(temp_ipynb)
+        valid = not isinstance(top_n, bool) and int(top_n) == float(top_n) and int(top_n) >= 1
+    except (TypeError, ValueError, OverflowError):
+        valid = False
+    if not valid:
+        return None, None, "top_n must be a positive integer"
+    top_n = int(top_n)
+    return query_text, top_n, None
+
+async def report_cache_key(app, query_text, top_n):
+    corpus_version = await asyncio.to_thread(app.query_engine.corpus_version)
+    return app.report_cache.make_key(query_text, top_n, app.query_engine.model_name, corpus_version)
+
+def make_report_retriever(app):
+    """
+    Returns the job queue's prepare step: retrieval for a query in a worker thread. It runs
+    before the job waits for a generation slot, so concurrent queries reach the embedding
+    service together and their embeddings are encoded in one batch.
+    """
+    async def retrieve_hits(query_text, top_n):
+        start = time.perf_counter()
+        hits = await asyncio.to_thread(app.query_engine.retrieve, query_text, top_n)
+        return hits, time.perf_counter() - start
+    return retrieve_hits
+
+def make_report_runner(app):
+    """
+    Returns the coroutine the report job queue runs for each job: it summarizes the hits
+    found by the prepare step in a worker thread, renders the report and stores it in the
+    report cache. The job's result is the report's cache key. on_event is forwarded to
+    QueryEngine.summarize.
+    """
+    async def run_report(query_text, top_n, on_event=None, prepared=None):
+        report_key = await report_cache_key(app, query_text, top_n)
+        if prepared is None:
+            prepared = await make_report_retriever(app)(query_text, top_n)
+        hits, retrieval_seconds = prepared
+        with stage_timer("query_engine"):
+            report = await asyncio.to_thread(app.query_engine.summarize, query_text, hits, top_n,
+                                             on_event, retrieval_seconds)
+        with stage_timer("render"):
+            async with app.app_context():
+                html = await render_template("abstract_query_report.html", **report)
+        with stage_timer("cache_store"):
+            app.report_cache.put(report_key, html)
+        return report_key
+    return run_report
+
+@bp.route("/abstract-query/stream", methods=["POST"])
+async def abstract_query_stream():
+    """
+    Answers an abstract query as a stream of Server-Sent Events instead of a background job:
+        queued    waiting for a free report slot
+        hits      the retrieved abstracts, as soon as top-k is known
+        pass      a summarization pass started (each pass rewrites the summary)
+        token     summary text as it is generated
+        done      the rendered report is in the cache at report_url
+        error     generation failed
+    The report is generated and cached even if the client disconnects. While no event is due
+    (e.g. waiting for a slot or for models to load) a keep-alive comment is sent every
+    REPORT_STREAM_KEEPALIVE_SECONDS.
+    """
+    query_text, top_n, error = parse_query_request(await request.get_json())
+    if error:
+        return {"error": error}, 400
+
+    app = current_app._get_current_object()
+    report_key = await report_cache_key(app, query_text, top_n)
+    report_url = url_for("abstract_query.cached_report", report_key=report_key)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def on_event(event, payload):
+        # Called from the worker thread running the query engine
+        loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+
+    async def produce():
+        try:
+            if app.report_cache.get(report_key) is None:
+                await app.report_jobs.run_gated(query_text, top_n, on_event=on_event,
+                                                on_queued=lambda: events.put_nowait(("queued", {})))
+            events.put_nowait(("done", {"report_url": report_url}))
+        except Exception as e:
+            logger.exception("Streamed abstract query failed.")
+            events.put_nowait(("error", {"error": str(e)}))
+        finally:
+            events.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    _stream_tasks.add(producer)
+    producer.add_done_callback(_stream_tasks.discard)
+
+    async def stream():
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), config.REPORT_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+                continue
+            if item is None:
+                break
+            event, payload = item
+            yield format_sse(payload, event=event)
+        await producer
+
+    response = Response(stream(), content_type="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.timeout = None  # summarization can take minutes
+    return response
+
+def job_status_response(job):
+    status = job.to_dict()
+    status["queue_position"] = current_app.report_jobs.queue_position(job)
+    status["status_url"] = url_for("abstract_query.abstract_query_job_status", job_id=job.id)
+    if job.status == "done":
+        status["report_url"] = url_for("abstract_query.cached_report", report_key=job.result)
+    else:
+        status["report_url"] = url_for("abstract_query.abstract_query_job_report", job_id=job.id)
+    return status
+
+@bp.route("/abstract-query/jobs/<job_id>", methods=["GET"])
+async def abstract_query_job_status(job_id):
+    job = current_app.report_jobs.get(job_id)
+    if job is None:
+        return {"error": "Unknown job id"}, 404
+    return job_status_response(job)
+
+@bp.route("/abstract-query/jobs/<job_id>/report", methods=["GET"])
+async def abstract_query_job_report(job_id):
+    job = current_app.report_jobs.get(job_id)
+    if job is None:
+        return {"error": "Unknown job id"}, 404
+    if job.status == "failed":
+        return {"error": "Abstract query failed", "details": job.error}, 500
+    if job.status != "done":
+        return job_status_response(job), 202
+    return await cached_report(job.result)
+
+@bp.route("/abstract-query/reports/<report_key>", methods=["GET"])
+async def cached_report(report_key):
+    report_path = current_app.report_cache.get(report_key)
+    if report_path is None:
+        return {"error": "Report not found or evicted from the cache"}, 404
+    return await send_file(report_path, mimetype="text/html")
+
+async def run_notebook_report(query_text, top_n):
+    """
+    Debug mode: renders the report by executing the template notebook with papermill and
+    converting it with nbconvert, each in its own subprocess. The result is stored in the
+    report cache like any other report.
+    """
+    # Intermediate notebook and HTML files live in a scratch directory outside the cache
+    with tempfile.TemporaryDirectory() as report_dir:
+        report_prefix = "abstract_query_report"
+        temp_ipynb = os.path.join(report_dir, f"{report_prefix}.ipynb")
+        output_html = os.path.join(report_dir, f"{report_prefix}.html")
+        # Run Papermill and nbconvert synchronously (wrapped in thread executor)
+        # NOTE: change "../notebooks/template_query.ipynb" to your actual notebook path
+        # Ensure that the notebook is in the correct path relative to this script
+        ipynb_template_path = os.path.join(current_app.BASE_DIR, "notebooks", "template2.ipynb")
+        try:
+            with stage_timer("papermill"):
+                result = await asyncio.to_thread(subprocess.run, [
+                    "papermill", ipynb_template_path, temp_ipynb,
+                    "-p", "query", query_text,
+                    "-p", "top_n", str(top_n)
+                ], capture_output=True, text=True, check=True)
+            del result
+        except subprocess.CalledProcessError as e:
+            print("Papermill call failed:")
+            print("STDOUT:", e.stdout)
+            print("STDERR:", e.stderr)
+            return {"error": "Papermill execution failed", "details": e.stderr}, 500
+        try:
+            with stage_timer("nbconvert"):
+                result = await asyncio.to_thread(subprocess.run, [
+                    "jupyter", "nbconvert", "--to", "html", temp_ipynb,
+                    "--output", report_prefix
+                ])
+            del result
+        except subprocess.CalledProcessError as e:
+            print("Nbconvert call failed:")
+            print("STDOUT:", e.stdout)
+            print("STDERR:", e.stderr)
+            return {"error": "Nbconvert execution failed", "details": e.stderr}, 500
+        # Ensure the output HTML file exists
+        if not os.path.exists(output_html):
+            return {"error": "Output HTML file not found"}, 500
+        with open(output_html, "r") as f:
+            html = f.read()
+    # Notebook reports are keyed separately from in-process reports
+    report_key = current_app.report_cache.make_key(query_text, top_n, f"notebook:{ipynb_template_path}", uuid.uuid4().hex)
+    report_path = current_app.report_cache.put(report_key, html)
     # Serve the generated HTML report
-    return await send_file(output_html, mimetype="text/html")
+    return await send_file(report_path, mimetype="text/html")
@@ -1,19 +1,34 @@
-from quart import Blueprint, send_file, current_app
+from quart import Blueprint, send_file, current_app, render_template
 import os
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint("literature_summary", __name__)
 
 @bp.route("/literature-summary", methods=["GET"])
 async def serve_literature_summary():
-    # report_path = "reports/literature_summary.html"
-    # change to actual report path when implemented
-    report_path = os.path.join(current_app.BASE_DIR, "notebooks/template1.html")  # Adjust this to your actual report path
-    
-    try:
-        return await send_file(report_path, mimetype="text/html")
-    except FileNotFoundError:
-        return {"error": "Literature summary not available"}, 404
+    # The report is precomputed by refresh_literature_summary after each ingest
+    report_path = current_app.corpus_analytics.report_path
+    if not os.path.exists(report_path):
+        return {"error": "Literature summary not available yet"}, 404
+    return await send_file(report_path, mimetype="text/html")
 
-# TODO: Implement the actual logic to generate the literature summary report
-# This can be done either through a background task or on-demand when the route is accessed.
-# For now, this route serves a static HTML file as a placeholder.
\ No newline at end of file
+async def refresh_literature_summary(app):
+    """
+    Folds newly embedded abstracts into the corpus analytics in a worker thread and, if
+    anything changed (or no report exists yet), re-renders the literature summary report.
+    """
+    analytics = app.corpus_analytics
+    processed = await asyncio.to_thread(analytics.update)
+    if not processed and os.path.exists(analytics.report_path):
+        return
+    context = await asyncio.to_thread(analytics.report_context)
+    if context is None:
+        logger.info("No abstracts are embedded yet; the literature summary was not generated.")
+        return
+    async with app.app_context():
+        html = await render_template("literature_summary_report.html", **context)
+    await asyncio.to_thread(analytics.write_report, html)
+    logger.info("Literature summary report regenerated.")
@@ -1,20 +1,73 @@
-from quart import Blueprint, render_template, current_app, Response
+from quart import Blueprint, request, current_app, Response
 import os
 import asyncio
 
+from .. import config
+from ..utils.log_reader import read_tail, read_since, file_id
+from ..utils.sse import format_sse
+
 bp = Blueprint("logs", __name__)
 
 @bp.route("/logs", methods=["GET"])
 async def get_logs():
+    """
+    Returns the application log as plain text.
+    Query parameters:
+        tail (int): Return only the last N lines (default LOG_TAIL_LINES).
+        since (int): Return the lines written after this byte offset instead of the tail.
+        follow (bool): Stream new lines as Server-Sent Events until the client disconnects.
+    The X-Log-Offset response header holds the offset to pass as `since` on the next request.
+    """
     log_file_path = current_app.log_path
-
+    if not os.path.exists(log_file_path):
+        return Response("Log file not found.", status=404, content_type="text/plain")
     try:
-        with open(log_file_path, "r") as f:
-            log_content = f.read()
-        return Response(
-            log_content,
-            content_type="text/plain",
-            headers={"Cache-Control": "no-cache"}
-        )
-    except FileNotFoundError:
-        return Response("Log file not found.", status=404, content_type="text/plain")
\ No newline at end of file
+        tail = int(request.args.get("tail", config.LOG_TAIL_LINES))
+        since = request.args.get("since", request.headers.get("Last-Event-ID"))
+        since = int(since) if since is not None else None
+        if tail < 0 or (since is not None and since < 0):
+            raise ValueError
+    except ValueError:
+        return Response("tail, since and Last-Event-ID must be non-negative integers.", status=400,
+                        content_type="text/plain")
+
+    if request.args.get("follow", "false").lower() in ("1", "true", "yes"):
+        response = Response(follow_log(log_file_path, tail, since), content_type="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        response.timeout = None  # the stream stays open until the client disconnects
+        return response
+
+    if since is not None:
+        content, offset = await read_since(log_file_path, since, config.LOG_MAX_RESPONSE_BYTES)
+    else:
+        content, offset = await read_tail(log_file_path, tail, config.LOG_MAX_RESPONSE_BYTES)
+    return Response(
+        content,
+        content_type="text/plain",
+        headers={"Cache-Control": "no-cache", "X-Log-Offset": str(offset)}
+    )
+
+async def follow_log(log_file_path, tail, since):
+    """
+    Yields log lines as Server-Sent Events. Each event's id is the byte offset after its
+    last line, so a reconnecting EventSource resumes where it left off via Last-Event-ID.
+    Starts from `since` if given, otherwise after the last `tail` lines.
+    """
+    if since is None:
+        content, offset = await read_tail(log_file_path, tail, config.LOG_MAX_RESPONSE_BYTES)
+    else:
+        content, offset = await read_since(log_file_path, since, config.LOG_MAX_RESPONSE_BYTES)
+    current_file = file_id(log_file_path)
+    while True:
+        if content:
+            yield format_sse(content.decode("utf-8", errors="replace"), event_id=offset)
+        else:
+            await asyncio.sleep(config.LOG_FOLLOW_POLL_SECONDS)
+        # After a rotation the log path names a new file; start reading it from the beginning
+        latest_file = file_id(log_file_path)
+        if latest_file is None:
+            content = b""
+            continue
+        if latest_file != current_file:
+            current_file, offset = latest_file, 0
+        content, offset = await read_since(log_file_path, offset, config.LOG_MAX_RESPONSE_BYTES)
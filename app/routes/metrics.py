@@ -0,0 +1,29 @@
+from quart import Blueprint, Response, request, g
+import time
+
+from ..utils.metrics import render_metrics, HTTP_REQUEST_SECONDS
+
+bp = Blueprint("metrics", __name__)
+
+@bp.before_app_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@bp.after_app_request
+async def record_request_latency(response):
+    start = g.get("request_start")
+    if start is not None:
+        # The route pattern rather than the path, so job ids and report keys do not create new series
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method, endpoint=endpoint, status=str(response.status_code)
+        ).observe(time.perf_counter() - start)
+    return response
+
+@bp.route("/metrics", methods=["GET"])
+async def metrics():
+    """
+    Exposes request, stage, ingest, MongoDB/S3 and generation metrics in the Prometheus text format.
+    """
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
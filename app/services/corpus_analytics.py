@@ -0,0 +1,304 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+import numpy as np
+import joblib
+from pymongo import MongoClient
+
+from ..utils.retrieval import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "state.joblib"
+REPORT_FILE = "literature_summary.html"
+STATE_VERSION = 2
+
+# Embedding store rows folded into the models per partial_fit call
+UPDATE_CHUNK_ROWS = 10000
+
+# Abstracts kept per cluster as candidates for its representatives. The centroids move as
+# rows are folded in, so the candidates are rescored against the current centroids on
+# every update and the report picks the closest of them.
+REPRESENTATIVE_CANDIDATES = 50
+
+
+class CorpusAnalytics:
+    """
+    Corpus-wide clustering, 2-D projection and per-cluster keyword statistics, maintained
+    incrementally from the embedding store.
+
+    The embedding store is append-only, so the number of rows already processed is a
+    watermark: each update folds only the rows after it into a MiniBatchKMeans
+    (partial_fit) and an IncrementalPCA, assigns the new abstracts to clusters, and adds
+    their terms to per-cluster document frequencies. The report's summary statistics
+    (date range, monthly counts, representative candidates and a reservoir sample of rows
+    for the plot) are maintained in the same pass. Models, statistics and the watermark
+    are persisted together with joblib, so a restart continues where the last update
+    stopped, and building the report never reads more than the sampled rows.
+    """
+
+    def __init__(self, embedding_store, mongo_uri, state_dir, db_name="biorxiv", collection_name="abstracts",
+                 n_clusters=5, top_keywords=10, plot_sample=2000, random_state=42):
+        """
+        Args:
+            embedding_store (EmbeddingStore): Source of abstract embeddings.
+            mongo_uri (str): MongoDB holding the abstracts' text (for keywords and titles).
+            state_dir (str): Directory for the persisted state and the rendered report.
+            n_clusters (int): Number of clusters.
+            top_keywords (int): Keywords reported per cluster.
+            plot_sample (int): Maximum number of abstracts drawn in the projection plot.
+            random_state (int): Seed for the models and the plot sample.
+        """
+        self.embedding_store = embedding_store
+        self.collection = MongoClient(mongo_uri)[db_name][collection_name]
+        self.state_dir = state_dir
+        self.n_clusters = n_clusters
+        self.top_keywords = top_keywords
+        self.plot_sample = plot_sample
+        self.random_state = random_state
+        self._lock = threading.Lock()
+        self._analyzer = None
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.state = self._load_state()
+
+    @property
+    def state_path(self):
+        return os.path.join(self.state_dir, STATE_FILE)
+
+    @property
+    def report_path(self):
+        return os.path.join(self.state_dir, REPORT_FILE)
+
+    def _new_state(self):
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.decomposition import IncrementalPCA
+
+        return {
+            "version": STATE_VERSION,
+            "model_name": self.embedding_store.model_name,
+            "n_clusters": self.n_clusters,
+            "plot_sample": self.plot_sample,
+            "processed_rows": 0,
+            "kmeans": MiniBatchKMeans(n_clusters=self.n_clusters, random_state=self.random_state, n_init=3),
+            "pca": IncrementalPCA(n_components=2),
+            "cluster_sizes": np.zeros(self.n_clusters, dtype=np.int64),
+            "cluster_terms": [Counter() for _ in range(self.n_clusters)],
+            "term_documents": Counter(),
+            "word_count_total": 0,
+            "earliest_date": None,
+            "latest_date": None,
+            "monthly_counts": Counter(),
+            "candidate_rows": [np.empty(0, dtype=np.int64) for _ in range(self.n_clusters)],
+            "plot_rows": np.empty(0, dtype=np.int64),
+            "plot_rng": np.random.default_rng(self.random_state),
+            "updated_at": None
+        }
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                state = joblib.load(self.state_path)
+                if (state.get("version") == STATE_VERSION
+                        and state.get("model_name") == self.embedding_store.model_name
+                        and state.get("n_clusters") == self.n_clusters
+                        and state.get("plot_sample") == self.plot_sample):
+                    logger.info(f"Loaded corpus analytics state covering {state['processed_rows']} abstracts.")
+                    return state
+                logger.warning("Corpus analytics state was built with other settings; starting over.")
+            except Exception as e:
+                logger.warning(f"Failed to load corpus analytics state ({e}); starting over.")
+        return self._new_state()
+
+    def _save_state(self):
+        # Written to a temporary file first so a crash never leaves a truncated state
+        tmp_path = f"{self.state_path}.tmp"
+        joblib.dump(self.state, tmp_path)
+        os.replace(tmp_path, self.state_path)
+
+    def _terms(self, text):
+        if self._analyzer is None:
+            from sklearn.feature_extraction.text import CountVectorizer
+            self._analyzer = CountVectorizer(stop_words="english").build_analyzer()
+        return set(self._analyzer(text))
+
+    def update(self):
+        """
+        Folds the embedding store rows added since the last update into the models and statistics.
+        Blocking; meant to be called from a worker thread.
+        Returns:
+            int: The number of abstracts processed.
+        """
+        with self._lock:
+            self.embedding_store.refresh()
+            total_rows = len(self.embedding_store)
+            if self.state["processed_rows"] > total_rows:
+                logger.warning("The embedding store shrank since the last analytics update; starting over.")
+                self.state = self._new_state()
+            start_row = self.state["processed_rows"]
+            # The models need at least n_clusters rows for their first fit
+            if total_rows - start_row < (self.n_clusters if start_row == 0 else 1):
+                return 0
+
+            start = time.perf_counter()
+            for chunk_start in range(start_row, total_rows, UPDATE_CHUNK_ROWS):
+                chunk_end = min(chunk_start + UPDATE_CHUNK_ROWS, total_rows)
+                # A short final chunk is merged into the previous one, since both models need several rows per fit
+                if 0 < total_rows - chunk_end < self.n_clusters:
+                    chunk_end = total_rows
+                self._update_rows(chunk_start, chunk_end)
+                if chunk_end == total_rows:
+                    break
+            self.state["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self._save_state()
+            processed = total_rows - start_row
+            logger.info(f"Corpus analytics updated with {processed} new abstracts "
+                        f"in {time.perf_counter() - start:.1f}s ({total_rows} in total).")
+            return processed
+
+    def _update_rows(self, start_row, end_row):
+        state = self.state
+        embeddings = np.asarray(self.embedding_store.matrix()[start_row:end_row])
+        state["kmeans"].partial_fit(embeddings)
+        if len(embeddings) >= 2:
+            state["pca"].partial_fit(embeddings)
+        labels = state["kmeans"].predict(embeddings)
+        state["cluster_sizes"] += np.bincount(labels, minlength=self.n_clusters)
+
+        dois = self.embedding_store.dois[start_row:end_row]
+        texts = {}
+        for i in range(0, len(dois), 1000):
+            for doc in self.collection.find({"doi": {"$in": dois[i:i + 1000]}}, {"_id": 0, "doi": 1, "abstract": 1}):
+                texts[doc["doi"]] = doc.get("abstract") or ""
+        for doi, label in zip(dois, labels):
+            text = texts.get(doi, "")
+            terms = self._terms(text)
+            state["cluster_terms"][label].update(terms)
+            state["term_documents"].update(terms)
+            state["word_count_total"] += len(text.split())
+
+        dates = self.embedding_store.dates[start_row:end_row]
+        earliest, latest = str(dates.min()), str(dates.max())
+        state["earliest_date"] = min(earliest, state["earliest_date"] or earliest)
+        state["latest_date"] = max(latest, state["latest_date"] or latest)
+        state["monthly_counts"].update(str(d)[:7] for d in dates)
+        self._update_candidates(embeddings, start_row)
+        self._update_plot_sample(start_row, end_row)
+        state["processed_rows"] = end_row
+
+    def _update_candidates(self, embeddings, start_row):
+        """
+        Keeps, per cluster, the REPRESENTATIVE_CANDIDATES rows closest to its current centroid
+        among the previous candidates and the new rows.
+        """
+        state = self.state
+        centroids = state["kmeans"].cluster_centers_
+        new_rows = np.arange(start_row, start_row + len(embeddings))
+        new_scores = embeddings @ centroids.T
+        for c, candidates in enumerate(state["candidate_rows"]):
+            candidates = np.sort(candidates)
+            old_scores = np.asarray(self.embedding_store.matrix()[candidates]) @ centroids[c]
+            rows = np.concatenate([candidates, new_rows])
+            scores = np.concatenate([old_scores, new_scores[:, c]])
+            state["candidate_rows"][c] = rows[top_k_indices(scores, REPRESENTATIVE_CANDIDATES)]
+
+    def _update_plot_sample(self, start_row, end_row):
+        """
+        Reservoir-samples the plot rows, so they stay a uniform sample of all processed rows.
+        """
+        state = self.state
+        rows = state["plot_rows"]
+        n_fill = max(0, min(self.plot_sample - len(rows), end_row - start_row))
+        rows = np.concatenate([rows, np.arange(start_row, start_row + n_fill)])
+        if start_row + n_fill < end_row:
+            # Row i replaces a uniformly drawn slot j when j falls inside the reservoir
+            remaining = np.arange(start_row + n_fill, end_row)
+            slots = state["plot_rng"].integers(0, remaining + 1)
+            for row, slot in zip(remaining[slots < len(rows)], slots[slots < len(rows)]):
+                rows[slot] = row
+        state["plot_rows"] = rows
+
+    def _keywords(self, cluster):
+        """
+        Ranks a cluster's terms by TF-IDF over documents: the fraction of the cluster's abstracts
+        containing the term, weighted by the term's inverse document frequency in the corpus.
+        """
+        state = self.state
+        size = max(int(state["cluster_sizes"][cluster]), 1)
+        n_documents = max(state["processed_rows"], 1)
+        scores = {
+            term: count / size * (math.log((1 + n_documents) / (1 + state["term_documents"][term])) + 1)
+            for term, count in state["cluster_terms"][cluster].items()
+        }
+        return sorted(scores, key=scores.get, reverse=True)[:self.top_keywords]
+
+    def report_context(self, representatives=5):
+        """
+        Builds the template context of the literature summary report from the current state.
+        Only the representative candidates and the plot sample are read from the embedding store.
+        Args:
+            representatives (int): Abstracts listed per cluster (at most REPRESENTATIVE_CANDIDATES).
+        Returns:
+            dict: Corpus totals, per-cluster sizes, keywords and representative abstracts, and
+                  projected points for the scatter plot; None if no analytics have been computed yet.
+        """
+        with self._lock:
+            state = self.state
+            n = state["processed_rows"]
+            if n == 0:
+                return None
+            matrix = self.embedding_store.matrix()
+            dates = self.embedding_store.dates
+            centroids = state["kmeans"].cluster_centers_
+
+            # Candidates closest to each centroid, best first
+            closest = []
+            for c, candidates in enumerate(state["candidate_rows"]):
+                candidates = np.sort(candidates)
+                scores = np.asarray(matrix[candidates]) @ centroids[c]
+                closest.append(candidates[top_k_indices(scores, representatives)])
+            rep_dois = [self.embedding_store.dois[r] for rows in closest for r in rows]
+            titles = {doc["doi"]: doc.get("title", "") for doc in self.collection.find(
+                {"doi": {"$in": rep_dois}}, {"_id": 0, "doi": 1, "title": 1})}
+
+            clusters = []
+            for c in range(len(centroids)):
+                clusters.append({
+                    "id": c,
+                    "size": int(state["cluster_sizes"][c]),
+                    "keywords": self._keywords(c),
+                    "representatives": [
+                        {"doi": self.embedding_store.dois[r], "title": titles.get(self.embedding_store.dois[r], ""),
+                         "date": str(dates[r])}
+                        for r in closest[c]
+                    ]
+                })
+
+            # The reservoir sample of abstracts, projected with the current PCA
+            sample = np.sort(state["plot_rows"])
+            sample_embeddings = np.asarray(matrix[sample])
+            points = state["pca"].transform(sample_embeddings) if hasattr(state["pca"], "components_") \
+                else np.zeros((len(sample), 2))
+            labels = state["kmeans"].predict(sample_embeddings)
+
+            return {
+                "n_abstracts": n,
+                "earliest_date": state["earliest_date"],
+                "latest_date": state["latest_date"],
+                "mean_word_count": state["word_count_total"] / n,
+                "clusters": clusters,
+                "points": [{"x": float(x), "y": float(y), "cluster": int(label)}
+                           for (x, y), label in zip(points, labels)],
+                "monthly_counts": sorted(state["monthly_counts"].items()),
+                "explained_variance": [float(v) for v in getattr(state["pca"], "explained_variance_ratio_", [])],
+                "updated_at": state["updated_at"]
+            }
+
+    def write_report(self, html):
+        tmp_path = f"{self.report_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(html)
+        os.replace(tmp_path, self.report_path)
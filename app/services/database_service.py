@@ -1,89 +1,653 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, UpdateOne, ReplaceOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime, timedelta
 import json
 from bson import json_util
-import requests
+import httpx
 from warnings import warn
+import asyncio
 import logging
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from .. import config
+from ..utils.aws import AsyncS3Client
+from ..utils import snapshot
+from ..utils.metrics import MongoCommandMetrics, DOCUMENTS_LOADED, S3_OBJECTS_LOADED, S3_BYTES_LOADED
 
 logger = logging.getLogger(__name__)
 
+# Records returned per page by the biorxiv details endpoint
+BIORXIV_PAGE_SIZE = 100
+
+# How often a shard stream blocked on a full queue checks whether the load was cancelled
+SHARD_STREAM_POLL_SECONDS = 1.0
+
+# _id of the abstracts collection's document in the corpus_meta collection
+CORPUS_META_ID = "abstracts"
+
+# Documents the embedding store encodes (a DOI and an abstract with text), for the
+# one-time count of a corpus_meta created over an existing collection
+EMBEDDABLE_FILTER = {"doi": {"$gt": ""}, "abstract": {"$regex": r"\S"}}
+
+# Partial index serving date-ordered lookups of abstracts with text ({"abstract": {"$gt": ""}})
+ABSTRACT_DATE_INDEX = "date_doi_with_abstract"
+
+
+def _is_embeddable(doc):
+    """
+    Whether the embedding store encodes a document (it skips those without a DOI or abstract text).
+    """
+    return bool(doc.get("doi")) and bool((doc.get("abstract") or "").strip())
+
+
+class _LoadProgress:
+    """
+    Counters for the S3 warm start, logged periodically with throughput figures.
+    """
+
+    def __init__(self, total_objects, log_interval=5.0):
+        self.total_objects = total_objects
+        self.log_interval = log_interval
+        self.objects = 0
+        self.bytes = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.start = time.perf_counter()
+        self._last_log = self.start
+
+    def maybe_log(self):
+        if time.perf_counter() - self._last_log >= self.log_interval:
+            self.log()
+
+    def log(self):
+        now = time.perf_counter()
+        self._last_log = now
+        elapsed = max(now - self.start, 1e-9)
+        logger.info(
+            f"S3 warm start: {self.objects}/{self.total_objects} objects, "
+            f"{self.inserted} inserted, {self.skipped} already present, "
+            f"{self.objects / elapsed:.1f} objects/s, {(self.inserted + self.skipped) / elapsed:.0f} docs/s, "
+            f"{self.bytes / elapsed / 1e6:.2f} MB/s, {elapsed:.1f}s elapsed."
+        )
+
 class DataBaseService:
-    def __init__(self, s3, s3_bucket, s3_prefix, mongo_uri="mongodb://localhost:27017", db_name="biorxiv"):
+    def __init__(self, s3, s3_bucket, s3_prefix, mongo_uri="mongodb://localhost:27017", db_name="biorxiv",
+                 embedding_store=None, mongo_max_pool_size=None, s3_max_pool_connections=None,
+                 http_max_connections=None):
         logger.info(f"Initializing DataBaseService with S3 bucket '{s3_bucket}' and prefix '{s3_prefix}'")
-        self.s3 = s3
+        # Pool sizes default to the values in app/config.py
+        s3_max_pool_connections = s3_max_pool_connections or config.S3_MAX_POOL_CONNECTIONS
+        http_max_connections = http_max_connections or config.HTTP_MAX_CONNECTIONS
+        # A plain boto3 client is wrapped so its calls run off the event loop
+        self.s3 = s3 if isinstance(s3, AsyncS3Client) else AsyncS3Client(s3, max_workers=s3_max_pool_connections)
         self.s3_bucket = s3_bucket
         self.s3_prefix = s3_prefix
         self.mongo_uri = mongo_uri
         self.db_name = db_name
+        # Optional EmbeddingStore kept in sync with the abstracts collection
+        self.embedding_store = embedding_store
         logger.info(f"Connecting to MongoDB at {mongo_uri} and database '{db_name}'")
-        self.db = MongoClient(self.mongo_uri)[self.db_name]
+        self.client = AsyncMongoClient(
+            self.mongo_uri,
+            maxPoolSize=mongo_max_pool_size or config.MONGO_MAX_POOL_SIZE,
+            minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            event_listeners=[MongoCommandMetrics()]  # per-command latency for /metrics
+        )
+        self.db = self.client[self.db_name]
+        # Warm-start tuning
+        self.warm_start_concurrency = config.S3_WARM_START_CONCURRENCY
+        self.insert_batch_size = config.MONGO_INSERT_BATCH_SIZE
+        self.warm_start_fields = config.S3_WARM_START_FIELDS
+        self.compaction_zstd_level = config.S3_COMPACTION_ZSTD_LEVEL
+        # Ingest tuning; the API URL can point at a local fake server for testing
+        self.biorxiv_api_url = config.BIORXIV_API_URL
+        self.ingest_concurrent_days = config.INGEST_CONCURRENT_DAYS
+        self.ingest_concurrent_pages = config.INGEST_CONCURRENT_PAGES
+        self.http_retries = config.HTTP_RETRIES
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=http_max_connections,
+                                max_keepalive_connections=http_max_connections),
+            timeout=config.HTTP_TIMEOUT_SECONDS
+        )
 
     async def setup(self):
         """
-        Explicitly initializes the MongoDB database from S3 and sets up indexes.
+        Explicitly sets up indexes and initializes the MongoDB database from S3.
         Should be called only by the background worker or setup script.
+        The indexes (and with them the abstracts collection) are created before the S3
+        backup is read, so a fresh deployment with an empty bucket can still ingest.
         """
         logger.info(f"Setting up MongoDB database '{self.db_name}' from S3 bucket '{self.s3_bucket}'")
-        await self.initialize_mongodb_from_s3()
         logger.info(f"Creating indexes for database '{self.db_name}'")
-        self.sort_db_by_date()
-        logger.info(f"Database '{self.db_name}' setup complete with indexes created.")
+        await self.sort_db_by_date()
+        await self.initialize_mongodb_from_s3()
+        # Objects skipped via the load manifest are not re-read, so abstracts missing from the
+        # embedding store (e.g. after it was deleted) are encoded from MongoDB instead
+        await self.backfill_embedding_store()
+        logger.info(f"Database '{self.db_name}' setup complete.")
 
     async def initialize_mongodb_from_s3(self):
         """
         Loads JSON documents from S3 and inserts them into MongoDB.
         Skips documents that already exist based on DOI.
+
+        The bucket listing is fully paginated and diffed against the load manifest (the
+        s3_manifest collection, one entry per loaded object with its ETag, size and document
+        count), so only objects that are new or changed since they were loaded are downloaded.
+        An object is added to the manifest only after all of its documents are inserted, so an
+        interrupted load resumes with the objects it had not finished.
+
+        Months rolled up by compact_s3_backup are read from their compacted shards, which are
+        decompressed and decoded as they stream in, together with their precomputed embeddings;
+        page files are read only where no shard covers them (the legacy layout).
+
+        Objects are downloaded by a bounded pool of workers and decoded off the event loop,
+        while a single consumer inserts documents in unordered batches. Existing DOIs are
+        rejected by the unique DOI index in the same round trip instead of being looked up
+        one at a time.
         """
         collection = self.db.abstracts
-        objects = self.s3.list_objects_v2(Bucket=self.s3_bucket, Prefix=self.s3_prefix).get("Contents", [])
-        if not objects:
+        listing = await self.s3.list_all_objects(Bucket=self.s3_bucket, Prefix=self.s3_prefix)
+        etags = {obj["Key"]: obj.get("ETag") for obj in listing}
+        compacted = await self._read_compacted_manifest(etags)
+        shards = {shard["key"]: shard for shard in compacted["shards"].values()}
+        covered = {key: etag for shard in shards.values() for key, etag in shard["sources"].items()}
+        compacted_prefix = f"{self.s3_prefix}/{snapshot.COMPACTED_DIR}/"
+        listing = [
+            obj for obj in listing
+            if obj["Key"] in shards
+            or (obj["Key"].endswith(".json") and not obj["Key"].startswith(compacted_prefix)
+                and covered.get(obj["Key"]) != obj.get("ETag"))
+        ]
+        if not listing:
             logger.info(f"No objects found in S3 bucket '{self.s3_bucket}' with prefix '{self.s3_prefix}'.")
             return
 
-        total_inserted = 0
-        logger.info(f"Found {len(objects)} objects in S3 bucket '{self.s3_bucket}' with prefix '{self.s3_prefix}'.")
-        # Iterate through each object in the S3 bucket
-        # and load JSON documents into MongoDB
-        logger.info("Loading JSON documents from S3 into MongoDB.")
+        logger.info(f"Found {len(listing)} objects in S3 bucket '{self.s3_bucket}' with prefix '{self.s3_prefix}'.")
+        # Duplicate detection relies on the unique DOI index, so it must exist before loading
+        # (setup creates it already; this covers direct callers)
+        await self.sort_db_by_date()
+
+        objects = await self._objects_to_load(listing, set(etags))
+        if not objects:
+            logger.info(f"All {len(listing)} S3 objects are already loaded into MongoDB '{self.db_name}'.")
+            return
+
+        logger.info(f"Loading {len(objects)} new or changed JSON objects from S3 into MongoDB "
+                    f"({len(listing) - len(objects)} already loaded).")
+        object_queue = asyncio.Queue()
         for obj in objects:
-            key = obj["Key"]
-            if key.endswith(".json"):
-                response = self.s3.get_object(Bucket=self.s3_bucket, Key=key)
-                content = response["Body"].read().decode("utf-8")
-                data = json_util.loads(content)
+            object_queue.put_nowait(obj)
+        # Bounded so downloads cannot run arbitrarily far ahead of the inserts
+        doc_queue = asyncio.Queue(maxsize=2 * self.warm_start_concurrency)
+        progress = _LoadProgress(total_objects=len(objects))
+
+        async def download_worker():
+            while True:
+                try:
+                    obj = object_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if obj["Key"] in shards:
+                    await self._load_shard_embeddings(shards[obj["Key"]])
+                    await self._stream_shard(obj, doc_queue)
+                    continue
+                body = await self.s3.get_object_body(Bucket=self.s3_bucket, Key=obj["Key"])
+                data = await asyncio.to_thread(json_util.loads, body)
                 documents = data if isinstance(data, list) else [data]
+                if self.warm_start_fields:
+                    documents = [{k: v for k, v in doc.items() if k in self.warm_start_fields} for doc in documents]
+                await doc_queue.put((obj, len(body), documents, True))
+
+        async def download_all():
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(min(self.warm_start_concurrency, len(objects))):
+                    tg.create_task(download_worker())
+            await doc_queue.put(None)
+
+        async def insert_worker():
+            # Items are (object, bytes, documents, is_last_chunk); shards arrive in several chunks.
+            # An object is recorded in the manifest after the batch holding its last chunk is
+            # inserted, by which time all of its earlier chunks have been inserted too.
+            batch = []
+            batch_objects = []
+            object_documents = {}
+            while True:
+                item = await doc_queue.get()
+                if item is None:
+                    break
+                obj, n_bytes, documents, is_last = item
+                batch.extend(doc for doc in documents if doc.get("doi"))
+                object_documents[obj["Key"]] = object_documents.get(obj["Key"], 0) + len(documents)
+                progress.bytes += n_bytes
+                S3_BYTES_LOADED.inc(n_bytes)
+                if is_last:
+                    batch_objects.append((obj, object_documents.pop(obj["Key"])))
+                    progress.objects += 1
+                    S3_OBJECTS_LOADED.inc()
+                if len(batch) >= self.insert_batch_size:
+                    await self._insert_batch(collection, batch, progress)
+                    await self._record_loaded_objects(batch_objects)
+                    batch, batch_objects = [], []
+                progress.maybe_log()
+            if batch:
+                await self._insert_batch(collection, batch, progress)
+            if batch_objects:
+                await self._record_loaded_objects(batch_objects)
+
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(insert_worker())
+            tg.create_task(download_all())
+
+        progress.log()
+        logger.info(f"MongoDB '{self.db_name}' initialized with {progress.inserted} new documents from S3.")
+
+    async def _stream_shard(self, obj, doc_queue):
+        """
+        Streams a compacted shard from S3 into doc_queue in chunks of documents. Decompression
+        and decoding run on the S3 client's thread pool while the body is still downloading,
+        and block whenever the queue is full.
+        If the load is cancelled (e.g. the insert worker failed and nothing drains the queue),
+        the blocked thread notices within SHARD_STREAM_POLL_SECONDS and stops, so it does not
+        hold an S3 pool thread until the event loop shuts down.
+        """
+        loop = asyncio.get_running_loop()
+        fields = self.warm_start_fields
+        cancelled = threading.Event()
+
+        def put(item):
+            future = asyncio.run_coroutine_threadsafe(doc_queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=SHARD_STREAM_POLL_SECONDS)
+                except FutureTimeoutError:
+                    if cancelled.is_set():
+                        future.cancel()
+                        raise asyncio.CancelledError(f"Streaming {obj['Key']} was cancelled.")
 
-                new_docs = []
-                for doc in documents:
-                    doi = doc.get("doi")
-                    if doi and not collection.find_one({"doi": doi}):
-                        new_docs.append(doc)
+        def consume(body):
+            pending = None
+            for chunk in snapshot.iter_shard_chunks(body, fields=fields):
+                # Each chunk is held back until the next one is decoded, so the last one can be flagged
+                if pending is not None:
+                    put((obj, 0, pending, False))
+                pending = chunk
+            put((obj, obj.get("Size") or 0, pending or [], True))
 
-                # Insert new documents into MongoDB
-                logger.info(f"Inserting {len(new_docs)} new documents from {key} into MongoDB.")
-                if new_docs:
-                    collection.insert_many(new_docs)
-                    total_inserted += len(new_docs)
+        try:
+            await self.s3.stream_object(Bucket=self.s3_bucket, Key=obj["Key"], consume=consume)
+        finally:
+            cancelled.set()
 
-        logger.info(f"MongoDB '{self.db_name}' initialized with {total_inserted} new documents from S3.")
+    async def _load_shard_embeddings(self, shard):
+        """
+        Adds a shard's precomputed embeddings to the embedding store, so its abstracts are not
+        re-encoded when they are inserted. Skipped if there is no store, the shard has no
+        embeddings, or they were computed with a different model.
+        """
+        if self.embedding_store is None or not shard.get("embeddings_key"):
+            return
+        if shard.get("embedding_model") != self.embedding_store.model_name:
+            logger.info(f"Shard {shard['key']} has embeddings from '{shard.get('embedding_model')}'; "
+                        f"abstracts will be re-encoded with '{self.embedding_store.model_name}'.")
+            return
+        body = await self.s3.get_object_body(Bucket=self.s3_bucket, Key=shard["embeddings_key"])
+        dois, dates, embeddings = await asyncio.to_thread(snapshot.decode_embeddings, body)
+        added = await asyncio.to_thread(self.embedding_store.add_embeddings, dois, dates, embeddings)
+        if added:
+            logger.info(f"Added {added} precomputed embeddings from {shard['embeddings_key']} to the embedding store.")
+
+    async def _read_compacted_manifest(self, etags):
+        """
+        Reads the compacted snapshot manifest if it is in the bucket listing (etags: key -> ETag).
+        Returns:
+            dict: The manifest, or an empty one if the bucket has no compacted shards.
+        """
+        key = snapshot.manifest_key(self.s3_prefix)
+        if key not in etags:
+            return snapshot.empty_manifest()
+        body = await self.s3.get_object_body(Bucket=self.s3_bucket, Key=key)
+        manifest = snapshot.load_manifest(body)
+        # A shard missing from the listing cannot be read, so its page files are loaded instead
+        manifest["shards"] = {month: shard for month, shard in manifest["shards"].items() if shard["key"] in etags}
+        return manifest
 
-    def sort_db_by_date(self):
+    async def compact_s3_backup(self, include_current_month=False, delete_sources=False):
+        """
+        Rolls the daily page files written by ingest into one compacted shard per month
+        (zstd-compressed JSON lines, see app/utils/snapshot.py), with the month's embeddings
+        from the embedding store alongside, and records them in the compacted manifest.
+        A month is rewritten only if it has page files that are new or changed since its shard
+        was written; the existing shard is merged with them, the newest copy of a DOI winning.
+        Args:
+            include_current_month (bool): Also compact the current month, which ingest is still adding to.
+            delete_sources (bool): Delete page files from S3 once their shard is recorded in the manifest.
+        Returns:
+            dict: Numbers of 'months' compacted, 'pages' rolled up, 'documents' written and 'deleted' page files.
+        """
+        listing = await self.s3.list_all_objects(Bucket=self.s3_bucket, Prefix=self.s3_prefix)
+        etags = {obj["Key"]: obj.get("ETag") for obj in listing}
+        manifest = await self._read_compacted_manifest(etags)
+        pages_by_month = {}
+        for obj in listing:
+            month = snapshot.page_month(self.s3_prefix, obj["Key"])
+            if month is not None:
+                pages_by_month.setdefault(month, []).append(obj)
+
+        stats = {"months": 0, "pages": 0, "documents": 0, "deleted": 0}
+        current_month = datetime.utcnow().strftime("%Y-%m")
+        for month in sorted(pages_by_month):
+            if month >= current_month and not include_current_month:
+                continue
+            shard = manifest["shards"].get(month)
+            sources = shard["sources"] if shard else {}
+            new_pages = [obj for obj in pages_by_month[month] if sources.get(obj["Key"]) != obj.get("ETag")]
+            if new_pages:
+                start = time.perf_counter()
+                shard = await self._compact_month(month, shard, new_pages)
+                manifest["shards"][month] = shard
+                await self.s3.put_object(Bucket=self.s3_bucket, Key=snapshot.manifest_key(self.s3_prefix),
+                                         Body=snapshot.dump_manifest(manifest), ContentType="application/json")
+                stats["months"] += 1
+                stats["pages"] += len(new_pages)
+                stats["documents"] += shard["documents"]
+                logger.info(f"Compacted {len(new_pages)} page files of {month} into {shard['key']} "
+                            f"({shard['documents']} documents, {shard['bytes'] / 1e6:.2f} MB) "
+                            f"in {time.perf_counter() - start:.1f}s.")
+            if delete_sources and shard:
+                # Only pages whose current version is in the shard are deleted
+                compacted_pages = [obj["Key"] for obj in pages_by_month[month]
+                                   if shard["sources"].get(obj["Key"]) == obj.get("ETag")]
+                for i in range(0, len(compacted_pages), 1000):
+                    await self.s3.delete_objects(Bucket=self.s3_bucket, Delete={
+                        "Objects": [{"Key": key} for key in compacted_pages[i:i + 1000]]
+                    })
+                stats["deleted"] += len(compacted_pages)
+        logger.info(f"S3 backup compaction finished: {stats['months']} months rewritten from {stats['pages']} "
+                    f"page files, {stats['deleted']} page files deleted.")
+        return stats
+
+    async def _compact_month(self, month, shard, new_pages):
+        """
+        Writes the shard (and embeddings) for one month from its previous shard, if any, and its new page files.
+        Returns:
+            dict: The month's manifest entry.
+        """
+        documents = {}
+        if shard:
+            def read_shard(body):
+                return [doc for chunk in snapshot.iter_shard_chunks(body) for doc in chunk]
+            for doc in await self.s3.stream_object(Bucket=self.s3_bucket, Key=shard["key"], consume=read_shard):
+                documents[doc["doi"]] = doc
+        for obj in sorted(new_pages, key=lambda obj: obj["Key"]):
+            body = await self.s3.get_object_body(Bucket=self.s3_bucket, Key=obj["Key"])
+            data = await asyncio.to_thread(json_util.loads, body)
+            for doc in data if isinstance(data, list) else [data]:
+                if doc.get("doi"):
+                    documents[doc["doi"]] = doc
+        ordered = sorted(documents.values(), key=lambda doc: (str(doc.get("date")), doc["doi"]))
+
+        key = snapshot.shard_key(self.s3_prefix, month)
+        body = await asyncio.to_thread(snapshot.encode_shard, ordered, self.compaction_zstd_level)
+        response = await self.s3.put_object(Bucket=self.s3_bucket, Key=key, Body=body,
+                                            ContentType="application/zstd")
+        entry = {
+            "key": key,
+            "etag": response.get("ETag"),
+            "documents": len(ordered),
+            "bytes": len(body),
+            "sources": {**(shard["sources"] if shard else {}),
+                        **{obj["Key"]: obj.get("ETag") for obj in new_pages}},
+            "compacted_at": datetime.utcnow().isoformat()
+        }
+
+        if self.embedding_store is not None:
+            embeddings = await asyncio.to_thread(self.embedding_store.get_embeddings, [doc["doi"] for doc in ordered])
+            if embeddings is not None:
+                dois, dates, vectors = embeddings
+                entry["embeddings_key"] = snapshot.embeddings_key(self.s3_prefix, month)
+                entry["embedding_model"] = self.embedding_store.model_name
+                entry["embeddings"] = len(dois)
+                await self.s3.put_object(Bucket=self.s3_bucket, Key=entry["embeddings_key"],
+                                         Body=snapshot.encode_embeddings(dois, dates, vectors),
+                                         ContentType="application/octet-stream")
+
+        # If the new pages and the previous shard (or all of its pages) are already loaded into
+        # MongoDB, so is the new shard, and the next warm start need not download it
+        new_sources = {obj["Key"]: obj.get("ETag") for obj in new_pages}
+        previous = {shard["key"]: shard.get("etag")} if shard else {}
+        loaded = {doc["_id"]: doc.get("etag") async for doc in self.db.s3_manifest.find(
+            {"_id": {"$in": list({**entry["sources"], **previous})}}, {"etag": 1})}
+
+        def all_loaded(objects):
+            return all(loaded.get(object_key) == etag for object_key, etag in objects.items())
+
+        if all_loaded(new_sources) and (all_loaded(previous) or all_loaded(entry["sources"])):
+            await self._record_loaded_objects([
+                ({"Key": key, "ETag": response.get("ETag"), "Size": len(body)}, len(ordered))
+            ])
+        return entry
+
+    async def _objects_to_load(self, listing, bucket_keys):
+        """
+        Diffs a bucket listing against the load manifest.
+        Manifest entries of objects that are no longer in the bucket are removed; objects that
+        were only filtered out of the listing (e.g. pages covered by a compacted shard) keep
+        theirs, so they are not reloaded once the shard is gone. If the
+        abstracts collection is empty (e.g. it was dropped), the manifest is stale and is cleared.
+        Returns:
+            list of dict: The listed objects that are not in the manifest or whose ETag or size changed.
+        Args:
+            listing (list of dict): S3 listing entries of the objects to load.
+            bucket_keys (set of str): Every key under the prefix, before filtering.
+        """
+        manifest = self.db.s3_manifest
+        if await self.db.abstracts.estimated_document_count() == 0:
+            if await manifest.estimated_document_count():
+                logger.warning("The abstracts collection is empty; clearing the stale S3 load manifest.")
+                await manifest.delete_many({})
+            await self._reset_corpus_meta()
+            return listing
+
+        loaded = {}
+        async for entry in manifest.find({}, {"etag": 1, "size": 1}):
+            loaded[entry["_id"]] = (entry.get("etag"), entry.get("size"))
+        removed = [key for key in loaded if key not in bucket_keys]
+        if removed:
+            logger.info(f"Removing {len(removed)} objects that are no longer in S3 from the load manifest.")
+            await manifest.delete_many({"_id": {"$in": removed}})
+        return [obj for obj in listing if loaded.get(obj["Key"]) != (obj.get("ETag"), obj.get("Size"))]
+
+    async def _record_loaded_objects(self, loaded_objects):
+        """
+        Upserts load manifest entries for completely loaded S3 objects.
+        Args:
+            loaded_objects (list of tuple): (S3 listing entry or dict with 'Key', 'ETag' and 'Size', document count) pairs.
+        """
+        if not loaded_objects:
+            return
+        now = datetime.utcnow()
+        await self.db.s3_manifest.bulk_write([
+            UpdateOne(
+                {"_id": obj["Key"]},
+                {"$set": {"etag": obj.get("ETag"), "size": obj.get("Size"), "documents": n_documents, "loaded_at": now}},
+                upsert=True
+            )
+            for obj, n_documents in loaded_objects
+        ], ordered=False)
+
+    async def _insert_batch(self, collection, batch, progress):
+        """
+        Inserts a batch of documents without stopping at duplicates and updates the embedding store.
+        """
+        try:
+            await collection.insert_many(batch, ordered=False)
+            new_documents = batch
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != 11000 for err in write_errors):
+                raise
+            duplicates = {err["index"] for err in write_errors}
+            new_documents = [doc for i, doc in enumerate(batch) if i not in duplicates]
+        inserted = len(new_documents)
+        if inserted:
+            await self._update_corpus_meta(batch, new_documents)
+        progress.inserted += inserted
+        progress.skipped += len(batch) - inserted
+        DOCUMENTS_LOADED.labels(source="s3", outcome="inserted").inc(inserted)
+        DOCUMENTS_LOADED.labels(source="s3", outcome="skipped").inc(len(batch) - inserted)
+        # The store skips DOIs it already holds, so passing every document also backfills
+        # abstracts of the loaded objects that are in MongoDB but not in the store. Objects
+        # skipped via the load manifest are covered by backfill_embedding_store.
+        await self.update_embedding_store(batch)
+
+    async def update_embedding_store(self, documents):
+        """
+        Encodes any documents not yet present in the embedding store, if one is configured.
+        Encoding runs in a worker thread so it does not block the event loop.
+        """
+        if self.embedding_store is None or not documents:
+            return 0
+        added = await asyncio.to_thread(self.embedding_store.add_documents, documents)
+        if added:
+            logger.info(f"Added {added} new embeddings to the embedding store.")
+        return added
+
+    async def backfill_embedding_store(self, batch_size=1000):
+        """
+        Encodes abstracts that are in MongoDB but missing from the embedding store, e.g. after
+        the store was deleted or an encoding failed. Nothing is read from MongoDB if the store
+        holds at least as many rows as the corpus has embeddable abstracts (the corpus
+        metadata's 'embeddable' count); otherwise only DOIs are scanned (from the partial
+        date/doi index) and just the missing abstracts are fetched.
+        Args:
+            batch_size (int): Abstracts fetched and encoded per batch.
+        Returns:
+            int: The number of embeddings added.
+        """
+        if self.embedding_store is None:
+            return 0
+        await asyncio.to_thread(self.embedding_store.refresh)
+        meta = await self.get_corpus_meta()
+        if meta is None or len(self.embedding_store) >= meta.get("embeddable", 0):
+            return 0
+
+        missing = []
+        async for doc in self.db.abstracts.find({"abstract": {"$gt": ""}}, {"_id": 0, "doi": 1}):
+            if doc.get("doi") and doc["doi"] not in self.embedding_store:
+                missing.append(doc["doi"])
+        if not missing:
+            return 0
+        logger.info(f"Backfilling {len(missing)} abstracts that are missing from the embedding store.")
+        added = 0
+        for i in range(0, len(missing), batch_size):
+            documents = [doc async for doc in self.db.abstracts.find(
+                {"doi": {"$in": missing[i:i + batch_size]}}, {"_id": 0, "doi": 1, "abstract": 1, "date": 1}
+            )]
+            added += await self.update_embedding_store(documents)
+        return added
+
+    async def sort_db_by_date(self):
         """        
-        Creates indexes on the abstracts collection for efficient querying.
+        Creates indexes on the abstracts collection for efficient querying, and the corpus
+        metadata document if it does not exist yet (for an empty or a pre-existing collection).
+        The partial (date, doi) index only holds abstracts with text, so the notebooks'
+        earliest/latest date lookups and date range queries on {"abstract": {"$gt": ""}}
+        are served from it without touching documents without an abstract.
         """
-        self.db.abstracts.create_index([("date", 1)])
-        self.db.abstracts.create_index("doi", unique=True)
+        await self.db.abstracts.create_index([("date", 1)])
+        await self.db.abstracts.create_index("doi", unique=True)
+        await self.db.abstracts.create_index(
+            [("date", 1), ("doi", 1)],
+            name=ABSTRACT_DATE_INDEX,
+            partialFilterExpression={"abstract": {"$gt": ""}}
+        )
+        await self._ensure_corpus_meta()
 
-    def check_db_initialized(self):
+    async def get_corpus_meta(self):
         """
-        Checks if the database is initialized by verifying the existence of the abstracts collection.
+        Returns the corpus metadata document, or None if the database is not initialized.
         Returns:
-            bool: True if the abstracts collection exists, False otherwise.
+            dict: 'count', 'embeddable' (documents with a DOI and an abstract with text, i.e. those the
+                  embedding store encodes), 'earliest_date', 'latest_date' (YYYY-MM-DD strings, absent
+                  while empty), 'version' (incremented by every write that adds or replaces abstracts)
+                  and 'updated_at'.
+        """
+        return await self.db.corpus_meta.find_one({"_id": CORPUS_META_ID})
+
+    async def _ensure_corpus_meta(self):
         """
-        check_result = "abstracts" in self.db.list_collection_names()
+        Creates the corpus metadata document if it is missing: empty for a new database, or
+        describing the existing abstracts of a database populated before the metadata was
+        maintained. The count is the collection's estimated document count (read from its
+        metadata) and the dates come from the ends of the date index. Only the embeddable
+        count needs a scan, once, for a collection that already holds documents (or metadata
+        written before that count was kept). Must run after the indexes are created.
+        """
+        existing = await self.db.corpus_meta.find_one({"_id": CORPUS_META_ID}, {"embeddable": 1})
+        if existing:
+            if "embeddable" not in existing:
+                embeddable = await self.db.abstracts.count_documents(EMBEDDABLE_FILTER)
+                await self.db.corpus_meta.update_one(
+                    {"_id": CORPUS_META_ID, "embeddable": {"$exists": False}},
+                    {"$set": {"embeddable": embeddable}}
+                )
+            return
+        count = await self.db.abstracts.estimated_document_count()
+        embeddable = await self.db.abstracts.count_documents(EMBEDDABLE_FILTER) if count else 0
+        meta = {"count": count, "embeddable": embeddable, "version": 1 if count else 0, "updated_at": datetime.utcnow()}
+        # Dates are only set once known: $min never replaces a stored null, which sorts before strings
+        if count:
+            earliest = await self.db.abstracts.find_one({}, {"_id": 0, "date": 1}, sort=[("date", 1)])
+            latest = await self.db.abstracts.find_one({}, {"_id": 0, "date": 1}, sort=[("date", -1)])
+            if earliest and earliest.get("date"):
+                meta["earliest_date"] = earliest["date"]
+            if latest and latest.get("date"):
+                meta["latest_date"] = latest["date"]
+        await self.db.corpus_meta.update_one({"_id": CORPUS_META_ID}, {"$setOnInsert": meta}, upsert=True)
+        logger.info(f"Created the corpus metadata for {count} existing abstracts.")
+
+    async def _update_corpus_meta(self, documents, new_documents):
+        """
+        Folds written abstracts into the corpus metadata in one atomic update, so concurrent
+        writers never lose each other's counts.
+        Args:
+            documents (list of dict): Abstracts now in the collection (newly inserted or replaced).
+            new_documents (list of dict): The ones among them that were not in the collection before.
+        """
+        dates = [str(doc["date"]) for doc in documents if doc.get("date")]
+        embeddable = sum(1 for doc in new_documents if _is_embeddable(doc))
+        update = {
+            "$inc": {"count": len(new_documents), "embeddable": embeddable, "version": 1},
+            "$set": {"updated_at": datetime.utcnow()}
+        }
+        if dates:
+            update["$min"] = {"earliest_date": min(dates)}
+            update["$max"] = {"latest_date": max(dates)}
+        await self.db.corpus_meta.update_one({"_id": CORPUS_META_ID}, update, upsert=True)
+
+    async def _reset_corpus_meta(self):
+        """
+        Resets the corpus metadata to an empty corpus, keeping the version increasing.
+        """
+        await self.db.corpus_meta.update_one({"_id": CORPUS_META_ID}, {
+            "$set": {"count": 0, "embeddable": 0, "updated_at": datetime.utcnow()},
+            "$unset": {"earliest_date": "", "latest_date": ""},
+            "$inc": {"version": 1}
+        }, upsert=True)
+
+    async def check_db_initialized(self):
+        """
+        Checks if the database is initialized by looking up the corpus metadata document,
+        which setup() creates together with the abstracts collection's indexes.
+        Returns:
+            bool: True if the database is initialized, False otherwise.
+        """
+        check_result = await self.db.corpus_meta.find_one({"_id": CORPUS_META_ID}, {"_id": 1}) is not None
         if not check_result:
-            logger.warning("Database is not initialized. 'abstracts' collection does not exist.")
+            logger.warning("Database is not initialized. The corpus metadata does not exist; run setup() first.")
         return check_result
 
     async def get_max_index_in_db(self):
@@ -92,9 +656,9 @@ class DataBaseService:
         Returns:
             int: The maximum index found in the database, or None if no documents exist.
         """
-        if not self.check_db_initialized():
+        if not await self.check_db_initialized():
             return None
-        doc = self.db.abstracts.find_one(sort=[("index", -1)])
+        doc = await self.db.abstracts.find_one(sort=[("index", -1)])
         if not doc:
             logger.warning("No documents found in the abstracts collection.")
             return None
@@ -104,106 +668,237 @@ class DataBaseService:
 
     async def get_latest_date_in_db(self, beginning_date=datetime(2024, 1, 1).date()):
         """
-        Retrieves the latest date from the abstracts collection.
+        Retrieves the latest date of the abstracts collection from the corpus metadata.
         If the collection is empty, returns the specified beginning_date.
         Args:
             beginning_date (datetime.date): The date to return if the collection is empty.
         Returns:
-            datetime: The latest date found in the database, or None if no documents exist.
+            datetime: The latest date found in the database, or beginning_date if no documents exist.
         """
-        if not self.check_db_initialized():
+        meta = await self.get_corpus_meta()
+        if meta is None:
+            logger.warning("Database is not initialized. The corpus metadata does not exist; run setup() first.")
             return beginning_date
-        elif self.db.abstracts.count_documents({}) == 0:
+        if not meta.get("count") or not meta.get("latest_date"):
             return beginning_date
         try:
-            doc = self.db.abstracts.find_one(sort=[("date", -1)])
-            return datetime.strptime(doc["date"], "%Y-%m-%d").date()
+            return datetime.strptime(meta["latest_date"], "%Y-%m-%d").date()
         except Exception as e:
             assert False, f"Error retrieving latest date from DB: {e}"
 
     async def nuke_db(self):
         """
-        Deletes all documents in the abstracts collection, as well as anything in S3 with the same prefix.
+        Deletes all documents in the abstracts collection and the S3 load manifest (resetting the corpus metadata), as well as anything in S3 with the same prefix.
         This operation is irreversible and should be used with caution.
         It is intended for development or testing purposes only.
         Does not delete the collection itself, only its contents.
         """
         logger.info("Nuking the abstracts collection in MongoDB.")
-        if self.check_db_initialized():
-            self.db.abstracts.delete_many({})
+        if await self.check_db_initialized():
+            await self.db.abstracts.delete_many({})
+            await self._reset_corpus_meta()
+        await self.db.s3_manifest.delete_many({})
 
         # delte all objects in S3 with the specified prefix
         logger.info(f"Deleting all objects in S3 bucket '{self.s3_bucket}' with prefix '{self.s3_prefix}'.")
-        objects = self.s3.list_objects_v2(Bucket=self.s3_bucket, Prefix=self.s3_prefix).get("Contents", [])
+        objects = await self.s3.list_all_objects(Bucket=self.s3_bucket, Prefix=self.s3_prefix)
         if objects:
-            delete_keys = {"Objects": [{"Key": obj["Key"]} for obj in objects]}
-            # print(delete_keys)
-            response = self.s3.delete_objects(Bucket=self.s3_bucket, Delete=delete_keys)
-            logger.info(f"response: {response}  ")
-            logger.info(f"Deleted {len(delete_keys['Objects'])} objects from S3 bucket '{self.s3_bucket}' with prefix '{self.s3_prefix}'.")
+            # delete_objects accepts at most 1000 keys per call
+            for i in range(0, len(objects), 1000):
+                delete_keys = {"Objects": [{"Key": obj["Key"]} for obj in objects[i:i + 1000]]}
+                response = await self.s3.delete_objects(Bucket=self.s3_bucket, Delete=delete_keys)
+                logger.info(f"response: {response}  ")
+            logger.info(f"Deleted {len(objects)} objects from S3 bucket '{self.s3_bucket}' with prefix '{self.s3_prefix}'.")
         else:
             logger.info(f"No objects found in S3 bucket '{self.s3_bucket}' with prefix '{self.s3_prefix}'. Nothing to delete.")
         # Log the completion of the nuke operation
         logger.info("Nuke operation completed. All documents in the abstracts collection and S3 have been deleted.")
 
-    async def ingest(self, start_date, end_date, max_pages=1, skip_existing=True):
+    async def ingest(self, start_date, end_date, max_pages=None, skip_existing=True):
         """
         Ingests abstracts from the biorxiv API into MongoDB and stores them in S3.
         Skips documents that already exist in the DB based on DOI.
+
+        Up to ingest_concurrent_days days are processed at once over the pooled HTTP client,
+        with at most ingest_concurrent_pages requests in flight. Each day is paged with the
+        API's record cursor until the day's reported total is reached, and each page is
+        written with a single unordered bulk upsert keyed on DOI.
+        Args:
+            start_date (datetime.date): First day to ingest.
+            end_date (datetime.date): Last day to ingest (inclusive).
+            max_pages (int): Optional cap on pages per day; None follows every page.
+            skip_existing (bool): If False, existing abstracts are replaced by the fetched version.
+        Returns:
+            dict: Counts of 'fetched', 'inserted' and 'skipped' abstracts, or None if the DB is not initialized.
         """
-        if not self.check_db_initialized():
+        if not await self.check_db_initialized():
             logger.warning("Database is not initialized. Cannot ingest data.")
             return
-        current = start_date
         logger.info(f"Starting ingestion from {start_date} to {end_date}.")
+        start = time.perf_counter()
+        days = []
+        current = start_date
         while current <= end_date:
-            date_str = current.strftime("%Y-%m-%d")
-            page = 0
-
-            while page < max_pages:
-                url = f"https://api.biorxiv.org/details/biorxiv/{date_str}/{date_str}/{page}"
-                logger.info(f"Fetching abstracts from {url})")
-                response = requests.get(url)
-                data = response.json()
-                abstracts = data.get("collection", [])
-                new_abstracts = []
-                if not abstracts:
-                    break
+            days.append(current)
+            current += timedelta(days=1)
 
-                for abstract in abstracts:
-                    doi = abstract.get("doi")
-                    is_old = doi and self.db.abstracts.find_one({"doi": doi})
-                    do_insert = True
-                    if skip_existing:
-                        if is_old:
-                            logger.info(f"Skipping existing abstract with DOI: {doi}")
-                            do_insert = False
-                    if do_insert:
-                        self.db.abstracts.insert_one(abstract)
-                        new_abstracts.append(abstract)
-
-                # Save only new abstracts to S3
-                if new_abstracts:
-                    s3_key = f"{self.s3_prefix}/{date_str}/page_{page}.json"
-                    self.s3.put_object(
-                        Bucket=self.s3_bucket,
-                        Key=s3_key,
-                        Body=json_util.dumps(new_abstracts),
-                        ContentType="application/json"
-                    )
-
-                if len(abstracts) < 100:
-                    break
+        stats = {"fetched": 0, "inserted": 0, "skipped": 0}
+        failed_days = []
+        day_slots = asyncio.Semaphore(self.ingest_concurrent_days)
+        request_slots = asyncio.Semaphore(self.ingest_concurrent_pages)
 
-                page += 1
-                if page >= max_pages:
-                    logger.warning(f"Reached max page limit ({max_pages}) for {date_str}. Stopping ingestion.")
-                    break
+        async def ingest_day(day):
+            async with day_slots:
+                date_str = day.strftime("%Y-%m-%d")
+                try:
+                    day_stats = await self._ingest_day(date_str, request_slots, max_pages, skip_existing)
+                except Exception:
+                    logger.exception(f"Failed to ingest abstracts for {date_str}.")
+                    failed_days.append(date_str)
+                    return
+                for k in stats:
+                    stats[k] += day_stats[k]
 
-            current += timedelta(days=1)
+        await asyncio.gather(*(ingest_day(day) for day in days))
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        logger.info(
+            f"Ingestion from {start_date} to {end_date} complete: {stats['fetched']} fetched, "
+            f"{stats['inserted']} inserted, {stats['skipped']} already present "
+            f"({stats['fetched'] / elapsed:.0f} docs/s, {elapsed:.1f}s)."
+        )
+        if failed_days:
+            logger.warning(f"Ingestion failed for {len(failed_days)} day(s): {', '.join(sorted(failed_days))}")
+        return stats
+
+    async def _fetch_page(self, date_str, cursor, request_slots):
+        """
+        Fetches one page of the biorxiv details endpoint, retrying transient failures.
+        Returns:
+            tuple: (list of abstracts, total number of records for the day or None if not reported)
+        """
+        url = f"{self.biorxiv_api_url}/{date_str}/{date_str}/{cursor}"
+        for attempt in range(1, self.http_retries + 1):
+            try:
+                async with request_slots:
+                    logger.info(f"Fetching abstracts from {url}")
+                    response = await self.http.get(url)
+                response.raise_for_status()
+                break
+            except httpx.HTTPError as e:
+                if attempt == self.http_retries:
+                    raise
+                logger.warning(f"Request to {url} failed ({e}); retrying ({attempt}/{self.http_retries}).")
+                await asyncio.sleep(2 ** attempt)
+        data = response.json()
+        total = None
+        messages = data.get("messages") or []
+        if messages and "total" in messages[0]:
+            total = int(messages[0]["total"])
+        return data.get("collection", []), total
+
+    async def _ingest_day(self, date_str, request_slots, max_pages, skip_existing):
+        """
+        Ingests every page of one day. The first page reports the day's total, after which
+        the remaining cursors are fetched concurrently.
+        """
+        stats = {"fetched": 0, "inserted": 0, "skipped": 0}
+
+        def add(page_stats):
+            for k in stats:
+                stats[k] += page_stats[k]
+
+        abstracts, total = await self._fetch_page(date_str, 0, request_slots)
+        add(await self._store_page(date_str, 0, abstracts, skip_existing))
+        if len(abstracts) < BIORXIV_PAGE_SIZE:
+            return stats
+
+        if total is not None:
+            cursors = list(range(BIORXIV_PAGE_SIZE, total, BIORXIV_PAGE_SIZE))
+            if max_pages is not None and len(cursors) >= max_pages:
+                logger.warning(f"Reached max page limit ({max_pages}) for {date_str}. Stopping ingestion.")
+                cursors = cursors[:max_pages - 1]
+
+            async def ingest_page(cursor):
+                page_abstracts, _ = await self._fetch_page(date_str, cursor, request_slots)
+                return await self._store_page(date_str, cursor // BIORXIV_PAGE_SIZE, page_abstracts, skip_existing)
+
+            for page_stats in await asyncio.gather(*(ingest_page(cursor) for cursor in cursors)):
+                add(page_stats)
+            return stats
+
+        # The API did not report a total, so follow the cursor until a short page
+        page = 1
+        while max_pages is None or page < max_pages:
+            abstracts, _ = await self._fetch_page(date_str, page * BIORXIV_PAGE_SIZE, request_slots)
+            add(await self._store_page(date_str, page, abstracts, skip_existing))
+            if len(abstracts) < BIORXIV_PAGE_SIZE:
+                return stats
+            page += 1
+        logger.warning(f"Reached max page limit ({max_pages}) for {date_str}. Stopping ingestion.")
+        return stats
+
+    async def _store_page(self, date_str, page, abstracts, skip_existing):
+        """
+        Upserts one page of abstracts on DOI in a single unordered bulk write, then saves
+        the abstracts that were new to S3 and the embedding store.
+        """
+        abstracts = [abstract for abstract in abstracts if abstract.get("doi")]
+        stats = {"fetched": len(abstracts), "inserted": 0, "skipped": 0}
+        if not abstracts:
+            return stats
+
+        if skip_existing:
+            ops = [UpdateOne({"doi": a["doi"]}, {"$setOnInsert": a}, upsert=True) for a in abstracts]
+        else:
+            ops = [ReplaceOne({"doi": a["doi"]}, a, upsert=True) for a in abstracts]
+        try:
+            result = await self.db.abstracts.bulk_write(ops, ordered=False)
+            upserted = set(result.upserted_ids)
+        except BulkWriteError as e:
+            # Concurrent days can race to upsert the same DOI; the loser hits the unique index
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            upserted = {u["index"] for u in e.details.get("upserted", [])}
+
+        inserted_abstracts = [abstracts[i] for i in sorted(upserted)]
+        new_abstracts = inserted_abstracts if skip_existing else abstracts
+        stats["inserted"] = len(upserted)
+        stats["skipped"] = len(abstracts) - len(upserted)
+        DOCUMENTS_LOADED.labels(source="ingest", outcome="inserted").inc(stats["inserted"])
+        DOCUMENTS_LOADED.labels(source="ingest", outcome="skipped").inc(stats["skipped"])
+        logger.info(f"{date_str} page {page}: {stats['inserted']} new abstracts, {stats['skipped']} already present.")
+        if new_abstracts:
+            await self._update_corpus_meta(new_abstracts, inserted_abstracts)
+
+        # Save only new abstracts to S3
+        if new_abstracts:
+            s3_key = f"{self.s3_prefix}/{date_str}/page_{page}.json"
+            body = json_util.dumps(new_abstracts).encode("utf-8")
+            response = await self.s3.put_object(
+                Bucket=self.s3_bucket,
+                Key=s3_key,
+                Body=body,
+                ContentType="application/json"
+            )
+            await self.update_embedding_store(new_abstracts)
+            # Its documents are now in MongoDB and the embedding store, so the next warm start
+            # need not download the object. If encoding failed, the object stays unrecorded and is reloaded.
+            await self._record_loaded_objects([
+                ({"Key": s3_key, "ETag": response.get("ETag"), "Size": len(body)}, len(new_abstracts))
+            ])
+        return stats
 
     async def retrieve_by_doi(self, doi):
-        return self.db.abstracts.find_one({"doi": doi})
+        return await self.db.abstracts.find_one({"doi": doi})
 
     async def retrieve_by_index(self, index):
-        return self.db.abstracts.find_one({"index": index})
+        return await self.db.abstracts.find_one({"index": index})
+
+    async def close(self):
+        """
+        Closes the MongoDB, HTTP and S3 connection pools.
+        """
+        await self.http.aclose()
+        await self.client.close()
+        self.s3.close()
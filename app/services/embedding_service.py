@@ -0,0 +1,130 @@
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+from ..utils.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """
+    Encodes query texts with the embedding store's sentence encoder, shared by all requests.
+
+    Texts submitted concurrently are collected by a single worker thread for up to
+    max_wait_ms after the first one arrives (or until max_batch_size texts are waiting) and
+    encoded in one call, which costs far less per text than encoding each query as a batch
+    of one. Embeddings of recently seen texts are kept in an LRU cache of cache_size entries,
+    and identical texts waiting in the same batch are encoded once.
+    """
+
+    def __init__(self, embedding_store, max_batch_size=32, max_wait_ms=5, cache_size=1024):
+        """
+        Args:
+            embedding_store (EmbeddingStore): Store whose (lazily loaded) embedder encodes the texts.
+            max_batch_size (int): Maximum number of texts per encode call.
+            max_wait_ms (float): How long the first text of a batch waits for others to join it.
+            cache_size (int): Number of embeddings kept in the LRU cache; 0 disables it.
+        """
+        self.embedding_store = embedding_store
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # text -> embedding, least recently used first
+        self._cache_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def encode(self, text):
+        """
+        Returns the normalized embedding of text as a float32 vector, blocking until it is computed.
+        Safe to call from any number of threads.
+        """
+        with self._cache_lock:
+            embedding = self._cache.get(text)
+            if embedding is not None:
+                self._cache.move_to_end(text)
+        if embedding is not None:
+            EMBEDDING_CACHE_REQUESTS.labels(result="hit").inc()
+            return embedding
+        EMBEDDING_CACHE_REQUESTS.labels(result="miss").inc()
+        self._ensure_worker()
+        future = Future()
+        self._requests.put((text, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self):
+        """
+        Blocks for the first request, then gathers more until the batch is full or max_wait has passed.
+        Returns None when the service is closed.
+        """
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._requests.put(None)  # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while (batch := self._collect_batch()) is not None:
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = self.embedding_store.embedder.encode(
+                    texts,
+                    batch_size=len(texts),
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                ).astype(np.float32, copy=False)
+            except Exception as e:
+                logger.exception(f"Failed to encode a batch of {len(texts)} query texts.")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            EMBEDDING_BATCH_SIZE.observe(len(texts))
+            embeddings = dict(zip(texts, vectors))
+            self._remember(embeddings)
+            for text, future in batch:
+                future.set_result(embeddings[text])
+
+    def _remember(self, embeddings):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            for text, embedding in embeddings.items():
+                embedding.setflags(write=False)  # shared by every caller that gets it
+                self._cache[text] = embedding
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def close(self):
+        """
+        Stops the worker thread after the requests already queued are served.
+        """
+        with self._worker_lock:
+            if self._worker is not None and self._worker.is_alive():
+                self._requests.put(None)
+                self._worker.join(timeout=5)
+            self._worker = None
@@ -0,0 +1,276 @@
+import os
+import json
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MATRIX_FILE = "embeddings.f32"
+SIDECAR_FILE = "index.tsv"
+META_FILE = "meta.json"
+
+
+class EmbeddingStore:
+    """
+    Persistent, append-only store of abstract embeddings keyed by DOI.
+
+    On-disk layout (inside store_dir):
+        embeddings.f32  raw row-major float32 matrix of shape (count, dim), opened with np.memmap
+        index.tsv       sidecar with one "doi<TAB>date" line per matrix row
+        meta.json       embedding model name and dimension
+
+    Rows are only ever appended, so updating the store after an ingest costs
+    O(new documents) and never re-encodes abstracts that are already stored.
+    """
+
+    def __init__(self, store_dir, model_name="sentence-transformers/all-MiniLM-L6-v2",
+                 batch_size=64, embedder=None):
+        self.store_dir = store_dir
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._embedder = embedder
+        self._lock = threading.Lock()
+        self._matrix = None
+        self.dim = None
+        self.dois = []
+        self.row_by_doi = {}
+        self.dates = np.empty(0, dtype="datetime64[D]")
+        self._sidecar_size = 0
+        self._valid_sidecar_bytes = 0
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.load()
+
+    @property
+    def matrix_path(self):
+        return os.path.join(self.store_dir, MATRIX_FILE)
+
+    @property
+    def sidecar_path(self):
+        return os.path.join(self.store_dir, SIDECAR_FILE)
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.store_dir, META_FILE)
+
+    @property
+    def embedder(self):
+        """
+        Lazily loads the SentenceTransformer so that read-only users of the store
+        (e.g. query notebooks) never pay for loading the encoder.
+        """
+        if self._embedder is None:
+            from sentence_transformers import SentenceTransformer
+            logger.info(f"Loading embedding model '{self.model_name}'")
+            self._embedder = SentenceTransformer(self.model_name)
+        return self._embedder
+
+    def __len__(self):
+        return len(self.dois)
+
+    def __contains__(self, doi):
+        return doi in self.row_by_doi
+
+    def load(self):
+        """
+        Reads the metadata and sidecar from disk. If a previous append was interrupted,
+        only the rows present in both the matrix and the sidecar are used; the files
+        themselves are repaired by the next append.
+        """
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["model_name"] != self.model_name:
+                raise ValueError(
+                    f"Embedding store at '{self.store_dir}' was built with '{meta['model_name']}', "
+                    f"not '{self.model_name}'."
+                )
+            self.dim = meta["dim"]
+
+        n_rows = 0
+        if self.dim is not None and os.path.exists(self.matrix_path):
+            n_rows = os.path.getsize(self.matrix_path) // (self.dim * 4)
+
+        dois, dates, valid_bytes = [], [], 0
+        if os.path.exists(self.sidecar_path):
+            with open(self.sidecar_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n") or len(dois) == n_rows:
+                        break  # partial trailing line or a row missing from the matrix
+                    doi, date = line.decode("utf-8").rstrip("\n").split("\t")
+                    dois.append(doi)
+                    dates.append(date)
+                    valid_bytes += len(line)
+        if len(dois) != n_rows:
+            logger.warning(
+                f"Embedding store at '{self.store_dir}' has {n_rows} matrix rows but {len(dois)} "
+                f"complete sidecar rows. Using the first {min(n_rows, len(dois))} rows."
+            )
+
+        self.dois = dois
+        self.row_by_doi = {doi: i for i, doi in enumerate(dois)}
+        self.dates = np.array(dates, dtype="datetime64[D]")
+        self._matrix = None
+        self._valid_sidecar_bytes = valid_bytes
+        self._sidecar_size = os.path.getsize(self.sidecar_path) if os.path.exists(self.sidecar_path) else 0
+        logger.info(f"Loaded embedding store from '{self.store_dir}' with {len(dois)} rows.")
+
+    def refresh(self):
+        """
+        Reloads the store if another process has appended to it since it was last read.
+        Returns:
+            bool: True if the store was reloaded.
+        """
+        with self._lock:
+            size = os.path.getsize(self.sidecar_path) if os.path.exists(self.sidecar_path) else 0
+            if size == self._sidecar_size:
+                return False
+            self.load()
+            return True
+
+    def _repair(self):
+        """
+        Truncates both files to the rows known to be complete before appending.
+        """
+        if self.dim is not None and os.path.exists(self.matrix_path):
+            expected = len(self) * self.dim * 4
+            if os.path.getsize(self.matrix_path) != expected:
+                with open(self.matrix_path, "r+b") as f:
+                    f.truncate(expected)
+        if os.path.exists(self.sidecar_path) and os.path.getsize(self.sidecar_path) != self._valid_sidecar_bytes:
+            with open(self.sidecar_path, "r+b") as f:
+                f.truncate(self._valid_sidecar_bytes)
+
+    def _write_meta(self):
+        with open(self.meta_path, "w") as f:
+            json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+
+    def matrix(self):
+        """
+        Returns a read-only memory-mapped view of all stored embeddings.
+        """
+        if len(self) == 0:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        if self._matrix is None or self._matrix.shape[0] != len(self):
+            self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r",
+                                     shape=(len(self), self.dim))
+        return self._matrix
+
+    def add_documents(self, docs):
+        """
+        Encodes and appends embeddings for documents whose DOI is not yet in the store.
+        Documents without a DOI or with an empty abstract are ignored.
+        Args:
+            docs (iterable of dict): Documents with 'doi', 'abstract' and 'date' keys.
+        Returns:
+            int: The number of rows added to the store.
+        """
+        with self._lock:
+            new_docs = {}
+            for doc in docs:
+                doi = doc.get("doi")
+                abstract = doc.get("abstract") or ""
+                if doi and abstract.strip() and doi not in self.row_by_doi and doi not in new_docs:
+                    new_docs[doi] = doc
+            if not new_docs:
+                return 0
+
+            docs_to_encode = list(new_docs.values())
+            logger.info(f"Encoding {len(docs_to_encode)} new abstracts into the embedding store.")
+            vectors = self.embedder.encode(
+                [doc["abstract"] for doc in docs_to_encode],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            ).astype(np.float32, copy=False)
+            self._append(
+                [doc["doi"] for doc in docs_to_encode],
+                [doc["date"] for doc in docs_to_encode],
+                vectors
+            )
+            return len(docs_to_encode)
+
+    def add_embeddings(self, dois, dates, vectors):
+        """
+        Appends precomputed embeddings (e.g. from a compacted S3 snapshot) for DOIs not yet in the store.
+        The caller must ensure they were computed with this store's model.
+        Args:
+            dois (list of str): DOIs, one per row of vectors.
+            dates (list): Dates of the abstracts.
+            vectors (np.ndarray): Normalized float32 embeddings of shape (len(dois), dim).
+        Returns:
+            int: The number of rows added to the store.
+        """
+        with self._lock:
+            new_rows = {}
+            for i, doi in enumerate(dois):
+                if doi not in self.row_by_doi and doi not in new_rows:
+                    new_rows[doi] = i
+            if not new_rows:
+                return 0
+            rows = list(new_rows.values())
+            self._append(list(new_rows), [dates[i] for i in rows], np.asarray(vectors, dtype=np.float32)[rows])
+            return len(rows)
+
+    def get_embeddings(self, dois):
+        """
+        Looks up the stored embeddings of the given DOIs, skipping DOIs that are not in the store.
+        Returns:
+            tuple: (list of DOIs, np.ndarray of dates, float32 matrix), or None if none of the DOIs are stored.
+        """
+        self.refresh()
+        rows = [self.row_by_doi[doi] for doi in dois if doi in self.row_by_doi]
+        if not rows:
+            return None
+        return [self.dois[i] for i in rows], self.dates[rows], np.asarray(self.matrix()[rows])
+
+    def _append(self, dois, dates, vectors):
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self._write_meta()
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}.")
+        self._repair()
+
+        # Matrix rows are written before the sidecar so that a crash between the two
+        # leaves extra matrix rows, which load() ignores and _repair() truncates.
+        with open(self.matrix_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        sidecar_bytes = "".join(f"{doi}\t{date}\n" for doi, date in zip(dois, dates)).encode("utf-8")
+        with open(self.sidecar_path, "ab") as f:
+            f.write(sidecar_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        self._valid_sidecar_bytes += len(sidecar_bytes)
+        self._sidecar_size = self._valid_sidecar_bytes
+
+        start = len(self.dois)
+        self.dois.extend(dois)
+        self.row_by_doi.update({doi: start + i for i, doi in enumerate(dois)})
+        self.dates = np.concatenate([self.dates, np.array(dates, dtype="datetime64[D]")])
+        self._matrix = None
+
+    def rows_for_date_range(self, start_date=None, end_date=None):
+        """
+        Returns the row indices of embeddings whose date lies in [start_date, end_date].
+        Either bound may be None to leave that side open.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if start_date is not None:
+            mask &= self.dates >= np.datetime64(str(start_date), "D")
+        if end_date is not None:
+            mask &= self.dates <= np.datetime64(str(end_date), "D")
+        return np.flatnonzero(mask)
+
+    def load_range(self, start_date=None, end_date=None):
+        """
+        Loads only the embeddings for the requested date range.
+        Returns:
+            tuple: (list of DOIs, np.ndarray of dates, float32 embedding matrix of shape (n, dim)).
+        """
+        rows = self.rows_for_date_range(start_date, end_date)
+        embeddings = np.asarray(self.matrix()[rows]) if len(rows) else np.empty((0, self.dim or 0), dtype=np.float32)
+        return [self.dois[i] for i in rows], self.dates[rows], embeddings
@@ -0,0 +1,166 @@
+import time
+import uuid
+import asyncio
+import logging
+
+from ..utils.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query_text):
+    """
+    Collapses whitespace so that trivially different copies of the same abstract match.
+    """
+    return " ".join(query_text.split())
+
+
+class ReportJob:
+    """
+    A single abstract-query report request and its outcome.
+    Status moves from 'queued' to 'running' to either 'done' or 'failed'.
+    """
+
+    def __init__(self, query_text, top_n, key):
+        self.id = uuid.uuid4().hex
+        self.query_text = query_text
+        self.top_n = top_n
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.coalesced = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    @property
+    def is_finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "top_n": self.top_n,
+            "coalesced_requests": self.coalesced,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+
+class ReportJobQueue:
+    """
+    Runs abstract-query reports in the background with bounded concurrency.
+
+    At most max_concurrent reports run at once; the rest wait in FIFO order. A request
+    identical to one that is still queued or running (same normalized query and top_n)
+    is attached to that job instead of starting a new one. Finished jobs are kept for
+    job_ttl seconds so clients can collect their reports.
+
+    An optional prepare step runs as soon as a job is submitted, before it waits for a slot,
+    so cheap per-request work (retrieval, whose query embeddings are batched across requests)
+    overlaps instead of being serialized behind report generation.
+
+    Jobs live in the memory of the worker process that accepted them.
+    """
+
+    def __init__(self, runner, max_concurrent=1, job_ttl=3600, prepare=None):
+        """
+        Args:
+            runner (coroutine function): Async function (query_text, top_n) -> result stored on the job.
+                If prepare is given it is called as runner(query_text, top_n, prepared=...).
+            max_concurrent (int): Maximum number of reports generated at the same time.
+            job_ttl (int): Seconds a finished job is retained.
+            prepare (coroutine function): Optional async function (query_text, top_n) run outside the
+                concurrency limit; its result is passed to runner.
+        """
+        self.runner = runner
+        self.prepare = prepare
+        self.max_concurrent = max_concurrent
+        self.job_ttl = job_ttl
+        self.jobs = {}
+        self._in_flight = {}
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    def submit(self, query_text, top_n):
+        """
+        Queues a report, or joins the identical job already in flight.
+        Must be called from the event loop.
+        Returns:
+            tuple: (ReportJob, bool created) where created is False if an existing job was reused.
+        """
+        key = (normalize_query(query_text), top_n)
+        job = self._in_flight.get(key)
+        if job is not None:
+            job.coalesced += 1
+            logger.info(f"Coalesced abstract query into in-flight job {job.id}.")
+            return job, False
+
+        self._prune()
+        job = ReportJob(query_text, top_n, key)
+        self.jobs[job.id] = job
+        self._in_flight[key] = job
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(f"Queued abstract query job {job.id} ({self.queue_length()} waiting).")
+        return job, True
+
+    async def run_gated(self, query_text, top_n, on_queued=None, **kwargs):
+        """
+        Runs prepare (if any) and then runner under a generation slot, so that reports generated
+        outside the queue (e.g. streamed ones) count against the same limit.
+        Args:
+            on_queued (callable): Optional callback invoked if the report has to wait for a slot.
+            **kwargs: Extra keyword arguments for runner.
+        """
+        if self.prepare is not None:
+            kwargs["prepared"] = await self.prepare(query_text, top_n)
+        if on_queued is not None and self._slots.locked():
+            on_queued()
+        async with self._slots:
+            return await self.runner(query_text, top_n, **kwargs)
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def queue_length(self):
+        return sum(1 for job in self._in_flight.values() if job.status == "queued")
+
+    def queue_position(self, job):
+        """
+        Returns how many queued jobs are ahead of job, or None if it is no longer queued.
+        """
+        if job.status != "queued":
+            return None
+        return sum(1 for other in self._in_flight.values()
+                   if other.status == "queued" and other.created_at < job.created_at)
+
+    async def _run(self, job):
+        try:
+            kwargs = {}
+            if self.prepare is not None:
+                kwargs["prepared"] = await self.prepare(job.query_text, job.top_n)
+            async with self._slots:
+                job.status = "running"
+                job.started_at = time.time()
+                observe_stage("queue_wait", job.started_at - job.created_at)
+                job.result = await self.runner(job.query_text, job.top_n, **kwargs)
+                job.status = "done"
+                logger.info(f"Abstract query job {job.id} finished in {time.time() - job.started_at:.1f}s.")
+        except Exception as e:
+            logger.exception(f"Abstract query job {job.id} failed.")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._in_flight.pop(job.key, None)
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.is_finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
@@ -0,0 +1,288 @@
+import time
+import logging
+import threading
+from datetime import datetime
+from pymongo import MongoClient
+
+from ..utils.retrieval import build_index
+from .embedding_service import EmbeddingService
+from ..utils.llama_prompting import summarize_literature, SummaryStreamer
+from ..utils.metrics import stage_timer, observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+def load_language_model(model_name, max_seq_length=4096, load_in_4bit=True, dtype=None):
+    """
+    Loads a causal LM and its tokenizer for inference, using Unsloth when it is installed
+    (as the notebooks do) and plain transformers otherwise.
+    Args:
+        model_name (str): Hugging Face model id or local path (e.g. a LoRA adapter directory).
+        max_seq_length (int): Maximum sequence length for Unsloth models.
+        load_in_4bit (bool): Whether to load 4-bit quantized weights (Unsloth only).
+        dtype: Optional torch dtype; None for auto detection.
+    Returns:
+        tuple: (model, tokenizer)
+    """
+    try:
+        from unsloth import FastLanguageModel
+    except ImportError:
+        FastLanguageModel = None
+
+    logger.info(f"Loading language model '{model_name}'")
+    if FastLanguageModel is not None:
+        model, tokenizer = FastLanguageModel.from_pretrained(
+            model_name=model_name,
+            max_seq_length=max_seq_length,
+            dtype=dtype,
+            load_in_4bit=load_in_4bit
+        )
+        FastLanguageModel.for_inference(model)
+    else:
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        if load_in_4bit:
+            logger.warning("Unsloth is not installed; loading full precision weights instead of 4-bit.")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=dtype or "auto", device_map="auto")
+        model.eval()
+    return model, tokenizer
+
+
+class QueryEngine:
+    """
+    Answers abstract queries in-process. The sentence embedder and the LLM are loaded once
+    and reused across requests; retrieval runs against the persisted EmbeddingStore, so a
+    query only encodes its own text before summarizing the top hits.
+    All methods are blocking and are meant to be called from a worker thread.
+    """
+
+    def __init__(self, embedding_store, mongo_uri, db_name="biorxiv", collection_name="abstracts",
+                 model_name="unsloth/Meta-Llama-3.1-8B-Instruct", max_seq_length=4096, load_in_4bit=True,
+                 index_type="exact", start_date=None, max_new_tokens=1024, temperature=0.7,
+                 summary_mode="sequential", summary_batch_size=8, use_prefix_cache=True,
+                 summary_trim_policy="middle", embedding_service=None):
+        self.embedding_store = embedding_store
+        # Query texts are encoded through the shared micro-batching service
+        self.embedding_service = embedding_service or EmbeddingService(embedding_store)
+        self.collection = MongoClient(mongo_uri)[db_name][collection_name]
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+        self.load_in_4bit = load_in_4bit
+        self.index_type = index_type
+        self.start_date = start_date
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.summary_mode = summary_mode
+        self.summary_batch_size = summary_batch_size
+        self.use_prefix_cache = use_prefix_cache
+        self.summary_trim_policy = summary_trim_policy
+        self.model = None
+        self.tokenizer = None
+        # (index, DOIs of its rows, embedding store rows it covers, index type), replaced as a whole
+        self._index_snapshot = None
+        self._index_attempted_rows = None
+        self._rebuild_thread = None
+        self._load_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self.model is not None
+
+    def load(self):
+        """
+        Loads the embedder and the LLM. Safe to call more than once or concurrently.
+        """
+        with self._load_lock:
+            if self.is_loaded:
+                return
+            start = time.perf_counter()
+            _ = self.embedding_store.embedder  # loads the sentence embedder
+            self.model, self.tokenizer = load_language_model(
+                self.model_name, max_seq_length=self.max_seq_length, load_in_4bit=self.load_in_4bit
+            )
+            observe_stage("model_load", time.perf_counter() - start)
+            logger.info(f"Query engine models loaded in {time.perf_counter() - start:.1f}s.")
+
+    def corpus_version(self):
+        """
+        Returns an identifier of the corpus snapshot being searched. The embedding store is
+        append-only, so the number of store rows the served index covers changes exactly when
+        new abstracts become searchable; before any index is built it is the store's row count.
+        """
+        snapshot = self._index_snapshot
+        if snapshot is not None:
+            return str(snapshot[2])
+        self.embedding_store.refresh()
+        return str(len(self.embedding_store))
+
+    def _build_index(self, kind):
+        """
+        Builds an index of the given kind over the store's abstracts in the configured date range.
+        Returns:
+            tuple: (index, embedding store rows covered, DOIs), or (None, rows, None) if there are no abstracts.
+        """
+        self.embedding_store.refresh()
+        n_rows = len(self.embedding_store)
+        dois, _, embeddings = self.embedding_store.load_range(self.start_date, None)
+        if not dois:
+            return None, n_rows, None
+        start = time.perf_counter()
+        index = build_index(embeddings, kind=kind)
+        logger.info(f"Built '{kind}' retrieval index over {len(dois)} abstracts "
+                    f"in {time.perf_counter() - start:.2f}s.")
+        return index, n_rows, dois
+
+    def refresh_index(self):
+        """
+        Rebuilds the retrieval index if the embedding store has grown since the served index was
+        built, and swaps the new one in once it is complete; queries keep searching the previous
+        index in the meantime. Called after ingests and, on other workers, in a background
+        thread started by the first query that sees the store grow.
+        Returns:
+            bool: True if a new index was swapped in.
+        """
+        with self._rebuild_lock:
+            self.embedding_store.refresh()
+            snapshot = self._index_snapshot
+            if (snapshot is not None and snapshot[2] == len(self.embedding_store)
+                    and snapshot[3] == self.index_type):
+                return False
+            # Recorded before building, so a failing build is not retried until the store grows
+            self._index_attempted_rows = len(self.embedding_store)
+            index, n_rows, dois = self._build_index(self.index_type)
+            if index is None:
+                return False
+            with self._index_lock:
+                self._index_snapshot = (index, dois, n_rows, self.index_type)
+            return True
+
+    def _rebuild_in_background(self):
+        try:
+            self.refresh_index()
+        except Exception:
+            logger.exception("Failed to rebuild the retrieval index; still serving the previous one.")
+
+    def _start_rebuild(self):
+        with self._index_lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            self._rebuild_thread = threading.Thread(target=self._rebuild_in_background,
+                                                    name="retrieval-index-rebuild", daemon=True)
+            self._rebuild_thread.start()
+
+    def _get_index(self):
+        """
+        Returns the served retrieval index and the DOIs of its rows without waiting for a rebuild.
+        Before any index exists, an exact index is built in place (it only normalizes the
+        embeddings); an IVF index and rebuilds for a grown store are trained in a background
+        thread and swapped in when ready.
+        """
+        snapshot = self._index_snapshot
+        if snapshot is None:
+            with self._index_lock:
+                snapshot = self._index_snapshot
+                if snapshot is None:
+                    index, n_rows, dois = self._build_index("exact")
+                    if index is None:
+                        raise RuntimeError("The embedding store has no abstracts for the configured date range.")
+                    snapshot = self._index_snapshot = (index, dois, n_rows, "exact")
+                    if self.index_type == "exact":
+                        self._index_attempted_rows = n_rows
+        self.embedding_store.refresh()
+        if self._index_attempted_rows != len(self.embedding_store):
+            self._start_rebuild()
+        return snapshot[0], snapshot[1]
+
+    def retrieve(self, query_text, top_n=5):
+        """
+        Finds the top_n abstracts most similar to query_text.
+        Returns:
+            list of dict: Hits with 'doi', 'title', 'abstract', 'date' and 'score' keys, best first.
+        """
+        with stage_timer("index"):
+            index, dois = self._get_index()
+        with stage_timer("embedding"):
+            query_embedding = self.embedding_service.encode(query_text)
+        with stage_timer("search"):
+            rows, scores = index.search(query_embedding, k=top_n)
+        hit_dois = [dois[i] for i in rows]
+        with stage_timer("mongo_load"):
+            docs = {
+                doc["doi"]: doc
+                for doc in self.collection.find({"doi": {"$in": hit_dois}},
+                                                {"_id": 0, "doi": 1, "title": 1, "abstract": 1, "date": 1})
+            }
+        hits = []
+        for doi, score in zip(hit_dois, scores):
+            if doi in docs:
+                hits.append({**docs[doi], "score": float(score)})
+            else:
+                logger.warning(f"Embedding for DOI {doi} has no matching document in MongoDB.")
+        return hits
+
+    def run(self, query_text, top_n=5, on_event=None):
+        """
+        Runs retrieval and summarization for one query.
+        Args:
+            query_text (str): The query abstract.
+            top_n (int): Number of similar abstracts to retrieve and summarize.
+            on_event (callable): Optional callback (event, payload) for streaming progress, see summarize.
+        Returns:
+            dict: Report context with 'query', 'top_n', 'hits', 'summary', 'timings' and 'generated_at'.
+        """
+        start = time.perf_counter()
+        hits = self.retrieve(query_text, top_n=top_n)
+        return self.summarize(query_text, hits, top_n=top_n, on_event=on_event,
+                              retrieval_seconds=time.perf_counter() - start)
+
+    def summarize(self, query_text, hits, top_n=None, on_event=None, retrieval_seconds=0.0):
+        """
+        Summarizes the hits of an earlier retrieve call. Retrieval is cheap and its query
+        embeddings are micro-batched across requests, so callers run it before waiting for a
+        generation slot and only this step is serialized.
+        Args:
+            query_text (str): The query abstract.
+            hits (list of dict): Result of retrieve(query_text, top_n).
+            top_n (int): Number of abstracts requested; defaults to len(hits).
+            on_event (callable): Optional callback (event, payload) for streaming progress. It receives
+                "hits" first, then the SummaryStreamer's "pass" and "token" events.
+            retrieval_seconds (float): Time retrieve took, reported in the timings.
+        Returns:
+            dict: Report context with 'query', 'top_n', 'hits', 'summary', 'timings' and 'generated_at'.
+        """
+        self.load()
+        timings = {"retrieval": retrieval_seconds}
+        if on_event is not None:
+            on_event("hits", [
+                {"doi": hit["doi"], "title": hit.get("title"), "date": hit.get("date"), "score": hit["score"]}
+                for hit in hits
+            ])
+
+        start = time.perf_counter()
+        summary = summarize_literature(
+            model=self.model,
+            tokenizer=self.tokenizer,
+            query_abstract=query_text,
+            top_k_abstracts=hits,
+            max_new_tokens=self.max_new_tokens,
+            temperature=self.temperature,
+            mode=self.summary_mode,
+            batch_size=self.summary_batch_size,
+            use_prefix_cache=self.use_prefix_cache,
+            trim_policy=self.summary_trim_policy,
+            streamer=SummaryStreamer(self.tokenizer, on_event) if on_event is not None else None
+        )
+        timings["summarization"] = time.perf_counter() - start
+        observe_stage("summarization", timings["summarization"])
+        logger.info(f"Abstract query answered in {sum(timings.values()):.1f}s "
+                    f"(retrieval {timings['retrieval']:.2f}s, summarization {timings['summarization']:.1f}s).")
+        return {
+            "query": query_text,
+            "top_n": top_n if top_n is not None else len(hits),
+            "hits": hits,
+            "summary": summary,
+            "timings": timings,
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
@@ -1,8 +1,17 @@
 from dotenv import load_dotenv, find_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from contextlib import closing
+from botocore.config import Config
+import asyncio
 import os
 import boto3
 
-def get_boto3_client(service_name, dotenv_path='env/.env'):
+from .metrics import S3_OPERATION_SECONDS
+
+def get_boto3_client(service_name, dotenv_path='env/.env', max_pool_connections=None):
+    # Optionally size the client's HTTP connection pool (botocore defaults to 10)
+    client_config = Config(max_pool_connections=max_pool_connections) if max_pool_connections else None
     # Try to find and load .env
     dotenv_path = find_dotenv(dotenv_path)
     if dotenv_path:
@@ -12,8 +21,73 @@ def get_boto3_client(service_name, dotenv_path='env/.env'):
             service_name,
             aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
             aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
-            region_name=os.environ.get("AWS_DEFAULT_REGION", "us-east-1")
+            region_name=os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+            config=client_config
         )
     else:
         print("No .env found — assuming EC2/IAM environment")
-        return boto3.client(service_name)
\ No newline at end of file
+        return boto3.client(service_name, config=client_config)
+
+class AsyncS3Client:
+    """
+    Awaitable wrapper around a boto3 S3 client.
+    boto3 has no asyncio interface, so every call (including reading response bodies)
+    runs on a dedicated thread pool sized to the client's connection pool. Callers on
+    the event loop await the result instead of blocking it.
+    """
+
+    def __init__(self, client, max_workers=10):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3")
+
+    async def _run(self, operation, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Timed on the event loop, so the latency includes waiting for a free pool thread
+        with S3_OPERATION_SECONDS.labels(operation=operation).time():
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def list_objects_v2(self, **kwargs):
+        return await self._run("list_objects_v2", self.client.list_objects_v2, **kwargs)
+
+    async def list_all_objects(self, Bucket, Prefix=""):
+        """
+        Lists every object under Prefix, following continuation tokens past the
+        1000-key limit of a single list_objects_v2 call.
+        """
+        objects = []
+        kwargs = {"Bucket": Bucket, "Prefix": Prefix}
+        while True:
+            response = await self.list_objects_v2(**kwargs)
+            objects.extend(response.get("Contents", []))
+            if not response.get("IsTruncated"):
+                return objects
+            kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+    async def get_object_body(self, Bucket, Key):
+        """
+        Fetches an object and reads its whole body, returning bytes.
+        """
+        def _get():
+            response = self.client.get_object(Bucket=Bucket, Key=Key)
+            return response["Body"].read()
+        return await self._run("get_object", _get)
+
+    async def stream_object(self, Bucket, Key, consume):
+        """
+        Fetches an object and calls consume(body) with its streaming body on the client's
+        thread pool, so the body can be processed while it downloads. Returns consume's result.
+        """
+        def _stream():
+            response = self.client.get_object(Bucket=Bucket, Key=Key)
+            with closing(response["Body"]) as body:
+                return consume(body)
+        return await self._run("get_object", _stream)
+
+    async def put_object(self, **kwargs):
+        return await self._run("put_object", self.client.put_object, **kwargs)
+
+    async def delete_objects(self, **kwargs):
+        return await self._run("delete_objects", self.client.delete_objects, **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -1,8 +1,46 @@
+import copy
+import time
 import torch
-from unsloth import FastLanguageModel # Uncomment and import if you are using Unsloth models
-from transformers import AutoTokenizer, AutoModelForCausalLM
+try:
+    from unsloth import FastLanguageModel # Optional: only needed for Unsloth models
+except ImportError:
+    pass
+from transformers import AutoTokenizer, AutoModelForCausalLM, DynamicCache, TextStreamer
 from tqdm import tqdm
 
+from .metrics import record_generation
+
+# Static instructions and worked examples shared by every sequential summarization prompt.
+# They come first so that their key/value cache can be computed once and reused (see PromptPrefixCache).
+BASE_PROMPT_PREFIX = (
+    "You are a scientific summarization assistant. Your task is to update an existing literature summary by integrating new information from a related abstract. "
+    "Your output should be a concise, accurate combined summary that reflects both the original and new findings. Use clear scientific language and avoid redundancy. Strive for brevity and focus on integrating only the most crucial new information, especially if the current summary is already extensive.\n"
+    "Your summary MUST follow this format: 'Introductory sentence; Fact1 [Title, DOI], Fact2 [Title, DOI], ...; (In conclusion|Overall|In summary).' Ensure all facts from *new* abstracts are cited using their respective Title and DOI. Facts from the *Query Abstract* should be cited as '[Query Abstract]. If a previous-summary is non-empty, incorporate facts for that summary with the references, without duplicating the query reference'.\n\n"
+    "Here are several examples of how to perform this task:\n\n"
+    "--- Example 1 ---\n"
+    "Query Abstract: This study investigates the anti-inflammatory effects of drug X-123 in murine models, demonstrating significant reductions in cytokine levels and improved recovery times.\n"
+    "Current Summary: Drug X-123 reduces inflammation in mice. [Drug X-123 reduces inflammation in murine models, 10.2000/j.example.2025.08.15]\n"
+    "New Abstract: A related study found that X-123 also enhances tissue regeneration in rats by modulating macrophage activity and suppressing pro-inflammatory signaling pathways.\n"
+    "New Abstract Title: X-123 also enhances tissue regeneration in rats through XXX macrophage pathway\n"
+    "New Abstract DOI: 10.1000/j.example.2023.01.001\n"
+    "Combined Summary: This summary integrates recent findings on drug X-123; Drug X-123 reduces inflammation in murine models [Query Abstract]. Another study found similar results where it reduced inflammation [Drug X-123 reduces inflammation in murine models, 10.2000/j.example.2025.08.15] and it also enhances tissue regeneration in rats by modulating macrophage activity and suppressing pro-inflammatory signaling pathways [X-123 also enhances tissue regeneration in rats through XXX macrophage pathway, 10.1000/j.example.2023.01.001]; In conclusion, X-123 shows multi-faceted effects.\n\n"
+    "--- Example 2 ---\n"
+    "Query Abstract: Researchers evaluated compound Y-456 for its effects on cognitive decline in elderly patients, noting improvements in memory retention and executive function over a 12-week trial.\n"
+    "Current Summary: Compound Y-456 improves cognitive function in elderly patients.\n"
+    "New Abstract: A follow-up study revealed that Y-456 also reduces oxidative stress in brain tissue and increases synaptic density in the hippocampus.\n"
+    "New Abstract Title: Y-456's Impact on Cognitive Decline and Brain Health\n"
+    "New Abstract DOI: 10.1000/j.example.2024.02.002\n"
+    "Combined Summary: This update details further effects of compound Y-456; Compound Y-456 improves cognitive function in elderly patients, reduces oxidative stress in brain tissue, and increases synaptic density in the hippocampus [Y-456's Impact on Cognitive Decline and Brain Health, 10.1000/j.example.2024.02.002]; In conclusion, Y-456 has broad neurological benefits.\n\n"
+    "--- Example 3 ---\n"
+    "Query Abstract: The paper explores the role of protein Z in regulating insulin sensitivity in diabetic mice, showing enhanced glucose tolerance and reduced insulin resistance.\n"
+    "Current Summary: An initial study indicated that protein Z regulates insulin sensitivity in diabetic mice, leading to enhanced glucose tolerance and reduced insulin resistance [Initial Protein Z Study, 10.1234/initial.study.2022.01.001].\n"
+    "New Abstract: Additional research shows that protein Z also promotes glucose uptake in muscle cells and downregulates inflammatory markers associated with metabolic syndrome.\n"
+    "New Abstract Title: Protein Z's Role in Glucose Metabolism and Inflammation\n"
+    "New Abstract DOI: 10.1000/j.example.2025.03.003\n"
+    "Combined Summary: This summary incorporates new data on protein Z; An initial study indicated that protein Z regulates insulin sensitivity in diabetic mice [Initial Protein Z Study, 10.1234/initial.study.2022.01.001], and additional research shows that protein Z also promotes glucose uptake in muscle cells and downregulates inflammatory markers associated with metabolic syndrome [Protein Z's Role in Glucose Metabolism and Inflammation, 10.1000/j.example.2025.03.003]; In conclusion, protein Z is a key metabolic regulator with multiple physiological effects.\n\n"
+    "Now, perform the task with the following inputs:\n"
+)
+
 def gen_base_prompt(
     query_abstract: str,
     current_summary: str,
@@ -12,7 +50,8 @@ def gen_base_prompt(
     i: int
 ) -> str:
     """
-    Generates the base prompt content for the summarization task.
+    Generates the base prompt content for the summarization task: the static
+    instructions and examples (BASE_PROMPT_PREFIX) followed by the per-abstract inputs.
 
     Args:
         query_abstract: The main abstract to which other abstracts are compared and summarized against.
@@ -25,33 +64,28 @@ def gen_base_prompt(
     Returns:
         A string containing the formatted base prompt.
     """
+    return BASE_PROMPT_PREFIX + gen_base_prompt_suffix(
+        query_abstract=query_abstract,
+        current_summary=current_summary,
+        abstract_i=abstract_i,
+        new_abstract_title=new_abstract_title,
+        new_abstract_doi=new_abstract_doi,
+        i=i
+    )
+
+def gen_base_prompt_suffix(
+    query_abstract: str,
+    current_summary: str,
+    abstract_i: str,
+    new_abstract_title: str,
+    new_abstract_doi: str,
+    i: int
+) -> str:
+    """
+    Generates the dynamic part of the base prompt that follows BASE_PROMPT_PREFIX.
+    Takes the same arguments as gen_base_prompt.
+    """
     return (
-        "You are a scientific summarization assistant. Your task is to update an existing literature summary by integrating new information from a related abstract. "
-        "Your output should be a concise, accurate combined summary that reflects both the original and new findings. Use clear scientific language and avoid redundancy. Strive for brevity and focus on integrating only the most crucial new information, especially if the current summary is already extensive.\n"
-        "Your summary MUST follow this format: 'Introductory sentence; Fact1 [Title, DOI], Fact2 [Title, DOI], ...; (In conclusion|Overall|In summary).' Ensure all facts from *new* abstracts are cited using their respective Title and DOI. Facts from the *Query Abstract* should be cited as '[Query Abstract]. If a previous-summary is non-empty, incorporate facts for that summary with the references, without duplicating the query reference'.\n\n"
-        "Here are several examples of how to perform this task:\n\n"
-        "--- Example 1 ---\n"
-        "Query Abstract: This study investigates the anti-inflammatory effects of drug X-123 in murine models, demonstrating significant reductions in cytokine levels and improved recovery times.\n"
-        "Current Summary: Drug X-123 reduces inflammation in mice. [Drug X-123 reduces inflammation in murine models, 10.2000/j.example.2025.08.15]\n"
-        "New Abstract: A related study found that X-123 also enhances tissue regeneration in rats by modulating macrophage activity and suppressing pro-inflammatory signaling pathways.\n"
-        "New Abstract Title: X-123 also enhances tissue regeneration in rats through XXX macrophage pathway\n"
-        "New Abstract DOI: 10.1000/j.example.2023.01.001\n"
-        "Combined Summary: This summary integrates recent findings on drug X-123; Drug X-123 reduces inflammation in murine models [Query Abstract]. Another study found similar results where it reduced inflammation [Drug X-123 reduces inflammation in murine models, 10.2000/j.example.2025.08.15] and it also enhances tissue regeneration in rats by modulating macrophage activity and suppressing pro-inflammatory signaling pathways [X-123 also enhances tissue regeneration in rats through XXX macrophage pathway, 10.1000/j.example.2023.01.001]; In conclusion, X-123 shows multi-faceted effects.\n\n"
-        "--- Example 2 ---\n"
-        "Query Abstract: Researchers evaluated compound Y-456 for its effects on cognitive decline in elderly patients, noting improvements in memory retention and executive function over a 12-week trial.\n"
-        "Current Summary: Compound Y-456 improves cognitive function in elderly patients.\n"
-        "New Abstract: A follow-up study revealed that Y-456 also reduces oxidative stress in brain tissue and increases synaptic density in the hippocampus.\n"
-        "New Abstract Title: Y-456's Impact on Cognitive Decline and Brain Health\n"
-        "New Abstract DOI: 10.1000/j.example.2024.02.002\n"
-        "Combined Summary: This update details further effects of compound Y-456; Compound Y-456 improves cognitive function in elderly patients, reduces oxidative stress in brain tissue, and increases synaptic density in the hippocampus [Y-456's Impact on Cognitive Decline and Brain Health, 10.1000/j.example.2024.02.002]; In conclusion, Y-456 has broad neurological benefits.\n\n"
-        "--- Example 3 ---\n"
-        "Query Abstract: The paper explores the role of protein Z in regulating insulin sensitivity in diabetic mice, showing enhanced glucose tolerance and reduced insulin resistance.\n"
-        "Current Summary: An initial study indicated that protein Z regulates insulin sensitivity in diabetic mice, leading to enhanced glucose tolerance and reduced insulin resistance [Initial Protein Z Study, 10.1234/initial.study.2022.01.001].\n"
-        "New Abstract: Additional research shows that protein Z also promotes glucose uptake in muscle cells and downregulates inflammatory markers associated with metabolic syndrome.\n"
-        "New Abstract Title: Protein Z's Role in Glucose Metabolism and Inflammation\n"
-        "New Abstract DOI: 10.1000/j.example.2025.03.003\n"
-        "Combined Summary: This summary incorporates new data on protein Z; An initial study indicated that protein Z regulates insulin sensitivity in diabetic mice [Initial Protein Z Study, 10.1234/initial.study.2022.01.001], and additional research shows that protein Z also promotes glucose uptake in muscle cells and downregulates inflammatory markers associated with metabolic syndrome [Protein Z's Role in Glucose Metabolism and Inflammation, 10.1000/j.example.2025.03.003]; In conclusion, protein Z is a key metabolic regulator with multiple physiological effects.\n\n"
-        "Now, perform the task with the following inputs:\n"
         f"Query Abstract: {query_abstract}\n"
         f"Current Summary: {current_summary}\n"
         f"New Abstract (ranked {i+1}th most similar to query): {abstract_i}\n"
@@ -60,6 +94,65 @@ def gen_base_prompt(
         "Combined Summary:"
     )
 
+def gen_map_prompt(
+    query_abstract: str,
+    abstract_i: str,
+    new_abstract_title: str,
+    new_abstract_doi: str,
+    i: int
+) -> str:
+    """
+    Generates the prompt that summarizes a single abstract against the query abstract
+    (the "map" step of the tree summarization mode).
+
+    Args:
+        query_abstract: The main abstract to which other abstracts are compared and summarized against.
+        abstract_i: The text of the abstract to summarize.
+        new_abstract_title: The title of the abstract.
+        new_abstract_doi: The DOI of the abstract.
+        i: The rank (index) of the abstract, used for numbering.
+
+    Returns:
+        A string containing the formatted prompt.
+    """
+    return (
+        "You are a scientific summarization assistant. Your task is to summarize how a related abstract relates to a query abstract. "
+        "Use clear scientific language and keep only the findings most relevant to the query abstract.\n"
+        "Your summary MUST follow this format: 'Introductory sentence; Fact1 [Title, DOI], Fact2 [Title, DOI], ...; (In conclusion|Overall|In summary).' "
+        "Cite facts from the related abstract using its Title and DOI, and facts from the *Query Abstract* as '[Query Abstract]'.\n\n"
+        f"Query Abstract: {query_abstract}\n"
+        f"Related Abstract (ranked {i+1}th most similar to query): {abstract_i}\n"
+        f"Related Abstract Title: {new_abstract_title}\n"
+        f"Related Abstract DOI: {new_abstract_doi}\n\n"
+        "Summary:"
+    )
+
+def gen_reduce_prompt(
+    query_abstract: str,
+    summaries: list[str]
+) -> str:
+    """
+    Generates the prompt that merges partial summaries into one
+    (the "reduce" step of the tree summarization mode).
+
+    Args:
+        query_abstract: The main abstract to which other abstracts are compared and summarized against.
+        summaries: Partial summaries to merge, each already in the citation format.
+
+    Returns:
+        A string containing the formatted prompt.
+    """
+    numbered = "".join(f"Summary {j+1}: {summary}\n" for j, summary in enumerate(summaries))
+    return (
+        "You are a scientific summarization assistant. Your task is to merge several literature summaries about the same query abstract into one combined summary. "
+        "Your output should be concise and accurate, reflect the findings of every summary, and avoid redundancy.\n"
+        "Your summary MUST follow this format: 'Introductory sentence; Fact1 [Title, DOI], Fact2 [Title, DOI], ...; (In conclusion|Overall|In summary).' "
+        "Keep every citation from the input summaries exactly as written and cite the query abstract at most once as '[Query Abstract]'.\n\n"
+        f"Query Abstract: {query_abstract}\n"
+        f"{numbered}\n"
+        "Combined Summary:"
+    )
+
 def summarize_literature(
     model: AutoModelForCausalLM,
     tokenizer: AutoTokenizer,
@@ -67,11 +160,18 @@ def summarize_literature(
     top_k_abstracts: list[dict], # Assumed to have 'abstract', 'title', 'doi' keys
     max_new_tokens: int = 256,
     temperature: float = 0.7,
-    repetition_penalty: float = 1.0
+    repetition_penalty: float = 1.0,
+    mode: str = "sequential",
+    batch_size: int = 8,
+    use_prefix_cache: bool = True,
+    trim_policy: str = "middle",
+    streamer: TextStreamer = None
 ) -> str:
     """
     Summarizes scientific literature by iteratively updating a summary based on new abstracts,
     handling both base and instruct models, with specific citation and format requirements.
+    With mode="tree" the abstracts are instead summarized in batches and merged pairwise
+    (see summarize_literature_tree).
 
     Args:
         model: The loaded Hugging Face model (e.g., from Unsloth's FastLanguageModel or AutoModelForCausalLM).
@@ -82,11 +182,31 @@ def summarize_literature(
         max_new_tokens: Maximum number of tokens to generate for each summary update.
         temperature: Controls randomness in generation. Lower values make output more deterministic.
         repetition_penalty: Penalizes repeated tokens.
+        mode: "sequential" to fold the abstracts into the summary one at a time, or "tree"
+              for batched map-reduce summarization.
+        batch_size: Maximum number of prompts per generate call in tree mode.
+        use_prefix_cache: Reuse the key/value cache of the static prompt prefix across calls
+                          in sequential mode instead of re-encoding it every iteration.
+        trim_policy: How the running summary is shortened when the prompt would exceed the model's
+                     context (see PromptAssembler): "middle", "end" or "start".
+        streamer: Optional streamer (e.g. SummaryStreamer) passed to every generate call, so the
+                  text of each summary pass can be consumed while it is generated. In tree mode
+                  only single-prompt generate calls (at least the final merge) are streamed.
 
     Returns:
         The final consolidated summary of the literature.
     """
-    current_summary = ""
+    if mode == "tree":
+        return summarize_literature_tree(
+            model, tokenizer, query_abstract, top_k_abstracts,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            repetition_penalty=repetition_penalty,
+            batch_size=batch_size,
+            streamer=streamer
+        )
+    if mode != "sequential":
+        raise ValueError(f"Unknown summarization mode '{mode}'. Expected 'sequential' or 'tree'.")
 
     # Determine if it's an instruct model based on the presence of a chat template.
     is_instruct_model = hasattr(tokenizer, 'chat_template') and tokenizer.chat_template is not None
@@ -101,6 +221,18 @@ def summarize_literature(
     except AttributeError:
         print("💡 Model object does not have 'for_inference' method. Skipping Unsloth inference optimization.")
 
+    # The static instructions and examples are tokenized (and their key/value cache computed) once;
+    # the assembler tokenizes the query once and every abstract once, and keeps the summary as ids.
+    prompt_prefix = get_prompt_prefix(model, tokenizer, BASE_PROMPT_PREFIX, cache_kv=use_prefix_cache)
+    assembler = PromptAssembler(
+        tokenizer,
+        prompt_prefix,
+        query_abstract=query_abstract,
+        max_length=model.config.max_position_embeddings,
+        max_new_tokens=max_new_tokens,
+        trim_policy=trim_policy
+    )
+    summary_ids = []
 
     for i, doc in tqdm(enumerate(top_k_abstracts)):
         abstract_i = doc.get("abstract", "").strip()
@@ -110,104 +242,347 @@ def summarize_literature(
         if not abstract_i:
             continue
 
-        # Generate the base prompt content using the new function
-        base_prompt_content = gen_base_prompt(
-            query_abstract=query_abstract,
-            current_summary=current_summary,
+        inputs = assembler.build_inputs(
+            summary_ids=summary_ids,
             abstract_i=abstract_i,
             new_abstract_title=new_abstract_title,
             new_abstract_doi=new_abstract_doi,
             i=i
         )
+        prompt_length = inputs["input_ids"].shape[1]
 
-        # Estimate initial prompt length using the base content for trimming decision.
-        prompt_tokens_estimate = tokenizer(base_prompt_content, return_tensors="pt", truncation=False)["input_ids"][0]
-        prompt_length_estimate = len(prompt_tokens_estimate)
-
-        model_max_length = model.config.max_position_embeddings
-        buffer_tokens = 32 # Buffer for generated tokens and potential tokenizer overhead
-
-        total_length_needed = prompt_length_estimate + max_new_tokens + buffer_tokens
-
-        # If the estimated length exceeds the model's max, trim the current summary.
-        if total_length_needed > model_max_length:
-            excess_tokens = total_length_needed - model_max_length
-            print(f"⚠️ Prompt too long by {excess_tokens} tokens. Trimming current summary.")
-
-            summary_tokens = tokenizer(current_summary, return_tensors="pt")["input_ids"][0]
-            trim_amount = min(excess_tokens, len(summary_tokens))
-            trimmed_summary_tokens = summary_tokens[trim_amount:] if trim_amount > 0 else torch.tensor([], dtype=torch.long)
-            current_summary = tokenizer.decode(trimmed_summary_tokens, skip_special_tokens=True)
-            print(f"📝 Trimmed summary length: {len(tokenizer(current_summary)['input_ids'])} tokens")
-
-            # Rebuild the base_prompt_content with the now trimmed current_summary
-            # This is critical as the prompt's content has changed.
-            base_prompt_content = gen_base_prompt( # Recalculate with trimmed summary
-                query_abstract=query_abstract,
-                current_summary=current_summary,
-                abstract_i=abstract_i,
-                new_abstract_title=new_abstract_title,
-                new_abstract_doi=new_abstract_doi,
-                i=i
-            )
-
-        # Apply specific formatting based on model type (instruct vs. base)
-        if is_instruct_model:
-            messages = [
-                {"role": "user", "content": base_prompt_content}
-            ]
-            formatted_prompt = tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
-            )
-        else:
-            formatted_prompt = base_prompt_content
-
-        inputs = tokenizer(formatted_prompt, return_tensors="pt", truncation=True).to(model.device)
-        prompt_length = len(inputs["input_ids"][0])
-
+        start = time.perf_counter()
         outputs = model.generate(
             **inputs,
             max_new_tokens=max_new_tokens,
             temperature=temperature,
             repetition_penalty=repetition_penalty,
             do_sample=True,
-            eos_token_id=tokenizer.eos_token_id
+            eos_token_id=tokenizer.eos_token_id,
+            streamer=streamer
         )
+        record_generation("sequential", outputs.shape[1] - prompt_length, time.perf_counter() - start)
+
+        # Only the newly generated ids become the next summary; the prompt is never decoded
+        summary_ids = assembler.completion_ids(outputs[0], prompt_length)
+
+    return tokenizer.decode(summary_ids, skip_special_tokens=True).strip()
+
+def format_prompt(tokenizer, prompt_content: str) -> str:
+    """
+    Wraps prompt content in the tokenizer's chat template for instruct models;
+    base models get the content unchanged.
+    """
+    if getattr(tokenizer, "chat_template", None) is None:
+        return prompt_content
+    messages = [{"role": "user", "content": prompt_content}]
+    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+# Splits a formatted prompt into the part before and after the dynamic content
+PROMPT_SPLIT_MARKER = "\u0000PROMPT_SPLIT\u0000"
+
+class PromptPrefix:
+    """
+    The tokenized static prefix of a prompt for one model and tokenizer, with its key/value cache.
+
+    The prefix is formatted exactly as a full prompt would be (including the chat template for
+    instruct models) and every prompt is built as the prefix ids followed by the ids of its
+    dynamic content, so the cached keys/values are valid for all of them and generate() only
+    has to prefill the dynamic tokens.
+    """
+
+    def __init__(self, model, tokenizer, prefix_content, cache_kv=True):
+        formatted = format_prompt(tokenizer, prefix_content + PROMPT_SPLIT_MARKER)
+        self.formatted_prefix, self.template_suffix = formatted.split(PROMPT_SPLIT_MARKER)
+        # The chat template already contains the BOS token
+        self.input_ids = tokenizer(self.formatted_prefix, return_tensors="pt",
+                                   add_special_tokens=tokenizer.chat_template is None)["input_ids"].to(model.device)
+        self.past_key_values = None
+        if cache_kv:
+            try:
+                with torch.no_grad():
+                    self.past_key_values = model(input_ids=self.input_ids, past_key_values=DynamicCache(),
+                                                 use_cache=True).past_key_values
+            except (TypeError, ValueError, AttributeError) as e:
+                print(f"💡 Could not cache the prompt prefix for this model ({e}). Re-encoding it on every call.")
+
+    def __len__(self):
+        return self.input_ids.shape[1]
+
+    def build_inputs_from_ids(self, dynamic_ids: list[int]) -> dict:
+        """
+        Returns generate() inputs for the prefix followed by already tokenized dynamic content,
+        which must end with the ids of template_suffix.
+        """
+        dynamic_ids = torch.tensor([dynamic_ids], dtype=self.input_ids.dtype, device=self.input_ids.device)
+        input_ids = torch.cat([self.input_ids, dynamic_ids], dim=1)
+        inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+        if self.past_key_values is not None:
+            # generate() appends to the cache in place, so each call gets its own copy
+            inputs["past_key_values"] = copy.deepcopy(self.past_key_values)
+        return inputs
+
+_PROMPT_PREFIXES = {}
+
+def get_prompt_prefix(model, tokenizer, prefix_content: str, cache_kv: bool = True) -> PromptPrefix:
+    """
+    Returns the PromptPrefix for prefix_content, building it only the first time it is needed
+    for a given model, tokenizer and formatted prefix (chat templates may embed the date).
+    """
+    key = (id(model), id(tokenizer), cache_kv)
+    formatted_prefix = format_prompt(tokenizer, prefix_content + PROMPT_SPLIT_MARKER).split(PROMPT_SPLIT_MARKER)[0]
+    cached = _PROMPT_PREFIXES.get(key)
+    if cached is not None and cached[0] is model and cached[1].formatted_prefix == formatted_prefix:
+        return cached[1]
+    prompt_prefix = PromptPrefix(model, tokenizer, prefix_content, cache_kv=cache_kv)
+    _PROMPT_PREFIXES[key] = (model, prompt_prefix)
+    print(f"🔄 Built prompt prefix of {len(prompt_prefix)} tokens (key/value cache: {prompt_prefix.past_key_values is not None}).")
+    return prompt_prefix
+
+class PromptAssembler:
+    """
+    Builds sequential summarization prompts from cached token-id segments instead of
+    re-tokenizing the whole prompt on every iteration.
+
+    The static prefix is tokenized once (PromptPrefix), the query abstract once per request,
+    each new abstract once, and the running summary is kept as the ids the model generated.
+    The prompt is the concatenation of these segments and their labels, laid out as in
+    gen_base_prompt_suffix.
+
+    When prefix + segments + max_new_tokens + buffer_tokens exceeds max_length, the summary is
+    trimmed according to trim_policy:
+        "middle"  drop tokens from the middle, keeping the introduction and the conclusion
+        "end"     drop tokens from the end, keeping the introduction
+        "start"   drop tokens from the start, keeping the most recent additions
+    If that is not enough, the new abstract and then the query abstract are cut at the end.
+    """
+
+    TRIM_POLICIES = ("middle", "end", "start")
+
+    def __init__(self, tokenizer, prompt_prefix: PromptPrefix, query_abstract: str, max_length: int,
+                 max_new_tokens: int, buffer_tokens: int = 32, trim_policy: str = "middle"):
+        if trim_policy not in self.TRIM_POLICIES:
+            raise ValueError(f"Unknown trim policy '{trim_policy}'. Expected one of {self.TRIM_POLICIES}.")
+        self.tokenizer = tokenizer
+        self.prompt_prefix = prompt_prefix
+        self.max_length = max_length
+        self.max_new_tokens = max_new_tokens
+        self.buffer_tokens = buffer_tokens
+        self.trim_policy = trim_policy
+        self._literals = {}
+        self.query_ids = self.encode(query_abstract)
+        self.ellipsis_ids = self.encode(" ... ")
+        self.stop_ids = {tokenizer.eos_token_id, tokenizer.pad_token_id} - {None}
+
+    def encode(self, text: str) -> list[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def literal(self, text: str) -> list[int]:
+        """
+        Token ids of a fixed piece of prompt text, tokenized only the first time it is used.
+        """
+        if text not in self._literals:
+            self._literals[text] = self.encode(text)
+        return self._literals[text]
+
+    def build_inputs(self, summary_ids: list[int], abstract_i: str, new_abstract_title: str,
+                     new_abstract_doi: str, i: int) -> dict:
+        """
+        Returns generate() inputs for integrating one abstract into the summary, trimmed to fit
+        the model's context window.
+        """
+        abstract_ids = self.encode(abstract_i)
+        trailer_ids = self.encode(
+            f"\nNew Abstract Title: {new_abstract_title}\n"
+            f"New Abstract DOI: {new_abstract_doi}\n\n"
+            "Combined Summary:" + self.prompt_prefix.template_suffix
+        )
+        labels = [
+            self.literal("Query Abstract: "), self.literal("\nCurrent Summary: "),
+            self.literal(f"\nNew Abstract (ranked {i+1}th most similar to query): "), trailer_ids
+        ]
+        budget = (self.max_length - self.max_new_tokens - self.buffer_tokens
+                  - len(self.prompt_prefix) - sum(len(ids) for ids in labels))
+        query_ids = self.query_ids
+        excess = len(query_ids) + len(summary_ids) + len(abstract_ids) - budget
+        if excess > 0:
+            print(f"⚠️ Prompt too long by {excess} tokens. Trimming ({self.trim_policy} of current summary first).")
+            summary_ids = self.trim_summary(summary_ids, excess)
+            excess = len(query_ids) + len(summary_ids) + len(abstract_ids) - budget
+            if excess > 0:
+                abstract_ids = abstract_ids[:max(0, len(abstract_ids) - excess)]
+                excess = len(query_ids) + len(summary_ids) + len(abstract_ids) - budget
+            if excess > 0:
+                query_ids = query_ids[:max(0, len(query_ids) - excess)]
+            print(f"📝 Trimmed summary length: {len(summary_ids)} tokens")
+
+        dynamic_ids = (labels[0] + query_ids + labels[1] + summary_ids
+                       + labels[2] + abstract_ids + labels[3])
+        return self.prompt_prefix.build_inputs_from_ids(dynamic_ids)
+
+    def trim_summary(self, summary_ids: list[int], excess: int) -> list[int]:
+        """
+        Removes at least excess tokens from the summary according to the trim policy.
+        """
+        keep = len(summary_ids) - excess
+        if keep <= 0:
+            return []
+        if self.trim_policy == "end":
+            return summary_ids[:keep]
+        if self.trim_policy == "start":
+            return summary_ids[-keep:]
+        # "middle": the marker shows the model that text was omitted
+        keep -= len(self.ellipsis_ids)
+        if keep <= 0:
+            return []
+        head = (keep + 1) // 2
+        tail = keep - head
+        return summary_ids[:head] + self.ellipsis_ids + (summary_ids[-tail:] if tail else [])
+
+    def completion_ids(self, output_ids, prompt_length: int) -> list[int]:
+        """
+        Returns the ids generated after the prompt, up to the first end-of-sequence token.
+        """
+        completion = []
+        for token_id in output_ids[prompt_length:].tolist():
+            if token_id in self.stop_ids:
+                break
+            completion.append(token_id)
+        return completion
+
+def generate_batch(
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    prompts: list[str],
+    max_new_tokens: int = 256,
+    temperature: float = 0.7,
+    repetition_penalty: float = 1.0,
+    batch_size: int = 8,
+    streamer: TextStreamer = None
+) -> list[str]:
+    """
+    Generates a completion for each prompt, batch_size prompts per padded generate call.
+    Prompts are left-padded so that every completion starts right after its prompt, and only
+    the newly generated ids are decoded. Streamers only support a batch of one, so the
+    streamer is used only for generate calls with a single prompt.
+
+    Returns:
+        The completions, in the order of prompts.
+    """
+    padding_side = tokenizer.padding_side
+    pad_token = tokenizer.pad_token
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    try:
+        completions = []
+        for start in range(0, len(prompts), batch_size):
+            formatted = [format_prompt(tokenizer, prompt) for prompt in prompts[start:start + batch_size]]
+            batch_streamer = streamer if len(formatted) == 1 else None
+            # The chat template already contains the BOS token
+            inputs = tokenizer(formatted, return_tensors="pt", padding=True,
+                               add_special_tokens=tokenizer.chat_template is None).to(model.device)
+            start_time = time.perf_counter()
+            with torch.inference_mode():
+                outputs = model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    temperature=temperature,
+                    repetition_penalty=repetition_penalty,
+                    do_sample=True,
+                    eos_token_id=tokenizer.eos_token_id,
+                    pad_token_id=tokenizer.pad_token_id,
+                    streamer=batch_streamer
+                )
+            new_ids = outputs[:, inputs["input_ids"].shape[1]:]
+            # Sequences that finished early are padded up to the longest one; padding is not counted
+            record_generation("tree", int((new_ids != tokenizer.pad_token_id).sum()), time.perf_counter() - start_time)
+            completions.extend(text.strip() for text in tokenizer.batch_decode(new_ids, skip_special_tokens=True))
+    finally:
+        tokenizer.padding_side = padding_side
+        tokenizer.pad_token = pad_token
+    return completions
+
+def summarize_literature_tree(
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    query_abstract: str,
+    top_k_abstracts: list[dict], # Assumed to have 'abstract', 'title', 'doi' keys
+    max_new_tokens: int = 256,
+    temperature: float = 0.7,
+    repetition_penalty: float = 1.0,
+    batch_size: int = 8,
+    fan_in: int = 2,
+    streamer: TextStreamer = None
+) -> str:
+    """
+    Summarizes scientific literature with a map-reduce tree instead of a sequential fold.
+    Each abstract is first summarized against the query abstract, with the prompts batched into
+    padded generate calls. The partial summaries are then merged fan_in at a time, one batched
+    level after another, until a single summary remains. For k abstracts this takes
+    about 1 + log_{fan_in}(k) rounds of generation instead of k.
+
+    Args:
+        model: The loaded Hugging Face model.
+        tokenizer: The corresponding Hugging Face tokenizer.
+        query_abstract: The main abstract to which other abstracts are compared and summarized against.
+        top_k_abstracts: A list of dictionaries with 'abstract', 'title' and 'doi' keys.
+        max_new_tokens: Maximum number of tokens to generate for each partial or merged summary.
+        temperature: Controls randomness in generation.
+        repetition_penalty: Penalizes repeated tokens.
+        batch_size: Maximum number of prompts per generate call.
+        fan_in: Number of summaries merged by each reduce prompt.
+        streamer: Optional streamer for single-prompt generate calls (see generate_batch).
+
+    Returns:
+        The final consolidated summary of the literature.
+    """
+    map_prompts = []
+    for i, doc in enumerate(top_k_abstracts):
+        abstract_i = doc.get("abstract", "").strip()
+        if not abstract_i:
+            continue
+        map_prompts.append(gen_map_prompt(
+            query_abstract=query_abstract,
+            abstract_i=abstract_i,
+            new_abstract_title=doc.get("title", "No Title Provided").strip(),
+            new_abstract_doi=doc.get("doi", "No DOI Provided").strip(),
+            i=i
+        ))
+    if not map_prompts:
+        return ""
+
+    generation_kwargs = dict(max_new_tokens=max_new_tokens, temperature=temperature,
+                             repetition_penalty=repetition_penalty, batch_size=batch_size, streamer=streamer)
+    summaries = generate_batch(model, tokenizer, map_prompts, **generation_kwargs)
+    print(f"🔄 Summarized {len(summaries)} abstracts; merging {fan_in} at a time.")
+    while len(summaries) > 1:
+        groups = [summaries[j:j + fan_in] for j in range(0, len(summaries), fan_in)]
+        reduce_prompts = [gen_reduce_prompt(query_abstract, group) for group in groups if len(group) > 1]
+        merged = iter(generate_batch(model, tokenizer, reduce_prompts, **generation_kwargs))
+        # A leftover single summary is carried up to the next level unchanged
+        summaries = [next(merged) if len(group) > 1 else group[0] for group in groups]
+    return summaries[0]
+
+class SummaryStreamer(TextStreamer):
+    """
+    Forwards summary text to a callback as generate() produces it.
+    The callback receives ("pass", {"step": n}) when a generate call starts (each pass rewrites
+    the summary) and ("token", {"text": ...}) for each decoded piece of text. It is called from
+    the thread running generate.
+    """
+
+    def __init__(self, tokenizer, callback):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.callback = callback
+        self.step = 0
 
-        decoded_output = tokenizer.decode(outputs[0], skip_special_tokens=False)
-
-        if is_instruct_model:
-            assistant_tag = "<|start_header_id|>assistant<|end_header_id|>\n"
-            eot_tag = "<|eot_id|>"
-
-            assistant_response_start_idx = decoded_output.rfind(assistant_tag)
-            if assistant_response_start_idx != -1:
-                temp_output = decoded_output[assistant_response_start_idx + len(assistant_tag):]
-                eot_idx = temp_output.find(eot_tag)
-                if eot_idx != -1:
-                    generated_text = temp_output[:eot_idx].strip()
-                else:
-                    generated_text = temp_output.strip()
-            else:
-                print("⚠️ Warning: Assistant tag not found in instruct model output. Attempting general prompt removal.")
-                if decoded_output.startswith(formatted_prompt):
-                    generated_text = decoded_output[len(formatted_prompt):].strip()
-                else:
-                    generated_text = decoded_output.strip()
-        else:
-            if decoded_output.startswith(formatted_prompt):
-                generated_text = decoded_output[len(formatted_prompt):].strip()
-            else:
-                generated_text = decoded_output.strip()
-
-        # print(f"\n--- Iteration {i+1} ---")
-        # print(f"Prompt token count: {prompt_length}")
-        # print(f"Generated token count: {len(tokenizer(generated_text)['input_ids'])}")
-        # print("Generated text:\n", generated_text)
-
-        current_summary = generated_text.strip()
-
-    return current_summary
+    def put(self, value):
+        if self.next_tokens_are_prompt:
+            self.callback("pass", {"step": self.step})
+            self.step += 1
+        super().put(value)
 
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.callback("token", {"text": text})
@@ -0,0 +1,77 @@
+import os
+import aiofiles
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def file_id(path):
+    """
+    Returns an identifier of the file currently at path, which changes when the log is rotated,
+    or None if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+
+async def read_tail(path, n_lines, max_bytes):
+    """
+    Reads the last n_lines complete lines of a file by seeking backwards from its end in chunks,
+    so only the tail of the file is read.
+    Args:
+        path (str): File to read.
+        n_lines (int): Number of lines to return.
+        max_bytes (int): Maximum number of bytes read.
+    Returns:
+        tuple: (bytes of the last lines, offset to resume from with read_since)
+    """
+    async with aiofiles.open(path, "rb") as f:
+        end = await f.seek(0, os.SEEK_END)
+        start_limit = max(0, end - max_bytes)
+        data = b""
+        position = end
+        # One newline more than n_lines is needed to know where the first requested line starts
+        while position > start_limit and data.count(b"\n") <= n_lines:
+            read_size = min(READ_CHUNK_SIZE, position - start_limit)
+            position -= read_size
+            await f.seek(position)
+            data = await f.read(read_size) + data
+    # A trailing partial line is still being written; it is left for the next read
+    complete = data[:data.rfind(b"\n") + 1]
+    resume_offset = position + len(complete)
+    lines = complete.splitlines(keepends=True)
+    if position > 0 and lines:
+        lines = lines[1:]  # the first line may start before the bytes that were read
+    lines = lines[-n_lines:] if n_lines > 0 else []
+    return b"".join(lines), resume_offset
+
+
+async def read_since(path, offset, max_bytes):
+    """
+    Reads complete lines appended after a byte offset.
+    If the file is now shorter than offset (it was rotated or truncated) or offset is negative,
+    it is read from the start.
+    Args:
+        path (str): File to read.
+        offset (int): Byte offset returned by a previous read.
+        max_bytes (int): Maximum number of bytes returned by one call.
+    Returns:
+        tuple: (bytes of complete lines, offset to resume from)
+    """
+    async with aiofiles.open(path, "rb") as f:
+        end = await f.seek(0, os.SEEK_END)
+        if offset > end or offset < 0:
+            offset = 0
+        if offset == end:
+            return b"", offset
+        await f.seek(offset)
+        data = await f.read(min(end - offset, max_bytes))
+    # A trailing partial line is left for the next read, unless it alone exceeds max_bytes
+    last_newline = data.rfind(b"\n")
+    if last_newline >= 0:
+        data = data[:last_newline + 1]
+    elif len(data) < max_bytes:
+        data = b""
+    return data, offset + len(data)
@@ -0,0 +1,115 @@
+import os
+from pymongo import monitoring
+from prometheus_client import (Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest,
+                               CONTENT_TYPE_LATEST, multiprocess)
+
+# Buckets (seconds) for stages that range from sub-millisecond lookups to minutes of generation
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Buckets (seconds) for single MongoDB and S3 operations
+OPERATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to returning its response headers.",
+    ["method", "endpoint", "status"],
+    buckets=STAGE_BUCKETS
+)
+ABSTRACT_QUERY_STAGE_SECONDS = Histogram(
+    "abstract_query_stage_seconds",
+    "Time spent in each stage of an abstract query report.",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+DOCUMENTS_LOADED = Counter(
+    "documents_loaded_total",
+    "Abstracts written to MongoDB, by source (ingest or s3 warm start) and outcome (inserted or skipped).",
+    ["source", "outcome"]
+)
+S3_OBJECTS_LOADED = Counter("s3_objects_loaded_total", "S3 objects loaded into MongoDB by the warm start.")
+S3_BYTES_LOADED = Counter("s3_bytes_loaded_total", "Bytes of S3 objects loaded into MongoDB by the warm start.")
+MONGO_OPERATION_SECONDS = Histogram(
+    "mongo_operation_seconds",
+    "Latency of MongoDB commands issued by the data service, by command name.",
+    ["operation"],
+    buckets=OPERATION_BUCKETS
+)
+S3_OPERATION_SECONDS = Histogram(
+    "s3_operation_seconds",
+    "Latency of S3 calls, by operation.",
+    ["operation"],
+    buckets=OPERATION_BUCKETS
+)
+LLM_GENERATED_TOKENS = Counter(
+    "llm_generated_tokens_total", "Tokens generated while summarizing, by summarization mode.", ["mode"]
+)
+LLM_GENERATION_SECONDS = Counter(
+    "llm_generation_seconds_total", "Time spent in generate calls while summarizing, by summarization mode.", ["mode"]
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second",
+    "Generation throughput of each generate call while summarizing, by summarization mode.",
+    ["mode"],
+    buckets=(1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000)
+)
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size",
+    "Distinct query texts encoded per call by the micro-batching embedding service.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+EMBEDDING_CACHE_REQUESTS = Counter(
+    "embedding_cache_requests_total", "Query embedding requests, by LRU cache result (hit or miss).", ["result"]
+)
+
+
+def stage_timer(stage):
+    """
+    Returns a context manager that records the duration of its body as an abstract query stage.
+    """
+    return ABSTRACT_QUERY_STAGE_SECONDS.labels(stage=stage).time()
+
+
+def observe_stage(stage, seconds):
+    ABSTRACT_QUERY_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def record_generation(mode, n_tokens, seconds):
+    """
+    Records the tokens produced by one generate call and how long it took.
+    """
+    LLM_GENERATED_TOKENS.labels(mode=mode).inc(n_tokens)
+    LLM_GENERATION_SECONDS.labels(mode=mode).inc(seconds)
+    if seconds > 0 and n_tokens > 0:
+        LLM_TOKENS_PER_SECOND.labels(mode=mode).observe(n_tokens / seconds)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    pymongo command listener that records the latency of every command a client issues.
+    Pass an instance in a client's event_listeners.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_OPERATION_SECONDS.labels(operation=event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_OPERATION_SECONDS.labels(operation=event.command_name).observe(event.duration_micros / 1e6)
+
+
+def render_metrics():
+    """
+    Renders every metric in the Prometheus text format.
+    When PROMETHEUS_MULTIPROC_DIR is set (several server worker processes), the values of all
+    workers are aggregated from that directory; otherwise this process's registry is used.
+    Returns:
+        tuple: (bytes body, content type)
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
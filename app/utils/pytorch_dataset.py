@@ -1,9 +1,20 @@
 import torch
-from torch.utils.data import Dataset
-from sklearn.model_selection import TimeSeriesSplit, train_test_split
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+from sklearn.model_selection import KFold, TimeSeriesSplit, train_test_split
+import copy
 import random
+import itertools
+import queue
+import threading
+import json
+import shutil
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from bson import ObjectId
 from pymongo import MongoClient
 from datetime import datetime
+from functools import partial
 import os
 
 class BioRxivDataset(Dataset):
@@ -14,12 +25,15 @@ class BioRxivDataset(Dataset):
              subset_query=None,
              stream_mongo=False,
              indices=None):
+        self.mongo_uri = mongo_uri
         self.client = MongoClient(mongo_uri)
         self.db = self.client[db_name]
         self.collection = self.db[collection_name]
         self.stream_mongo = stream_mongo
         self.transform = None
         self.transformed_data = None
+        # Positions into data/ids (or transformed_data) when this dataset is a view; None for all rows
+        self._indices = None
 
         # Apply subset query
         self.subset_query = subset_query if subset_query else {}
@@ -32,36 +46,90 @@ class BioRxivDataset(Dataset):
             self.ids = [all_ids[i] for i in indices] if indices else all_ids
             self.data = None
         else:
-            all_data = list(self.collection.find(self.subset_query, {"_id": 1, "doi": 1, "abstract": 1, "date": 1}).sort("date", 1))
-            for doc in all_data:
-                if "date" not in doc:
-                    raise ValueError("Each document must contain a 'date' field.")
-                if "abstract" not in doc:
-                    raise ValueError("Each document must contain an 'abstract' field.")
-            if not all_data:
+            cursor = self.collection.find(self.subset_query, {"_id": 1, "doi": 1, "abstract": 1, "date": 1}).sort("date", 1)
+            # Documents are packed into columns as they stream in, so the full list of dicts never exists
+            all_data = ColumnarCorpus.from_documents(cursor)
+            if not len(all_data):
                 raise ValueError("No data found in the specified MongoDB collection.")
             # if indices:
             #     print(f"Using indices")
-            self.data = [all_data[i] for i in indices] if indices else all_data
+            self.data = all_data.select(indices) if indices else all_data
             assert len(self.data) > 0, "No data found in the specified MongoDB collection."
             self.ids = None
 
     def __len__(self):
+        if self._indices is not None:
+            return len(self._indices)
         if self.transformed_data is not None:
             return len(self.transformed_data)
         return len(self.ids) if self.stream_mongo else len(self.data)
 
+    def _view(self, indices):
+        """
+        Returns a dataset over the given positions of this one that shares its documents,
+        transformed data and MongoDB client; only the index array is new.
+        The shared storage is copy-on-write: map, tokenize and shuffle assign new objects to
+        the dataset they are called on and never modify shared data in place, so the view and
+        the dataset it was taken from never see each other's changes.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        view = copy.copy(self)
+        view._indices = self._indices[indices] if self._indices is not None else indices
+        return view
+
+    def _row(self, idx):
+        """
+        Maps a position in this dataset to a position in the underlying storage.
+        """
+        return int(self._indices[idx]) if self._indices is not None else idx
+
+    def _storage_len(self):
+        return len(self.ids) if self.stream_mongo else len(self.data)
+
+    def _rows(self):
+        """
+        Returns the storage positions of this dataset's examples, in order.
+        """
+        return self._indices if self._indices is not None else np.arange(self._storage_len(), dtype=np.int64)
+
+    def _set_transformed(self, results):
+        """
+        Stores one result per example of this dataset (None to drop the example).
+        Results are kept at their examples' storage positions, so the index mapping of this
+        dataset stays valid; it only loses the dropped examples. The storage is a new object
+        assigned to this dataset alone, so views sharing the previous one are unaffected.
+        """
+        aligned = [None] * self._storage_len()
+        kept = []
+        for row, result in zip(self._rows(), results):
+            if result is None:
+                continue
+            aligned[row] = result
+            kept.append(row)
+        self.transformed_data = aligned
+        self._indices = np.asarray(kept, dtype=np.int64)
+
     def map(self, func, batched=False, lazy=False, **kwargs):
+        """
+        Applies func to every example; examples for which it returns None are dropped.
+        With batched=True the examples are processed in batches of batch_size, in num_proc
+        worker processes if num_proc > 1 (func must then be picklable, e.g. a functools.partial;
+        it is sent to each worker once). With lazy=True func is applied on access instead.
+        Mapping a view (see select, train_test_split) gives it its own transformed data; the
+        dataset it was taken from is not modified.
+        Keyword Args:
+            batch_size (int): Examples per batch (default 100).
+            num_proc (int): Number of worker processes for batched mapping (default 1).
+        """
         batch_size = kwargs.get("batch_size", 100)
+        num_proc = kwargs.get("num_proc") or 1
 
         if batched:
             assert self.stream_mongo is False, "Batched mapping is not supported in streaming mode."
-            transformed = []
-            for i in range(0, len(self.data), batch_size):
-                batch = self.data[i:i + batch_size]
-                batch_result = [func(item) for item in batch]
-                transformed.extend([r for r in batch_result if r is not None])
-            self.transformed_data = transformed
+            batches = ([self[i] for i in range(start, min(start + batch_size, len(self)))]
+                       for start in range(0, len(self), batch_size))
+            results = parallel_map(partial(_map_examples, func), batches, num_proc)
+            self._set_transformed(result for batch_result in results for result in batch_result)
             return self
 
         elif lazy:
@@ -69,31 +137,144 @@ class BioRxivDataset(Dataset):
             return self
 
         else:
-            transformed_data = []
+            results = []
             for i in range(len(self)):
                 result = func(self.__getitem__(i))
-                if result is not None:
-                    transformed_data.append(result)
-                else:
+                if result is None:
                     print(f"Skipping item at index {i} due to None result.")
-            self.transformed_data = transformed_data
+                results.append(result)
+            self._set_transformed(results)
             return self
 
 
+    def _batch(self, start, end):
+        """
+        Returns examples start:end as a dict of lists.
+        """
+        return self.data.batch(self._rows()[start:end])
+
+    def _storage_version(self):
+        """
+        Returns a fingerprint of all loaded documents, regardless of this dataset's view.
+        """
+        return hashlib.sha1(np.ascontiguousarray(self.data.ids).tobytes()).hexdigest()
+
+    def corpus_version(self):
+        """
+        Returns a fingerprint of the loaded documents (their _ids in order), which changes
+        whenever documents are added or removed.
+        """
+        digest = hashlib.sha1()
+        if not self.stream_mongo:
+            rows = self._indices if self._indices is not None else slice(None)
+            digest.update(np.ascontiguousarray(self.data.ids[rows]).tobytes())
+            return digest.hexdigest()
+        rows = self._indices if self._indices is not None else range(len(self.ids))
+        for i in rows:
+            _id = self.ids[i]
+            digest.update(_id.binary if isinstance(_id, ObjectId) else str(_id).encode("utf-8"))
+        return digest.hexdigest()
+
+    def tokenize(self, tokenizer, max_length=512, cache_dir=None, batch_size=1000, num_proc=None):
+        """
+        Tokenizes every abstract with tokenize_batch_with_eos and stores the result as
+        TokenizedArrays (flat int32 ids plus offsets) in transformed_data. Examples with an
+        empty abstract are dropped.
+        Worker processes receive only the texts, load the tokenizer once each, and return
+        flat token arrays that are written straight into the TokenizedArrays buffers. The
+        arrays are laid out by storage position, so a view keeps its index mapping.
+        If cache_dir is given the arrays are saved there, keyed by tokenizer name, max_length,
+        subset_query, the loaded documents and the view's examples, and later runs with the
+        same key load them instead.
+        Args:
+            tokenizer: A Hugging Face tokenizer, ideally a fast one.
+            max_length (int): Maximum tokens per example, including the EOS token.
+            cache_dir (str): Optional directory for cached token arrays.
+            batch_size (int): Abstracts per tokenizer call.
+            num_proc (int): Number of worker processes.
+        Returns:
+            BioRxivDataset: self
+        """
+        assert self.stream_mongo is False, "Tokenization is not supported in streaming mode."
+        rows = self._rows()
+        cache_path = None
+        if cache_dir is not None:
+            key = json.dumps([getattr(tokenizer, "name_or_path", type(tokenizer).__name__), max_length,
+                              self.subset_query, self._storage_version(),
+                              hashlib.sha1(np.ascontiguousarray(rows).tobytes()).hexdigest()],
+                             sort_keys=True, default=str)
+            cache_path = os.path.join(cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest())
+            if os.path.exists(os.path.join(cache_path, TokenizedArrays.META_FILE)):
+                tokenized = TokenizedArrays.load(cache_path)
+                self._set_tokenized(tokenized, rows)
+                print(f"Loaded {len(self)} tokenized examples from {cache_path}")
+                return self
+
+        # Each storage position is tokenized once, in storage order, so the ids are laid out by position
+        unique_rows = np.unique(rows)
+        row_batches = [unique_rows[i:i + batch_size] for i in range(0, len(unique_rows), batch_size)]
+        texts = ([self.data.text(row) for row in batch_rows] for batch_rows in row_batches)
+        lengths = np.zeros(self._storage_len(), dtype=np.int64)
+        chunks = []
+        results = parallel_map(partial(tokenize_texts, tokenizer=tokenizer, max_length=max_length), texts,
+                               num_proc or 1, chunksize=max(1, len(row_batches) // (8 * (num_proc or 1))))
+        for batch_rows, (ids, batch_lengths) in zip(row_batches, results):
+            lengths[batch_rows] = batch_lengths
+            chunks.append(ids)
+        tokenized = TokenizedArrays.from_chunks(chunks, lengths)
+        self._set_tokenized(tokenized, rows)
+        if cache_path is not None:
+            tokenized.save(cache_path)
+            print(f"Saved {len(self)} tokenized examples to {cache_path}")
+        return self
+
+    def _set_tokenized(self, tokenized, rows):
+        # Empty abstracts have no tokens; they are dropped from the view
+        self.transformed_data = tokenized
+        self._indices = rows[tokenized.lengths()[rows] > 0]
+
+    def save_columnar(self, path):
+        """
+        Saves the loaded documents in columnar form so they can be reopened with
+        from_columnar without querying MongoDB.
+        """
+        assert self.stream_mongo is False, "Columnar storage is not supported in streaming mode."
+        data = self.data.select(self._indices) if self._indices is not None else self.data
+        data.save(path)
+
+    @classmethod
+    def from_columnar(cls, path, subset_query=None):
+        """
+        Opens documents saved with save_columnar. The columns are memory-mapped, so every
+        process that opens the same path shares one copy through the page cache.
+        """
+        dataset = cls.__new__(cls)
+        dataset.mongo_uri = None
+        dataset.client = dataset.db = dataset.collection = None
+        dataset.stream_mongo = False
+        dataset.transform = None
+        dataset.transformed_data = None
+        dataset._indices = None
+        dataset.subset_query = subset_query if subset_query else {}
+        dataset.data = ColumnarCorpus.load(path)
+        dataset.ids = None
+        return dataset
+
     def __getitem__(self, idx):
+        idx = self._row(idx)
         if self.transformed_data is not None:
             return self.transformed_data[idx]
         else:
             if self.stream_mongo:
                 item = self.collection.find_one({"_id": self.ids[idx]})
+                result = {
+                    "_id": str(item["_id"]),
+                    "doi": item.get("doi"),
+                    "text": item.get("abstract"),
+                    "date": item.get("date")
+                }
             else:
-                item = self.data[idx]
-            result = {
-                "_id": str(item["_id"]),
-                "doi": item.get("doi"),
-                "text": item.get("abstract"),
-                "date": item.get("date")
-            }
+                result = self.data.example(idx)
 
             if self.transform:
                 result = self.transform(result)
@@ -104,51 +285,362 @@ class BioRxivDataset(Dataset):
         return [self[i] for i in range(len(self))]
 
     def shuffle(self, seed=None):
-        if seed is not None:
-            random.seed(seed)
-        if self.stream_mongo:
-            random.shuffle(self.ids)
-        else:
-            random.shuffle(self.data)
+        """
+        Shuffles the dataset in place and returns it, as before views were introduced. Only
+        this dataset's index array is replaced; no documents are copied, and views taken from
+        it earlier keep their order. Use select(...) on a permutation for a shuffled copy.
+        """
+        permutation = np.random.default_rng(seed).permutation(len(self))
+        self._indices = self._indices[permutation] if self._indices is not None else permutation
         return self
 
+    def select(self, indices):
+        """
+        Returns a view of the dataset containing the examples at the given positions.
+        """
+        return self._view(indices)
+
     def train_test_split(self, test_size=0.2, random_state=42, use_time_series_split=False):
+        """
+        Splits the dataset into train and test views that share this dataset's data.
+        With use_time_series_split the test set is the most recent block of documents
+        (the data is sorted by date) and the train set everything before it.
+        """
         if not (0 < test_size < 1):
             raise ValueError("test_size must be between 0 and 1.")
-        if self.stream_mongo:
-            raise NotImplementedError("train_test_split not supported in streaming mode.")
 
-        indices = list(range(len(self)))
+        indices = np.arange(len(self))
         if use_time_series_split:
             tscv = TimeSeriesSplit(n_splits=int(1/test_size))
             train_indices, test_indices = list(tscv.split(indices))[-1]
         else:
             train_indices, test_indices = train_test_split(indices, test_size=test_size, random_state=random_state)
 
-        train_dataset = BioRxivDataset(
-            mongo_uri=self.client.address[0],
-            db_name=self.db.name,
-            collection_name=self.collection.name,
-            subset_query=self.subset_query,
-            stream_mongo=self.stream_mongo,
-            indices=train_indices
-        )
-        test_dataset = BioRxivDataset(
-            mongo_uri=self.client.address[0],
-            db_name=self.db.name,
-            collection_name=self.collection.name,
-            subset_query=self.subset_query,
-            stream_mongo=self.stream_mongo,
-            indices=test_indices
+        return self._view(train_indices), self._view(test_indices)
+
+    def k_fold_splits(self, n_splits=5, shuffle=True, random_state=42):
+        """
+        Returns n_splits (train, test) pairs of views for k-fold cross-validation.
+        """
+        kfold = KFold(n_splits=n_splits, shuffle=shuffle, random_state=random_state if shuffle else None)
+        return [(self._view(train), self._view(test)) for train, test in kfold.split(np.arange(len(self)))]
+
+    def time_series_splits(self, n_splits=5, test_size=None, gap=0):
+        """
+        Returns n_splits (train, test) pairs of views with expanding training windows, where each
+        test block follows its training data in time (the data is sorted by date).
+        Args:
+            n_splits (int): Number of folds.
+            test_size (int): Examples per test block; defaults to len(self) // (n_splits + 1).
+            gap (int): Examples left out between the end of training and the start of testing.
+        """
+        tscv = TimeSeriesSplit(n_splits=n_splits, test_size=test_size, gap=gap)
+        return [(self._view(train), self._view(test)) for train, test in tscv.split(np.arange(len(self)))]
+
+class ColumnarCorpus:
+    """
+    Compact column store for the documents of a BioRxivDataset.
+
+    Instead of one Python dict per document it keeps
+        ids            (n, 12) uint8 array of ObjectId bytes
+        doi buffer     all DOIs as one UTF-8 buffer, sliced by int64 doi offsets
+        text buffer    all abstracts as one UTF-8 buffer, sliced by int64 text offsets
+        dates          int32 days since 1970-01-01
+    Examples are decoded from these arrays on access. The arrays hold no Python objects, so
+    forked DataLoader workers never touch (and copy) their pages, and saved stores are
+    opened with np.memmap so separate processes share one copy.
+    """
+
+    COLUMNS = {
+        "ids": ("ids.u8", np.uint8),
+        "doi_buffer": ("doi_buffer.u8", np.uint8),
+        "doi_offsets": ("doi_offsets.i64", np.int64),
+        "text_buffer": ("text_buffer.u8", np.uint8),
+        "text_offsets": ("text_offsets.i64", np.int64),
+        "dates": ("dates.i32", np.int32),
+    }
+    META_FILE = "meta.json"
+
+    def __init__(self, ids, doi_buffer, doi_offsets, text_buffer, text_offsets, dates):
+        self.ids = ids.reshape(-1, 12)
+        self.doi_buffer = doi_buffer
+        self.doi_offsets = doi_offsets
+        self.text_buffer = text_buffer
+        self.text_offsets = text_offsets
+        self.dates = dates
+
+    @classmethod
+    def from_documents(cls, docs):
+        """
+        Builds the columns from an iterable of MongoDB documents with '_id', 'doi',
+        'abstract' and 'date' fields, consuming it one document at a time.
+        """
+        ids, dois, texts = bytearray(), bytearray(), bytearray()
+        doi_offsets, text_offsets, dates = [0], [0], []
+        for doc in docs:
+            if "date" not in doc:
+                raise ValueError("Each document must contain a 'date' field.")
+            if "abstract" not in doc:
+                raise ValueError("Each document must contain an 'abstract' field.")
+            ids += ObjectId(doc["_id"]).binary
+            dois += (doc.get("doi") or "").encode("utf-8")
+            doi_offsets.append(len(dois))
+            texts += (doc.get("abstract") or "").encode("utf-8")
+            text_offsets.append(len(texts))
+            dates.append(str(doc["date"])[:10])
+        return cls(
+            np.frombuffer(bytes(ids), dtype=np.uint8),
+            np.frombuffer(bytes(dois), dtype=np.uint8),
+            np.array(doi_offsets, dtype=np.int64),
+            np.frombuffer(bytes(texts), dtype=np.uint8),
+            np.array(text_offsets, dtype=np.int64),
+            np.array(dates, dtype="datetime64[D]").astype(np.int32)
         )
 
-        train_dataset.transform = self.transform
-        test_dataset.transform = self.transform
+    def __len__(self):
+        return len(self.dates)
 
-        train_dataset.transformed_data = [self.transformed_data[i] for i in train_indices] if self.transformed_data else None
-        test_dataset.transformed_data = [self.transformed_data[i] for i in test_indices] if self.transformed_data else None
+    def object_id(self, i):
+        return ObjectId(self.ids[i].tobytes())
 
-        return train_dataset, test_dataset
+    def doi(self, i):
+        doi = self.doi_buffer[self.doi_offsets[i]:self.doi_offsets[i + 1]].tobytes().decode("utf-8")
+        return doi or None
+
+    def text(self, i):
+        return self.text_buffer[self.text_offsets[i]:self.text_offsets[i + 1]].tobytes().decode("utf-8")
+
+    def date(self, i):
+        return str(np.datetime64(int(self.dates[i]), "D"))
+
+    def example(self, i):
+        """
+        Returns document i in BioRxivDataset's example format.
+        """
+        return {
+            "_id": self.ids[i].tobytes().hex(),
+            "doi": self.doi(i),
+            "text": self.text(i),
+            "date": self.date(i)
+        }
+
+    def batch(self, rows):
+        """
+        Returns the documents at rows as a dict of lists, as BioRxivDataset.map(batched=True) expects.
+        """
+        return {
+            "_id": [self.ids[i].tobytes().hex() for i in rows],
+            "doi": [self.doi(i) for i in rows],
+            "text": [self.text(i) for i in rows],
+            "date": [self.date(i) for i in rows]
+        }
+
+    def select(self, rows):
+        """
+        Returns a new, compacted ColumnarCorpus with the documents at rows.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        doi_buffer, doi_offsets = self._gather(self.doi_buffer, self.doi_offsets, rows)
+        text_buffer, text_offsets = self._gather(self.text_buffer, self.text_offsets, rows)
+        return type(self)(np.ascontiguousarray(self.ids[rows]).reshape(-1), doi_buffer, doi_offsets,
+                          text_buffer, text_offsets, self.dates[rows])
+
+    @staticmethod
+    def _gather(buffer, offsets, rows):
+        starts, ends = offsets[rows], offsets[rows + 1]
+        lengths = ends - starts
+        new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_offsets[1:])
+        if not new_offsets[-1]:
+            return np.empty(0, dtype=np.uint8), new_offsets
+        # Byte positions of every selected slice, concatenated
+        positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+        return np.asarray(buffer)[positions], new_offsets
+
+    def save(self, path):
+        # Written to a temporary directory first so a partial store is never opened
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, (filename, dtype) in self.COLUMNS.items():
+            np.ascontiguousarray(getattr(self, name), dtype=dtype).tofile(os.path.join(tmp_path, filename))
+        with open(os.path.join(tmp_path, self.META_FILE), "w") as f:
+            json.dump({"num_documents": len(self)}, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        columns = {}
+        for name, (filename, dtype) in cls.COLUMNS.items():
+            file_path = os.path.join(path, filename)
+            if os.path.getsize(file_path) == 0:
+                columns[name] = np.empty(0, dtype=dtype)  # np.memmap cannot map empty files
+            else:
+                columns[name] = np.memmap(file_path, dtype=dtype, mode="r")
+        return cls(**columns)
+
+class BioRxivIterableDataset(IterableDataset):
+    """
+    Streams documents from MongoDB in large batches instead of one find_one per sample.
+
+    The sorted _ids matching subset_query are read once (as a compact array of 12-byte
+    ObjectIds) and cut into blocks of batch_size. Each block is fetched with a single
+    `_id $in` query, and a background thread prefetches the next `prefetch` blocks while the
+    current one is consumed. Blocks are assigned round-robin to shards, one shard per
+    (distributed rank, DataLoader worker) pair, so every document is read exactly once per
+    epoch across all workers and ranks. Each worker process opens its own MongoClient on first
+    use, so no client is shared across a fork.
+    """
+
+    def __init__(self,
+                 mongo_uri="mongodb://localhost:27017",
+                 db_name="biorxiv",
+                 collection_name="abstracts",
+                 subset_query=None,
+                 batch_size=1000,
+                 prefetch=2,
+                 shuffle=False,
+                 seed=0,
+                 transform=None,
+                 rank=None,
+                 world_size=None):
+        """
+        Args:
+            mongo_uri (str): MongoDB connection string.
+            db_name (str): Database name.
+            collection_name (str): Collection name.
+            subset_query (dict): Optional filter on the collection.
+            batch_size (int): Documents fetched per MongoDB query.
+            prefetch (int): Number of blocks fetched ahead in the background.
+            shuffle (bool): Shuffle block order and documents within blocks each epoch.
+            seed (int): Base seed for shuffling; the epoch is added to it (see set_epoch).
+            transform (callable): Optional function applied to every example.
+            rank (int): Distributed rank; defaults to torch.distributed's rank if initialized, else 0.
+            world_size (int): Distributed world size; defaults like rank, else 1.
+        """
+        self.mongo_uri = mongo_uri
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self.subset_query = subset_query if subset_query else {}
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.transform = transform
+        self.rank = rank
+        self.world_size = world_size
+        self._client = None
+        self._client_pid = None
+
+        cursor = self._collection().find(self.subset_query, {"_id": 1}).sort("date", 1)
+        id_bytes = b"".join(doc["_id"].binary for doc in cursor)
+        if not id_bytes:
+            raise ValueError("No data found in the specified MongoDB collection.")
+        self.ids = np.frombuffer(id_bytes, dtype=np.uint8).reshape(-1, 12)
+        # Readers reconnect on first use, in whichever process iterates
+        self._client.close()
+        self._client = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getstate__(self):
+        # MongoClient is not fork- or pickle-safe; each worker reconnects
+        state = self.__dict__.copy()
+        state["_client"] = None
+        state["_client_pid"] = None
+        return state
+
+    def _collection(self):
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = MongoClient(self.mongo_uri)
+            self._client_pid = os.getpid()
+        return self._client[self.db_name][self.collection_name]
+
+    def set_epoch(self, epoch):
+        """
+        Sets the epoch used to seed shuffling, so every rank and worker shuffles identically.
+        """
+        self.epoch = epoch
+
+    def _shard(self):
+        rank, world_size = self.rank, self.world_size
+        if rank is None or world_size is None:
+            if torch.distributed.is_available() and torch.distributed.is_initialized():
+                rank, world_size = torch.distributed.get_rank(), torch.distributed.get_world_size()
+            else:
+                rank, world_size = 0, 1
+        worker_info = get_worker_info()
+        worker_id, num_workers = (worker_info.id, worker_info.num_workers) if worker_info else (0, 1)
+        return rank * num_workers + worker_id, world_size * num_workers
+
+    def _blocks(self):
+        """
+        Returns the row ranges of the blocks this shard reads, in reading order.
+        """
+        n_blocks = (len(self.ids) + self.batch_size - 1) // self.batch_size
+        order = np.arange(n_blocks)
+        if self.shuffle:
+            order = np.random.default_rng(self.seed + self.epoch).permutation(n_blocks)
+        shard_id, num_shards = self._shard()
+        return [(b * self.batch_size, min((b + 1) * self.batch_size, len(self.ids)))
+                for b in order[shard_id::num_shards]]
+
+    def _fetch_block(self, start, end):
+        ids = [ObjectId(row.tobytes()) for row in self.ids[start:end]]
+        docs = {
+            doc["_id"]: doc
+            for doc in self._collection().find({"_id": {"$in": ids}}, {"_id": 1, "doi": 1, "abstract": 1, "date": 1})
+        }
+        # $in returns documents in arbitrary order; restore the block's order
+        return [docs[_id] for _id in ids if _id in docs]
+
+    def _prefetch(self, blocks, out, stop):
+        try:
+            for start, end in blocks:
+                docs = self._fetch_block(start, end)
+                while not stop.is_set():
+                    try:
+                        out.put(docs, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            out.put(None)
+        except Exception as e:
+            out.put(e)
+
+    def __iter__(self):
+        blocks = self._blocks()
+        out = queue.Queue(maxsize=max(1, self.prefetch))
+        stop = threading.Event()
+        fetcher = threading.Thread(target=self._prefetch, args=(blocks, out, stop), daemon=True)
+        fetcher.start()
+        rng = random.Random(self.seed + self.epoch) if self.shuffle else None
+        try:
+            while True:
+                docs = out.get()
+                if docs is None:
+                    return
+                if isinstance(docs, Exception):
+                    raise docs
+                if rng is not None:
+                    rng.shuffle(docs)
+                for item in docs:
+                    result = {
+                        "_id": str(item["_id"]),
+                        "doi": item.get("doi"),
+                        "text": item.get("abstract"),
+                        "date": item.get("date")
+                    }
+                    if self.transform:
+                        result = self.transform(result)
+                    yield result
+        finally:
+            stop.set()
 
 def tokenize_with_eos(example, tokenizer, max_length=512):
     text = example.get("text", "")
@@ -176,3 +668,334 @@ def tokenize_with_eos(example, tokenizer, max_length=512):
         "attention_mask": attention_mask,
         "labels": input_ids
     }
+
+def _map_examples(func, examples):
+    return [func(example) for example in examples]
+
+_worker_func = None
+
+def _init_worker(func):
+    global _worker_func
+    _worker_func = func
+
+def _run_worker(task):
+    return _worker_func(task)
+
+def parallel_map(func, tasks, num_proc=1, chunksize=1):
+    """
+    Yields func(task) for every task, in order.
+    With num_proc > 1 the tasks run in a process pool. func (e.g. a partial holding a
+    tokenizer) is sent to each worker once through the pool initializer instead of with every
+    task, tasks are sent chunksize at a time, and only a bounded window of tasks is pulled
+    from the iterable and in flight at once, so large inputs are never materialized.
+    """
+    if num_proc <= 1:
+        for task in tasks:
+            yield func(task)
+        return
+    window = num_proc * chunksize * 4
+    tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=num_proc, initializer=_init_worker, initargs=(func,)) as executor:
+        while True:
+            batch = list(itertools.islice(tasks, window))
+            if not batch:
+                return
+            yield from executor.map(_run_worker, batch, chunksize=chunksize)
+
+def tokenize_texts(texts, tokenizer, max_length=512):
+    """
+    Tokenizes a batch of texts with tokenize_batch_with_eos and returns compact arrays instead
+    of per-example lists: (flat int32 token ids, int64 length per text). Empty texts get length 0.
+    """
+    non_empty = [text for text in texts if text]
+    input_ids = tokenize_batch_with_eos({"text": non_empty}, tokenizer, max_length)["input_ids"]
+    lengths = np.zeros(len(texts), dtype=np.int64)
+    lengths[[i for i, text in enumerate(texts) if text]] = [len(ids) for ids in input_ids]
+    flat = np.fromiter(itertools.chain.from_iterable(input_ids), dtype=np.int32, count=int(lengths.sum()))
+    return flat, lengths
+
+def tokenize_batch_with_eos(batch, tokenizer, max_length=512):
+    """
+    Batched version of tokenize_with_eos for BioRxivDataset.map(batched=True): tokenizes all
+    texts of a batch in one tokenizer call and appends the EOS token. Empty texts are skipped.
+    """
+    eos_token_id = tokenizer.eos_token_id
+    if eos_token_id is None:
+        raise ValueError("Tokenizer does not define an EOS token.")
+    texts = [text for text in batch["text"] if text]
+    if not texts:
+        return {"input_ids": [], "attention_mask": [], "labels": []}
+
+    tokens = tokenizer(
+        texts,
+        truncation=True,
+        max_length=max_length - 1,
+        padding=False,
+        return_tensors=None
+    )
+    input_ids = [ids + [eos_token_id] for ids in tokens["input_ids"]]
+    return {
+        "input_ids": input_ids,
+        "attention_mask": [[1] * len(ids) for ids in input_ids],
+        "labels": input_ids
+    }
+
+class TokenizedArrays:
+    """
+    Token ids of many examples stored as one flat int32 array plus an int64 offsets array
+    (example i is input_ids[offsets[i]:offsets[i + 1]]). On disk the arrays are raw binary
+    files that are memory-mapped on load, so loading is instant and DataLoader workers share
+    the pages. Indexing returns examples in the format of tokenize_with_eos.
+    """
+
+    IDS_FILE = "input_ids.i32"
+    OFFSETS_FILE = "offsets.i64"
+    META_FILE = "meta.json"
+
+    def __init__(self, input_ids, offsets):
+        self.input_ids = input_ids
+        self.offsets = offsets
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        sequences = [np.asarray(ids, dtype=np.int32) for ids in sequences]
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in sequences], out=offsets[1:])
+        input_ids = np.concatenate(sequences) if sequences else np.empty(0, dtype=np.int32)
+        return cls(input_ids, offsets)
+
+    @classmethod
+    def from_chunks(cls, chunks, lengths):
+        """
+        Builds the arrays from flat int32 token chunks, whose concatenation holds the examples in
+        order, and the token count of every example.
+        """
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        input_ids = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32)
+        return cls(input_ids, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        input_ids = self.input_ids[self.offsets[idx]:self.offsets[idx + 1]].tolist()
+        return {
+            "input_ids": input_ids,
+            "attention_mask": [1] * len(input_ids),
+            "labels": input_ids
+        }
+
+    def save(self, path):
+        # Written to a temporary directory first so a partial cache is never loaded
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        self.input_ids.astype(np.int32, copy=False).tofile(os.path.join(tmp_path, self.IDS_FILE))
+        self.offsets.astype(np.int64, copy=False).tofile(os.path.join(tmp_path, self.OFFSETS_FILE))
+        with open(os.path.join(tmp_path, self.META_FILE), "w") as f:
+            json.dump({"num_examples": len(self), "num_tokens": int(self.offsets[-1])}, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        offsets = np.fromfile(os.path.join(path, cls.OFFSETS_FILE), dtype=np.int64)
+        if offsets[-1] == 0:
+            return cls(np.empty(0, dtype=np.int32), offsets)
+        input_ids = np.memmap(os.path.join(path, cls.IDS_FILE), dtype=np.int32, mode="r")
+        return cls(input_ids, offsets)
+
+def example_lengths(dataset):
+    """
+    Returns the token count of every example of a tokenized dataset, without materializing
+    examples when the tokens are stored as TokenizedArrays.
+    """
+    data = getattr(dataset, "transformed_data", None)
+    if isinstance(data, TokenizedArrays):
+        lengths = data.lengths()
+        return lengths[dataset._indices] if dataset._indices is not None else lengths
+    return np.array([len(dataset[i]["input_ids"]) for i in range(len(dataset))], dtype=np.int64)
+
+class PaddingStats:
+    """
+    Running count of real and pad token slots produced by a collator.
+    efficiency is the fraction of slots holding real tokens.
+    """
+
+    def __init__(self):
+        self.batches = 0
+        self.real_tokens = 0
+        self.total_tokens = 0
+
+    def update(self, real_tokens, total_tokens):
+        self.batches += 1
+        self.real_tokens += int(real_tokens)
+        self.total_tokens += int(total_tokens)
+
+    @property
+    def efficiency(self):
+        return self.real_tokens / self.total_tokens if self.total_tokens else 1.0
+
+    def as_dict(self):
+        return {
+            "batches": self.batches,
+            "real_tokens": self.real_tokens,
+            "pad_tokens": self.total_tokens - self.real_tokens,
+            "padding_efficiency": self.efficiency
+        }
+
+    def __repr__(self):
+        return (f"PaddingStats(batches={self.batches}, real_tokens={self.real_tokens}, "
+                f"pad_tokens={self.total_tokens - self.real_tokens}, efficiency={self.efficiency:.3f})")
+
+class PaddingCollator:
+    """
+    Pads a batch of tokenized examples to its longest example (dynamic padding).
+    Pad positions get attention_mask 0 and label -100. Padding statistics accumulate in stats.
+    """
+
+    def __init__(self, pad_token_id, label_pad_token_id=-100):
+        self.pad_token_id = pad_token_id
+        self.label_pad_token_id = label_pad_token_id
+        self.stats = PaddingStats()
+
+    def __call__(self, examples):
+        max_len = max(len(example["input_ids"]) for example in examples)
+        input_ids = torch.full((len(examples), max_len), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((len(examples), max_len), self.label_pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(examples), max_len), dtype=torch.long)
+        for row, example in enumerate(examples):
+            n = len(example["input_ids"])
+            input_ids[row, :n] = torch.as_tensor(example["input_ids"], dtype=torch.long)
+            labels[row, :n] = torch.as_tensor(example.get("labels", example["input_ids"]), dtype=torch.long)
+            attention_mask[row, :n] = 1
+        self.stats.update(attention_mask.sum(), attention_mask.numel())
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+class PackingCollator:
+    """
+    Packs EOS-terminated examples into fixed-length blocks instead of padding them.
+
+    The examples of a batch are concatenated and cut into rows of block_size tokens; only the
+    last row is padded. Documents stay separable inside a row:
+        position_ids restart at 0 at every document start, which flash-attention and
+            position-id aware models use to keep attention within documents,
+        labels are -100 at the first token of every document (it must not be predicted from
+            the previous document's EOS) and at padding,
+        with block_diagonal_mask=True, attention_mask is a 4D additive mask of shape
+            (rows, 1, block_size, block_size) that is causal within each document and blocks
+            attention across documents; otherwise it is the usual 2D padding mask.
+    Padding statistics accumulate in stats.
+    """
+
+    def __init__(self, block_size, pad_token_id, label_pad_token_id=-100, block_diagonal_mask=False,
+                 mask_dtype=torch.float32):
+        self.block_size = block_size
+        self.pad_token_id = pad_token_id
+        self.label_pad_token_id = label_pad_token_id
+        self.block_diagonal_mask = block_diagonal_mask
+        self.mask_dtype = mask_dtype
+        self.stats = PaddingStats()
+
+    def __call__(self, examples):
+        ids = np.concatenate([np.asarray(example["input_ids"], dtype=np.int64) for example in examples])
+        lengths = np.array([len(example["input_ids"]) for example in examples], dtype=np.int64)
+        # Document number of every token and the position of each token within its document
+        doc_ids = np.repeat(np.arange(len(examples)), lengths)
+        doc_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        positions = np.arange(len(ids)) - np.repeat(doc_starts, lengths)
+
+        n_rows = max(1, -(-len(ids) // self.block_size))
+        n_slots = n_rows * self.block_size
+        pad = n_slots - len(ids)
+        input_ids = np.concatenate([ids, np.full(pad, self.pad_token_id)]).reshape(n_rows, self.block_size)
+        labels = input_ids.copy()
+        labels.reshape(-1)[doc_starts] = self.label_pad_token_id
+        labels.reshape(-1)[len(ids):] = self.label_pad_token_id
+        doc_ids = np.concatenate([doc_ids, np.full(pad, -1)]).reshape(n_rows, self.block_size)
+        # A document continued from the previous row restarts its positions there
+        positions = np.concatenate([positions, np.zeros(pad, dtype=np.int64)]).reshape(n_rows, self.block_size)
+        positions -= np.where(doc_ids == doc_ids[:, :1], positions[:, :1], 0)
+        self.stats.update(len(ids), n_slots)
+
+        batch = {
+            "input_ids": torch.from_numpy(input_ids),
+            "labels": torch.from_numpy(labels),
+            "position_ids": torch.from_numpy(positions)
+        }
+        if self.block_diagonal_mask:
+            same_doc = (doc_ids[:, :, None] == doc_ids[:, None, :]) & (doc_ids[:, :, None] >= 0)
+            causal = np.tril(np.ones((self.block_size, self.block_size), dtype=bool))
+            allowed = torch.from_numpy(same_doc & causal)
+            mask = torch.zeros(allowed.shape, dtype=self.mask_dtype)
+            mask.masked_fill_(~allowed, torch.finfo(self.mask_dtype).min)
+            batch["attention_mask"] = mask[:, None, :, :]
+        else:
+            batch["attention_mask"] = torch.from_numpy((doc_ids >= 0).astype(np.int64))
+        return batch
+
+class LengthBucketedBatchSampler(torch.utils.data.Sampler):
+    """
+    Batch sampler that groups examples of similar length so dynamic padding wastes little.
+    Each epoch the indices are shuffled, split into mega-batches of batch_size * bucket_multiplier,
+    sorted by length within each mega-batch and cut into batches; the batch order is then
+    shuffled. Use it as DataLoader(dataset, batch_sampler=..., collate_fn=PaddingCollator(...)).
+    """
+
+    def __init__(self, lengths, batch_size, bucket_multiplier=50, shuffle=True, seed=0, drop_last=False):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.bucket_multiplier = bucket_multiplier
+        self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def batches(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        order = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        bucket_size = self.batch_size * self.bucket_multiplier
+        batches = []
+        for start in range(0, len(order), bucket_size):
+            bucket = order[start:start + bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            for b in range(0, len(bucket), self.batch_size):
+                batch = bucket[b:b + self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch.tolist())
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def __iter__(self):
+        return iter(self.batches())
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return -(-len(self.lengths) // self.batch_size)
+
+    def padding_efficiency(self):
+        """
+        Fraction of real tokens among all slots the current epoch's batches occupy when padded
+        to their longest example.
+        """
+        return padding_efficiency(self.lengths, self.batches())
+
+def padding_efficiency(lengths, batches):
+    """
+    Fraction of real tokens when each batch (a list of example indices) is padded to its longest example.
+    """
+    lengths = np.asarray(lengths)
+    real = sum(int(lengths[batch].sum()) for batch in batches)
+    total = sum(int(lengths[batch].max()) * len(batch) for batch in batches if len(batch))
+    return real / total if total else 1.0
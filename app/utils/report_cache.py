@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from ..services.job_queue import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    """
+    Content-addressed cache of rendered HTML reports with LRU eviction under a byte budget.
+
+    Reports are stored as <key>.html in cache_dir, where the key hashes everything that
+    determines the report's content. The directory is scanned once at startup; after that
+    the LRU order and total size are tracked in memory and eviction happens on each put.
+    A file's mtime records its last use, so the LRU order survives restarts.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def make_key(query_text, top_n, model_id, corpus_version):
+        """
+        Hashes the normalized query, top_n, model/adapter id and corpus snapshot version.
+        """
+        payload = json.dumps([normalize_query(query_text), int(top_n), model_id, str(corpus_version)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.html")
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".html"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len(".html")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self.total_bytes += size
+        logger.info(f"Report cache at '{self.cache_dir}' holds {len(self._entries)} reports "
+                    f"({self.total_bytes / 1e6:.1f} MB).")
+        with self._lock:
+            self._evict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """
+        Returns the path of a cached report and marks it as recently used, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self.path_for(key)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self.total_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return path
+
+    def put(self, key, html):
+        """
+        Stores a rendered report, evicting least recently used reports if over budget.
+        Returns:
+            str: Path of the cached report.
+        """
+        data = html.encode("utf-8")
+        path = self.path_for(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        # The most recently used report is always kept, even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path_for(key))
+                logger.info(f"Evicted cached report {key} ({size} bytes).")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to evict cached report {key}: {e}")
@@ -0,0 +1,215 @@
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(x):
+    """
+    L2-normalizes each row of x (or x itself if it is 1-D) as float32, so that
+    cosine similarity reduces to a dot product.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def top_k_indices(scores, k):
+    """
+    Returns the indices of the k largest scores in descending order.
+    Uses argpartition, so only the k selected scores are sorted rather than all of them.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def build_filter_mask(n, dates=None, start_date=None, end_date=None, labels=None, clusters=None):
+    """
+    Builds a boolean pre-filter over n rows.
+    Args:
+        n (int): Number of rows in the index.
+        dates (np.ndarray): Per-row dates (datetime64[D] or ISO strings); required for date filtering.
+        start_date, end_date: Inclusive date bounds; either may be None.
+        labels (np.ndarray): Per-row cluster labels; required for cluster filtering.
+        clusters (int or iterable of int): Cluster label(s) to keep.
+    Returns:
+        np.ndarray or None: Boolean mask of allowed rows, or None if no filter applies.
+    """
+    mask = None
+    if start_date is not None or end_date is not None:
+        if dates is None:
+            raise ValueError("Per-row dates are required for date-range filtering.")
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        mask = np.ones(n, dtype=bool)
+        if start_date is not None:
+            mask &= dates >= np.datetime64(str(start_date), "D")
+        if end_date is not None:
+            mask &= dates <= np.datetime64(str(end_date), "D")
+    if clusters is not None:
+        if labels is None:
+            raise ValueError("Per-row cluster labels are required for cluster filtering.")
+        cluster_mask = np.isin(np.asarray(labels), np.atleast_1d(clusters))
+        mask = cluster_mask if mask is None else mask & cluster_mask
+    return mask
+
+
+class ExactIndex:
+    """
+    Brute-force inner-product search over normalized embeddings.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = normalize_rows(embeddings)
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def search(self, query, k=5, mask=None):
+        """
+        Finds the k rows most similar to query.
+        Args:
+            query (np.ndarray): Query embedding of shape (dim,) or (1, dim).
+            k (int): Number of results to return.
+            mask (np.ndarray): Optional boolean pre-filter of allowed rows.
+        Returns:
+            tuple: (row indices, cosine similarities), both in descending order of similarity.
+        """
+        q = normalize_rows(np.ravel(query))
+        if mask is None:
+            scores = self.embeddings @ q
+            best = top_k_indices(scores, k)
+            return best, scores[best]
+        rows = np.flatnonzero(mask)
+        scores = self.embeddings[rows] @ q
+        best = top_k_indices(scores, k)
+        return rows[best], scores[best]
+
+
+class IVFIndex:
+    """
+    Approximate inverted-file index. Embeddings are partitioned into n_lists clusters by a
+    k-means coarse quantizer and stored contiguously per cluster; a query only scans the
+    n_probe clusters whose centroids are closest to it. With n_lists ~ sqrt(n) the cost of a
+    query grows roughly with sqrt(n) instead of n.
+    """
+
+    def __init__(self, embeddings=None, n_lists=None, n_probe=8, random_state=42):
+        self.n_probe = n_probe
+        self.random_state = random_state
+        self.centroids = None
+        self.vectors = None
+        self.row_ids = None
+        self.offsets = None
+        if embeddings is not None:
+            self.train(embeddings, n_lists=n_lists)
+
+    def __len__(self):
+        return 0 if self.row_ids is None else len(self.row_ids)
+
+    def train(self, embeddings, n_lists=None):
+        from sklearn.cluster import MiniBatchKMeans
+
+        embeddings = normalize_rows(embeddings)
+        n = len(embeddings)
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        start = time.perf_counter()
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state,
+                                 batch_size=max(1024, 4 * n_lists), n_init=3)
+        assignments = kmeans.fit_predict(embeddings)
+        self._build(normalize_rows(kmeans.cluster_centers_), embeddings, assignments)
+        logger.info(f"Built IVF index over {n} embeddings with {n_lists} lists "
+                    f"in {time.perf_counter() - start:.2f}s.")
+        return self
+
+    def _build(self, centroids, embeddings, assignments):
+        self.centroids = centroids
+        order = np.argsort(assignments, kind="stable")
+        self.row_ids = order
+        self.vectors = np.ascontiguousarray(embeddings[order])
+        counts = np.bincount(assignments, minlength=len(centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def search(self, query, k=5, mask=None, n_probe=None):
+        """
+        Finds approximately the k rows most similar to query.
+        Args:
+            query (np.ndarray): Query embedding of shape (dim,) or (1, dim).
+            k (int): Number of results to return.
+            mask (np.ndarray): Optional boolean pre-filter of allowed rows (in original row order).
+            n_probe (int): Number of lists to scan; defaults to the index's n_probe.
+        Returns:
+            tuple: (row indices, cosine similarities), both in descending order of similarity.
+        """
+        q = normalize_rows(np.ravel(query))
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probe = top_k_indices(self.centroids @ q, n_probe)
+        positions = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in probe])
+        if mask is not None:
+            positions = positions[mask[self.row_ids[positions]]]
+            if len(positions) < k:
+                # A selective filter left too few candidates in the probed lists;
+                # scan every allowed row instead.
+                positions = np.flatnonzero(mask[self.row_ids])
+        scores = self.vectors[positions] @ q
+        best = top_k_indices(scores, k)
+        return self.row_ids[positions[best]], scores[best]
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, vectors=self.vectors,
+                 row_ids=self.row_ids, offsets=self.offsets, n_probe=self.n_probe)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls(n_probe=int(data["n_probe"]))
+        index.centroids = data["centroids"]
+        index.vectors = data["vectors"]
+        index.row_ids = data["row_ids"]
+        index.offsets = data["offsets"]
+        return index
+
+
+INDEX_TYPES = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+}
+
+
+def build_index(embeddings, kind="exact", **kwargs):
+    """
+    Builds a retrieval index of the given kind ("exact" or "ivf") over the embeddings.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}'. Expected one of {list(INDEX_TYPES)}.")
+    return INDEX_TYPES[kind](embeddings, **kwargs)
+
+
+def recall_at_k(index, exact_index, queries, k=5, mask=None):
+    """
+    Measures the recall@k of an approximate index against exact search.
+    Args:
+        index: The index under evaluation.
+        exact_index (ExactIndex): Ground-truth index over the same embeddings.
+        queries (np.ndarray): Query embeddings of shape (n_queries, dim).
+        k (int): Number of results per query.
+        mask (np.ndarray): Optional boolean pre-filter applied to both indexes.
+    Returns:
+        float: Mean fraction of the exact top k found by the index.
+    """
+    recalls = []
+    for query in np.atleast_2d(queries):
+        expected, _ = exact_index.search(query, k=k, mask=mask)
+        if len(expected) == 0:
+            continue
+        found, _ = index.search(query, k=k, mask=mask)
+        recalls.append(len(np.intersect1d(expected, found)) / len(expected))
+    recall = float(np.mean(recalls)) if recalls else 1.0
+    logger.info(f"recall@{k} = {recall:.3f} over {len(recalls)} queries.")
+    return recall
@@ -0,0 +1,118 @@
+import io
+import re
+import json
+import numpy as np
+import zstandard
+from bson import json_util
+
+# Compacted snapshot layout under the S3 prefix:
+#   compacted/manifest.json                 shards by month, with the page files each one replaces
+#   compacted/<YYYY-MM>/abstracts.jsonl.zst one Extended JSON document per line, zstd-compressed
+#   compacted/<YYYY-MM>/embeddings.npz      DOIs, dates and float32 embeddings of the month's abstracts
+SNAPSHOT_FORMAT_VERSION = 1
+COMPACTED_DIR = "compacted"
+SHARD_FILE = "abstracts.jsonl.zst"
+EMBEDDINGS_FILE = "embeddings.npz"
+MANIFEST_FILE = "manifest.json"
+
+# Documents decoded from a shard per chunk handed to the loader
+SHARD_CHUNK_DOCUMENTS = 1000
+
+
+def manifest_key(prefix):
+    return f"{prefix}/{COMPACTED_DIR}/{MANIFEST_FILE}"
+
+
+def shard_key(prefix, month):
+    return f"{prefix}/{COMPACTED_DIR}/{month}/{SHARD_FILE}"
+
+
+def embeddings_key(prefix, month):
+    return f"{prefix}/{COMPACTED_DIR}/{month}/{EMBEDDINGS_FILE}"
+
+
+def page_month(prefix, key):
+    """
+    Returns the month ("YYYY-MM") of a daily page file written by ingest
+    (<prefix>/<YYYY-MM-DD>/page_<n>.json), or None if key is not one.
+    """
+    match = re.fullmatch(re.escape(prefix) + r"/(\d{4}-\d{2})-\d{2}/page_\d+\.json", key)
+    return match.group(1) if match else None
+
+
+def is_shard_key(prefix, key):
+    return key.startswith(f"{prefix}/{COMPACTED_DIR}/") and key.endswith(f"/{SHARD_FILE}")
+
+
+def empty_manifest():
+    return {"format_version": SNAPSHOT_FORMAT_VERSION, "shards": {}}
+
+
+def load_manifest(body):
+    manifest = json.loads(body)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported compacted snapshot format version {manifest.get('format_version')}.")
+    return manifest
+
+
+def dump_manifest(manifest):
+    return json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8")
+
+
+def encode_shard(documents, level=10):
+    """
+    Serializes documents as zstd-compressed JSON lines (MongoDB Extended JSON, as the page files use).
+    Returns:
+        bytes: The compressed shard.
+    """
+    lines = b"".join(json_util.dumps(doc).encode("utf-8") + b"\n" for doc in documents)
+    return zstandard.ZstdCompressor(level=level).compress(lines)
+
+
+def iter_shard_chunks(stream, fields=None, chunk_documents=SHARD_CHUNK_DOCUMENTS):
+    """
+    Decompresses and decodes a shard incrementally from a readable binary stream (e.g. an S3
+    response body), so the whole shard is never held in memory at once.
+    Args:
+        stream: Binary file-like object positioned at the start of the compressed shard.
+        fields (iterable of str): Optional fields to keep; other fields are dropped after decoding.
+        chunk_documents (int): Documents per yielded chunk.
+    Yields:
+        list of dict: Up to chunk_documents documents at a time.
+    """
+    fields = set(fields) if fields else None
+    with zstandard.ZstdDecompressor().stream_reader(stream, closefd=False) as reader:
+        chunk = []
+        for line in io.BufferedReader(reader):
+            if not line.strip():
+                continue
+            doc = json_util.loads(line)
+            if fields is not None:
+                doc = {k: v for k, v in doc.items() if k in fields}
+            chunk.append(doc)
+            if len(chunk) >= chunk_documents:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def encode_embeddings(dois, dates, embeddings):
+    """
+    Packs DOIs, dates and a float32 embedding matrix into an .npz archive.
+    """
+    buffer = io.BytesIO()
+    np.savez(buffer,
+             dois=np.array(dois, dtype=str),
+             dates=np.array(dates, dtype="datetime64[D]").astype(str),
+             embeddings=np.asarray(embeddings, dtype=np.float32))
+    return buffer.getvalue()
+
+
+def decode_embeddings(body):
+    """
+    Returns:
+        tuple: (list of DOIs, list of ISO dates, float32 matrix of shape (n, dim))
+    """
+    with np.load(io.BytesIO(body), allow_pickle=False) as archive:
+        return archive["dois"].tolist(), archive["dates"].tolist(), archive["embeddings"].astype(np.float32, copy=False)
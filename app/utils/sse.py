@@ -0,0 +1,25 @@
+import json
+
+# An SSE comment line; EventSource ignores it, but it keeps idle connections open through proxies
+KEEPALIVE = b": keep-alive\n\n"
+
+
+def format_sse(data, event=None, event_id=None):
+    """
+    Encodes one Server-Sent Event.
+    Args:
+        data (str or object): Event data; anything other than a string is sent as JSON.
+        event (str): Optional event type.
+        event_id: Optional event id, which EventSource clients send back as Last-Event-ID on reconnect.
+    Returns:
+        bytes: The encoded event, terminated by a blank line.
+    """
+    if not isinstance(data, str):
+        data = json.dumps(data, default=str)
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}\n")
+    if event is not None:
+        lines.append(f"event: {event}\n")
+    lines.extend(f"data: {line}\n" for line in data.splitlines() or [""])
+    return ("".join(lines) + "\n").encode("utf-8")
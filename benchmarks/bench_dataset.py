@@ -0,0 +1,56 @@
+from pymongo import MongoClient
+
+from app.utils.pytorch_dataset import BioRxivDataset, BioRxivIterableDataset
+from .common import scratch_database, stopwatch, rate
+from .fakes import synthetic_abstracts
+
+
+def _iterate(dataset, limit=None):
+    n = len(dataset) if limit is None else min(limit, len(dataset))
+    with stopwatch() as timing:
+        for i in range(n):
+            dataset[i]
+    return {"examples": n, "seconds": timing["seconds"], "examples_per_second": rate(n, timing["seconds"])}
+
+
+def run(mongo_uri, n_documents=20_000, stream_sample=2_000, batch_size=1000):
+    """
+    Measures BioRxivDataset construction and iteration rates in in-memory (columnar) and
+    streaming (one find_one per example) mode, and BioRxivIterableDataset's batched streaming rate.
+    Args:
+        mongo_uri (str): MongoDB to load the synthetic corpus into; a scratch database is used.
+        n_documents (int): Size of the synthetic corpus.
+        stream_sample (int): Examples read in stream_mongo mode, which costs a round trip each.
+        batch_size (int): Documents per query for BioRxivIterableDataset.
+    Returns:
+        dict: Parameters plus construction and iteration figures per mode.
+    """
+    results = {"params": {"n_documents": n_documents, "stream_sample": stream_sample, "batch_size": batch_size}}
+    with scratch_database(mongo_uri) as db_name:
+        client = MongoClient(mongo_uri)
+        try:
+            collection = client[db_name].abstracts
+            collection.create_index([("date", 1)])
+            batch = []
+            for doc in synthetic_abstracts(n_documents):
+                batch.append(doc)
+                if len(batch) == 10_000:
+                    collection.insert_many(batch, ordered=False)
+                    batch = []
+            if batch:
+                collection.insert_many(batch, ordered=False)
+        finally:
+            client.close()
+
+        for name, stream_mongo, limit in (("in_memory", False, None), ("stream_mongo", True, stream_sample)):
+            with stopwatch() as build:
+                dataset = BioRxivDataset(mongo_uri=mongo_uri, db_name=db_name, stream_mongo=stream_mongo)
+            results[name] = {"construct_seconds": build["seconds"], **_iterate(dataset, limit)}
+            dataset.client.close()
+
+        iterable = BioRxivIterableDataset(mongo_uri=mongo_uri, db_name=db_name, batch_size=batch_size)
+        with stopwatch() as timing:
+            n = sum(1 for _ in iterable)
+        results["iterable"] = {"examples": n, "seconds": timing["seconds"],
+                               "examples_per_second": rate(n, timing["seconds"])}
+    return results
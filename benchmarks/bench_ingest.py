@@ -0,0 +1,51 @@
+import asyncio
+from datetime import date, timedelta
+
+from app.services.database_service import DataBaseService
+from .common import scratch_database, stopwatch, rate
+from .fakes import FakeS3Client, FakeBioRxivServer
+
+
+async def _ingest(mongo_uri, db_name, server, s3, start_date, end_date):
+    service = DataBaseService(s3, "bench-bucket", "abstracts", mongo_uri=mongo_uri, db_name=db_name)
+    service.biorxiv_api_url = server.url
+    try:
+        await service.setup()  # creates the indexes; the empty bucket has nothing to load
+        runs = {}
+        # The first pass inserts every abstract; the second finds them all already present
+        for name in ("cold", "repeat"):
+            requests_before = server.requests
+            with stopwatch() as timing:
+                stats = await service.ingest(start_date, end_date)
+            runs[name] = {
+                **stats,
+                "seconds": timing["seconds"],
+                "docs_per_second": rate(stats["fetched"], timing["seconds"]),
+                "http_requests": server.requests - requests_before
+            }
+        return runs
+    finally:
+        await service.close()
+
+
+def run(mongo_uri, days=5, per_day=250, latency=0.0):
+    """
+    Measures DataBaseService.ingest throughput against the fake biorxiv server and in-memory S3.
+    Args:
+        mongo_uri (str): MongoDB to write to; a scratch database is created and dropped.
+        days (int): Number of days ingested.
+        per_day (int): Abstracts served per day.
+        latency (float): Simulated network latency per request in seconds.
+    Returns:
+        dict: Parameters plus docs/sec and timings for a cold and a repeated ingest.
+    """
+    start_date = date(2024, 1, 1)
+    end_date = start_date + timedelta(days=days - 1)
+    s3 = FakeS3Client()
+    with FakeBioRxivServer(per_day=per_day, latency=latency) as server, scratch_database(mongo_uri) as db_name:
+        runs = asyncio.run(_ingest(mongo_uri, db_name, server, s3, start_date, end_date))
+    return {
+        "params": {"days": days, "per_day": per_day, "latency": latency},
+        "s3_objects_written": len(s3.objects),
+        **runs
+    }
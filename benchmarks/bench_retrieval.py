@@ -0,0 +1,54 @@
+import time
+import numpy as np
+
+from app.utils.retrieval import build_index, normalize_rows, recall_at_k
+from .common import latency_summary, stopwatch
+
+
+def synthetic_embeddings(n, dim=384, n_topics=64, noise=0.5, seed=0):
+    """
+    Draws unit-norm embeddings scattered around n_topics random directions, which is closer to
+    real abstract embeddings than uniform noise (and to how an IVF index behaves on them).
+    """
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    labels = rng.integers(0, n_topics, size=n)
+    embeddings = topics[labels] + noise * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(embeddings)
+
+
+def run(corpus_sizes=(10_000, 50_000, 200_000), dim=384, k=5, n_queries=200, index_types=("exact", "ivf")):
+    """
+    Measures top-k search latency of each index type against corpus size.
+    Args:
+        corpus_sizes (iterable of int): Numbers of stored embeddings.
+        dim (int): Embedding dimension (384 for all-MiniLM-L6-v2).
+        k (int): Results per query.
+        n_queries (int): Queries timed per configuration.
+        index_types (iterable of str): Index kinds passed to build_index.
+    Returns:
+        dict: Parameters plus one entry per (size, index type) with build time, latency percentiles
+              and, for approximate indexes, recall@k against exact search.
+    """
+    results = []
+    for n in corpus_sizes:
+        embeddings = synthetic_embeddings(n, dim=dim)
+        queries = synthetic_embeddings(n_queries, dim=dim, seed=1)
+        exact = None
+        for kind in index_types:
+            with stopwatch() as build:
+                index = build_index(embeddings, kind=kind)
+            index.search(queries[0], k=k)  # warm-up
+            samples = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, k=k)
+                samples.append(time.perf_counter() - start)
+            entry = {"corpus_size": n, "index": kind, "build_seconds": build["seconds"], **latency_summary(samples)}
+            if kind == "exact":
+                exact = index
+            else:
+                exact = exact or build_index(embeddings, kind="exact")
+                entry[f"recall_at_{k}"] = recall_at_k(index, exact, queries[:50], k=k)
+            results.append(entry)
+    return {"params": {"dim": dim, "k": k, "n_queries": n_queries}, "sizes": results}
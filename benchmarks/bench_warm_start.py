@@ -0,0 +1,72 @@
+import asyncio
+from bson import json_util
+
+from app.services.database_service import DataBaseService
+from .common import scratch_database, stopwatch, rate
+from .fakes import FakeS3Client, synthetic_abstracts
+
+
+def fill_bucket(s3, bucket, prefix, n_objects, docs_per_object):
+    """
+    Writes n_objects page files of docs_per_object synthetic abstracts, laid out like ingest's
+    <prefix>/<date>/page_<n>.json keys.
+    """
+    docs = synthetic_abstracts(n_objects * docs_per_object, per_day=docs_per_object)
+    for i in range(n_objects):
+        page = [next(docs) for _ in range(docs_per_object)]
+        s3.put_object(Bucket=bucket, Key=f"{prefix}/{page[0]['date']}/page_{i}.json",
+                      Body=json_util.dumps(page))
+
+
+async def _compact(mongo_uri, db_name, s3, bucket, prefix):
+    service = DataBaseService(s3, bucket, prefix, mongo_uri=mongo_uri, db_name=db_name)
+    try:
+        await service.compact_s3_backup(include_current_month=True, delete_sources=True)
+    finally:
+        await service.close()
+
+
+async def _warm_start(mongo_uri, db_name, s3, bucket, prefix):
+    service = DataBaseService(s3, bucket, prefix, mongo_uri=mongo_uri, db_name=db_name)
+    try:
+        with stopwatch() as timing:
+            await service.initialize_mongodb_from_s3()
+        count = await service.db.abstracts.count_documents({})
+        return timing["seconds"], count
+    finally:
+        await service.close()
+
+
+def run(mongo_uri, object_counts=(10, 100, 500), docs_per_object=100):
+    """
+    Measures initialize_mongodb_from_s3 time against the number of objects in the bucket, from
+    daily page files and from the same pages compacted into monthly shards.
+    Args:
+        mongo_uri (str): MongoDB to load into; a scratch database is created and dropped per size.
+        object_counts (iterable of int): Bucket sizes to measure.
+        docs_per_object (int): Abstracts per S3 object (ingest writes up to 100 per page).
+    Returns:
+        dict: Parameters plus one entry per (object count, layout) with seconds, GET requests and docs/s.
+    """
+    bucket, prefix = "bench-bucket", "abstracts"
+    results = []
+    for n_objects in object_counts:
+        s3 = FakeS3Client()
+        fill_bucket(s3, bucket, prefix, n_objects, docs_per_object)
+        for layout in ("pages", "compacted"):
+            if layout == "compacted":
+                with scratch_database(mongo_uri) as db_name:
+                    asyncio.run(_compact(mongo_uri, db_name, s3, bucket, prefix))
+            s3.calls.clear()
+            with scratch_database(mongo_uri) as db_name:
+                seconds, count = asyncio.run(_warm_start(mongo_uri, db_name, s3, bucket, prefix))
+            results.append({
+                "objects": n_objects,
+                "layout": layout,
+                "documents": count,
+                "seconds": seconds,
+                "get_requests": s3.calls.get("get_object", 0),
+                "bytes_stored": sum(len(data) for data in s3.objects.values()),
+                "docs_per_second": rate(count, seconds)
+            })
+    return {"params": {"docs_per_object": docs_per_object}, "sizes": results}
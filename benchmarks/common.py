@@ -0,0 +1,86 @@
+import time
+import uuid
+import logging
+import statistics
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkSkipped(Exception):
+    """
+    Raised by a benchmark whose prerequisites (e.g. a reachable MongoDB) are missing.
+    The runner records the reason instead of failing the whole suite.
+    """
+
+
+def latency_summary(samples):
+    """
+    Summarizes latency samples in seconds as milliseconds.
+    Returns:
+        dict: 'n', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms' and 'max_ms'.
+    """
+    ordered = sorted(samples)
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000
+    }
+
+
+def rate(count, seconds):
+    return count / max(seconds, 1e-9)
+
+
+@contextmanager
+def stopwatch():
+    """
+    Times the body of a with block; the yielded dict's 'seconds' is set on exit.
+    """
+    timing = {"seconds": None}
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing["seconds"] = time.perf_counter() - start
+
+
+def require_mongo(mongo_uri, timeout_ms=2000):
+    """
+    Raises BenchmarkSkipped unless a MongoDB server answers at mongo_uri.
+    """
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=timeout_ms)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        raise BenchmarkSkipped(f"MongoDB is not reachable at {mongo_uri}: {e.__class__.__name__}")
+    finally:
+        client.close()
+
+
+@contextmanager
+def scratch_database(mongo_uri):
+    """
+    Yields the name of a new, empty database that is dropped afterwards, so benchmarks
+    never touch the application's data.
+    """
+    from pymongo import MongoClient
+
+    require_mongo(mongo_uri)
+    db_name = f"biorxiv_bench_{uuid.uuid4().hex[:8]}"
+    client = MongoClient(mongo_uri)
+    try:
+        yield db_name
+    finally:
+        client.drop_database(db_name)
+        client.close()
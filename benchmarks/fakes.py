@@ -0,0 +1,258 @@
+import io
+import json
+import random
+import hashlib
+import threading
+from datetime import date, timedelta
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Records per page served by the fake details endpoint, as by the real biorxiv API
+PAGE_SIZE = 100
+
+VOCABULARY = (
+    "cell protein gene expression receptor signaling pathway neuron cortex tissue tumor immune "
+    "response infection virus bacterial genome sequencing transcription regulation mutation variant "
+    "population evolution selection model network dynamics structure binding membrane channel "
+    "synaptic plasticity learning behavior mouse human zebrafish drosophila yeast organoid "
+    "single-cell atlas clustering embedding inference analysis method dataset observed increased "
+    "decreased significantly revealed demonstrate suggest novel mechanism role function activity "
+    "development differentiation stem metabolism mitochondrial oxidative stress inflammation disease"
+).split()
+
+CATEGORIES = ["neuroscience", "genomics", "immunology", "microbiology", "bioinformatics", "cell biology"]
+
+
+def synthetic_abstract(day, i, seed=0, abstract_words=200):
+    """
+    Builds one fake abstract record shaped like a biorxiv details record.
+    The record is a deterministic function of (day, i, seed), so repeated calls return the same DOI and text.
+    Args:
+        day (datetime.date): Publication date.
+        i (int): Position of the abstract within the day.
+        seed (int): Corpus seed.
+        abstract_words (int): Number of words in the abstract.
+    Returns:
+        dict: Record with 'doi', 'title', 'authors', 'date', 'version', 'category', 'abstract' and 'server' keys.
+    """
+    date_str = day.strftime("%Y-%m-%d")
+    digest = hashlib.sha1(f"{seed}:{date_str}:{i}".encode("utf-8")).digest()
+    rng = random.Random(digest)
+    words = rng.choices(VOCABULARY, k=abstract_words)
+    return {
+        "doi": f"10.1101/{date_str.replace('-', '.')}.{i:06d}",
+        "title": " ".join(rng.choices(VOCABULARY, k=8)).capitalize(),
+        "authors": "; ".join(f"Author {rng.randint(1, 9999)}" for _ in range(3)),
+        "date": date_str,
+        "version": "1",
+        "category": rng.choice(CATEGORIES),
+        "abstract": " ".join(words).capitalize() + ".",
+        "server": "biorxiv"
+    }
+
+
+def synthetic_abstracts(n, start_date=date(2024, 1, 1), per_day=100, seed=0, abstract_words=200):
+    """
+    Yields n fake abstracts, per_day for each consecutive day from start_date.
+    """
+    for i in range(n):
+        day = start_date + timedelta(days=i // per_day)
+        yield synthetic_abstract(day, i % per_day, seed=seed, abstract_words=abstract_words)
+
+
+class FakeS3Client:
+    """
+    In-memory stand-in for the subset of the boto3 S3 client used by the app
+    (list_objects_v2 with continuation tokens, get_object, put_object, head_object and
+    delete_objects). Objects live in a dict keyed by (bucket, key); calls are thread safe,
+    since AsyncS3Client issues them from a thread pool.
+    """
+
+    def __init__(self, max_keys=1000):
+        self.max_keys = max_keys
+        self.objects = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    @staticmethod
+    def _etag(data):
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=None, **kwargs):
+        max_keys = min(MaxKeys or self.max_keys, self.max_keys)
+        with self._lock:
+            self._count("list_objects_v2")
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+            start = int(ContinuationToken or 0)
+            page = keys[start:start + max_keys]
+            response = {"KeyCount": len(page), "IsTruncated": start + max_keys < len(keys)}
+            if page:
+                response["Contents"] = [
+                    {"Key": key, "Size": len(self.objects[(Bucket, key)]),
+                     "ETag": self._etag(self.objects[(Bucket, key)])}
+                    for key in page
+                ]
+            if response["IsTruncated"]:
+                response["NextContinuationToken"] = str(start + max_keys)
+            return response
+
+    def get_object(self, Bucket, Key, **kwargs):
+        with self._lock:
+            self._count("get_object")
+            data = self.objects[(Bucket, Key)]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data), "ETag": self._etag(data)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        with self._lock:
+            self._count("head_object")
+            data = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "ETag": self._etag(data)}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        with self._lock:
+            self._count("put_object")
+            self.objects[(Bucket, Key)] = data
+        return {"ETag": self._etag(data)}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        with self._lock:
+            self._count("delete_objects")
+            for obj in Delete["Objects"]:
+                self.objects.pop((Bucket, obj["Key"]), None)
+        return {"Deleted": [{"Key": obj["Key"]} for obj in Delete["Objects"]]}
+
+    def close(self):
+        pass
+
+
+class FakeBioRxivServer:
+    """
+    Local HTTP server that mimics the biorxiv details endpoint,
+    GET /<start date>/<end date>/<cursor>, serving per_day synthetic abstracts for every day
+    in PAGE_SIZE pages. Runs in a background thread; use as a context manager and point
+    DataBaseService.biorxiv_api_url at its url.
+    """
+
+    def __init__(self, per_day=250, seed=0, latency=0.0, host="127.0.0.1", port=0):
+        """
+        Args:
+            per_day (int): Abstracts published on every day.
+            seed (int): Corpus seed passed to synthetic_abstract.
+            latency (float): Seconds each response is delayed by, to simulate the network.
+            host (str): Interface to bind.
+            port (int): Port to bind; 0 picks a free port.
+        """
+        self.per_day = per_day
+        self.seed = seed
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, body = server.handle_path(self.path)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @lru_cache(maxsize=64)
+    def _day(self, date_str):
+        day = date.fromisoformat(date_str)
+        return [synthetic_abstract(day, i, seed=self.seed) for i in range(self.per_day)]
+
+    def handle_path(self, path):
+        self.requests += 1
+        if self.latency:
+            threading.Event().wait(self.latency)
+        try:
+            start_str, end_str, cursor = path.strip("/").split("/")[-3:]
+            start, end, cursor = date.fromisoformat(start_str), date.fromisoformat(end_str), int(cursor)
+        except ValueError:
+            return 400, {"messages": [{"status": "bad request"}], "collection": []}
+        records = []
+        day = start
+        while day <= end:
+            records.extend(self._day(day.strftime("%Y-%m-%d")))
+            day += timedelta(days=1)
+        page = records[cursor:cursor + PAGE_SIZE]
+        return 200, {
+            "messages": [{"status": "ok", "cursor": cursor, "count": len(page), "total": len(records)}],
+            "collection": page
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def tiny_language_model(hidden_size=64, num_layers=2, max_positions=8192, seed=0):
+    """
+    Builds a randomly initialized, CPU-sized Llama model and a character-level tokenizer with
+    a chat template, entirely offline. Its output is gibberish, but it runs the same prompt
+    assembly, caching and generation code paths as the real model.
+    Returns:
+        tuple: (model, tokenizer)
+    """
+    import string
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, decoders, processors
+    from transformers import PreTrainedTokenizerFast, LlamaConfig, LlamaForCausalLM
+
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<unk>": 3}
+    for ch in string.printable + "’":
+        vocab.setdefault(ch, len(vocab))
+    backend = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Split("", "isolated")
+    backend.decoder = decoders.Fuse()
+    backend.post_processor = processors.TemplateProcessing(single="<s> $A", special_tokens=[("<s>", 1)])
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend, bos_token="<s>", eos_token="</s>", unk_token="<unk>", pad_token="<pad>",
+        model_input_names=["input_ids", "attention_mask"]
+    )
+    tokenizer.chat_template = (
+        "{{ bos_token }}{% for m in messages %}[{{ m['role'] }}]{{ m['content'] }}{% endfor %}"
+        "{% if add_generation_prompt %}[assistant]{% endif %}"
+    )
+    tokenizer.model_max_length = max_positions
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=len(vocab), hidden_size=hidden_size, intermediate_size=2 * hidden_size,
+        num_hidden_layers=num_layers, num_attention_heads=4, num_key_value_heads=2,
+        max_position_embeddings=max_positions, bos_token_id=1, eos_token_id=2, pad_token_id=0
+    )
+    model = LlamaForCausalLM(config)
+    model.eval()
+    return model, tokenizer
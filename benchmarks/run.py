@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import logging
+import subprocess
+import traceback
+
+from . import bench_ingest, bench_warm_start, bench_retrieval, bench_dataset, bench_summarize
+from .common import BenchmarkSkipped
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = {
+    "ingest": bench_ingest,
+    "warm_start": bench_warm_start,
+    "retrieval": bench_retrieval,
+    "dataset": bench_dataset,
+    "summarize": bench_summarize
+}
+
+# Smaller sizes for a quick smoke run (--quick)
+QUICK_PARAMS = {
+    "ingest": {"days": 2, "per_day": 150},
+    "warm_start": {"object_counts": (5, 20), "docs_per_object": 50},
+    "retrieval": {"corpus_sizes": (2_000, 10_000), "n_queries": 50},
+    "dataset": {"n_documents": 2_000, "stream_sample": 200},
+    "summarize": {"top_n": 3, "max_new_tokens": 8, "repeats": 1}
+}
+
+# Benchmarks that need a MongoDB server
+NEEDS_MONGO = {"ingest", "warm_start", "dataset"}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names, mongo_uri, quick=False):
+    """
+    Runs the named benchmarks in order. A benchmark that is skipped or fails is recorded
+    with its reason, and the remaining benchmarks still run.
+    Returns:
+        dict: Benchmark name -> {'status': 'ok' | 'skipped' | 'failed', 'seconds', 'result' or 'reason'}.
+    """
+    results = {}
+    for name in names:
+        kwargs = dict(QUICK_PARAMS[name]) if quick else {}
+        if name in NEEDS_MONGO:
+            kwargs["mongo_uri"] = mongo_uri
+        logger.warning(f"Running benchmark '{name}'")
+        start = time.perf_counter()
+        try:
+            result = {"status": "ok", "result": BENCHMARKS[name].run(**kwargs)}
+        except BenchmarkSkipped as e:
+            result = {"status": "skipped", "reason": str(e)}
+        except Exception as e:
+            logger.error(f"Benchmark '{name}' failed:\n{traceback.format_exc()}")
+            result = {"status": "failed", "reason": f"{e.__class__.__name__}: {e}"}
+        result["seconds"] = time.perf_counter() - start
+        logger.warning(f"Benchmark '{name}' {result['status']} in {result['seconds']:.1f}s")
+        results[name] = result
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the offline benchmark suite and writes the results as JSON.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="Benchmarks to run (default: all).")
+    parser.add_argument("--mongo-uri", default=os.environ.get("BENCH_MONGO_URI", "mongodb://localhost:27017"),
+                        help="MongoDB used for scratch databases; benchmarks needing it are skipped if it is unreachable.")
+    parser.add_argument("--out", default="bench_output.json", help="Path of the JSON results file.")
+    parser.add_argument("--quick", action="store_true", help="Use small sizes for a fast smoke run.")
+    parser.add_argument("--verbose", action="store_true", help="Show the application's INFO logs.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "benchmarks": run_benchmarks(args.only, args.mongo_uri, quick=args.quick)
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote benchmark results to {args.out}")
+    return 1 if any(b["status"] == "failed" for b in report["benchmarks"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())